@@ -2,6 +2,13 @@
 
 # Expose the main agent class for easier imports
 # CHANGE from .retail_agent to the absolute package path
-from agent.retail_agent import RetailAgent 
+# Imported on first access: agent.retail_agent pulls in google.adk and vertexai (seconds of import
+# time), which tools such as `python -m agent.rollups` or `python -m agent.warmup imports` do not need.
+def __getattr__(name):
+    if name == "RetailAgent":
+        from agent.retail_agent import RetailAgent
+        return RetailAgent
+    raise AttributeError(f"module 'agent' has no attribute {name!r}")
 
-__all__ = ["RetailAgent"]
\ No newline at end of file
+
+__all__ = ["RetailAgent"]
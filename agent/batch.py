@@ -0,0 +1,271 @@
+# batch.py
+#
+# Offline batches of questions (nightly reports) for RetailAgent.query_batch.
+# A batch is cheaper than replaying the questions one by one through /chat:
+#   - the plans of every plan-cache miss come from one model request per
+#     chunk of questions (build_batch_plan_prompt / parse_batch_plans)
+#   - questions whose guarded SQL is identical share one execution
+#   - aggregates over the same table and filter are merged into one scan
+#     with GROUPING SETS (GroupingSetsMerge) and split back per question
+#   - what is left runs concurrently on a bounded number of workers
+# Results are written as JSONL or Parquet, one record per question.
+#
+#   python -m agent.batch questions.txt --out report.jsonl
+#   python -m agent.batch questions.txt --out report.parquet --workers 8
+
+import argparse
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+DEFAULT_BATCH_WORKERS = 4
+# Questions planned per batched model request; bounds the size of each response.
+DEFAULT_PLAN_BATCH_SIZE = 20
+MAX_BATCH_QUESTIONS = 500
+
+REPORT_FIELDS = ("index", "question", "type", "content", "raw_sql", "visualization", "data")
+
+
+# -----------------------------
+# Batched planning
+# -----------------------------
+def parse_batch_plans(text: str, count: int) -> Optional[List[dict]]:
+    """The model's JSON array of plans, or None unless it holds exactly count objects."""
+    try:
+        plans = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(plans, dict):
+        plans = plans.get("answers")
+    if not isinstance(plans, list) or len(plans) != count or not all(isinstance(p, dict) for p in plans):
+        return None
+    return plans
+
+
+# -----------------------------
+# GROUPING SETS merge
+# -----------------------------
+@dataclass
+class AggregateShape:
+    """An aggregate query reduced to what a merge needs. Expressions are BigQuery SQL text."""
+    sql: str
+    table: str
+    where: str
+    columns: List[Tuple[str, str, str]]  # (output name, "dimension" | "measure", expression), projection order
+    order: List[Tuple[str, bool]]       # (output name, descending)
+    limit: Optional[int]
+
+    @property
+    def merge_key(self) -> Tuple[str, str]:
+        return self.table.lower(), self.where
+
+    @property
+    def dimensions(self) -> List[str]:
+        return [expression for _, kind, expression in self.columns if kind == "dimension"]
+
+
+def aggregate_shape(sql: str) -> Optional[AggregateShape]:
+    """
+    The shape of sql if it is a plain aggregate over one table: dimensions
+    that are all grouped on, aggregate measures, and at most ORDER BY output
+    columns and a LIMIT (applied after the split). None for anything else.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="bigquery")
+    except sqlglot.errors.ParseError:
+        return None
+    if not isinstance(tree, exp.Select) or any(tree.args.get(arg) for arg in ("having", "distinct", "qualify", "offset")):
+        return None
+    if any(tree.find(node) for node in (exp.Join, exp.CTE, exp.Window, exp.Subquery)):
+        return None
+    tables = list(tree.find_all(exp.Table))
+    if len(tables) != 1:
+        return None
+
+    columns = []
+    for projection in tree.expressions:
+        if isinstance(projection, exp.Star):
+            return None
+        expression = projection.unalias()
+        kind = "measure" if expression.find(exp.AggFunc) else "dimension"
+        columns.append((projection.alias_or_name, kind, expression.sql(dialect="bigquery")))
+    if not any(kind == "measure" for _, kind, _ in columns):
+        return None
+
+    group = tree.args.get("group")
+    if group is not None and any(group.args.get(arg) for arg in ("grouping_sets", "cube", "rollup")):
+        return None
+    grouped = set()
+    for key in (group.expressions if group is not None else []):
+        if isinstance(key, exp.Literal) and key.is_int and 0 < int(key.name) <= len(columns):
+            grouped.add(int(key.name) - 1)
+            continue
+        text = key.sql(dialect="bigquery")
+        match = next((i for i, (name, kind, expression) in enumerate(columns) if kind == "dimension" and (
+            expression == text or isinstance(key, exp.Column) and not key.table and key.name == name)), None)
+        if match is None:
+            return None  # grouped on something that is not selected
+        grouped.add(match)
+    if grouped != {i for i, (_, kind, _) in enumerate(columns) if kind == "dimension"}:
+        return None
+
+    names = {name for name, _, _ in columns}
+    order = []
+    for ordered in (tree.args["order"].expressions if tree.args.get("order") else []):
+        key = ordered.this
+        if not isinstance(key, exp.Column) or key.table or key.name not in names:
+            return None
+        order.append((key.name, bool(ordered.args.get("desc"))))
+    limit = None
+    if tree.args.get("limit") is not None:
+        value = tree.args["limit"].expression
+        if not isinstance(value, exp.Literal) or not value.is_int:
+            return None
+        limit = int(value.name)
+
+    where = tree.args.get("where")
+    return AggregateShape(sql=sql, table=tables[0].sql(dialect="bigquery"),
+                          where=where.this.sql(dialect="bigquery") if where is not None else "",
+                          columns=columns, order=order, limit=limit)
+
+
+def _sort_key(value):
+    # NULLs first ascending (last descending), as in BigQuery.
+    return (value is not None, value if value is not None else 0)
+
+
+class GroupingSetsMerge:
+    """One GROUP BY GROUPING SETS query answering several aggregate queries over the same table and filter."""
+
+    def __init__(self, shapes: List[AggregateShape]):
+        self.shapes = shapes
+        self.dimensions = {}  # expression -> output alias
+        self.measures = {}
+        for shape in shapes:
+            for _, kind, expression in shape.columns:
+                target = self.dimensions if kind == "dimension" else self.measures
+                target.setdefault(expression, f"_{kind[0]}{len(target)}")
+        self.sets = []
+        for shape in shapes:
+            key = tuple(sorted(set(shape.dimensions)))
+            if key not in self.sets:
+                self.sets.append(key)
+
+    @property
+    def sql(self) -> str:
+        shape = self.shapes[0]
+        select = [f"{e} AS {alias}" for e, alias in self.dimensions.items()]
+        select += [f"{e} AS {alias}" for e, alias in self.measures.items()]
+        select += [f"GROUPING({e}) AS _g{alias[2:]}" for e, alias in self.dimensions.items()]
+        sql = f"SELECT {', '.join(select)} FROM {shape.table}"
+        if shape.where:
+            sql += f" WHERE {shape.where}"
+        if self.dimensions:
+            sets = ", ".join("(" + ", ".join(key) + ")" for key in self.sets)
+            sql += f" GROUP BY GROUPING SETS ({sets})"
+        return sql
+
+    def split(self, rows: List[dict]) -> List[List[dict]]:
+        """The rows of each shape, in order, from the merged result's rows."""
+        results = []
+        for shape in self.shapes:
+            wanted = set(shape.dimensions)
+            flags = {f"_g{alias[2:]}": 0 if e in wanted else 1 for e, alias in self.dimensions.items()}
+            selected = []
+            for row in rows:
+                if all(row.get(flag) == value for flag, value in flags.items()):
+                    selected.append({name: row[(self.dimensions if kind == "dimension" else self.measures)[e]]
+                                     for name, kind, e in shape.columns})
+            for name, descending in reversed(shape.order):
+                selected.sort(key=lambda r: _sort_key(r.get(name)), reverse=descending)
+            results.append(selected[:shape.limit] if shape.limit is not None else selected)
+        return results
+
+
+def plan_merges(shapes: List[AggregateShape]) -> List[List[int]]:
+    """Indices of shapes that share a table and filter, in groups of two or more."""
+    groups = {}
+    for i, shape in enumerate(shapes):
+        groups.setdefault(shape.merge_key, []).append(i)
+    return [indices for indices in groups.values() if len(indices) > 1]
+
+
+# -----------------------------
+# Output
+# -----------------------------
+def report_records(questions: List[str], payloads: List[dict]) -> List[dict]:
+    records = []
+    for i, (question, payload) in enumerate(zip(questions, payloads)):
+        record = {"index": i, "question": question}
+        record.update({k: payload.get(k) for k in REPORT_FIELDS if k not in record})
+        record["_batch"] = payload.get("_batch")
+        records.append(record)
+    return records
+
+
+def write_jsonl(path: str, records: List[dict]):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+def write_parquet(path: str, records: List[dict]):
+    """One row per question; visualization, data and _batch are stored as JSON text."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = {field: [] for field in REPORT_FIELDS + ("row_count", "_batch")}
+    for record in records:
+        for field in REPORT_FIELDS:
+            value = record.get(field)
+            columns[field].append(json.dumps(value, default=str) if field in ("visualization", "data") else value)
+        columns["row_count"].append(len(record.get("data") or []))
+        columns["_batch"].append(json.dumps(record.get("_batch"), default=str))
+    pq.write_table(pa.table(columns), path)
+
+
+def write_report(path: str, records: List[dict]):
+    (write_parquet if path.endswith(".parquet") else write_jsonl)(path, records)
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a file of questions (one per line) as one batch.")
+    parser.add_argument("questions", help="Text file with one question per line.")
+    parser.add_argument("--out", required=True, help="Report path; .parquet for Parquet, anything else for JSONL.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS)
+    parser.add_argument("--plan-batch-size", type=int, default=DEFAULT_PLAN_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    import os
+    import time
+    import vertexai
+    from dotenv import load_dotenv
+    from agent.retail_agent import RetailAgent
+
+    load_dotenv()
+    project_id, region = os.getenv("PROJECT_ID"), os.getenv("REGION")
+    dataset_id, table_id = os.getenv("DATASET_ID"), os.getenv("TABLE_ID")
+    if not all([project_id, region, dataset_id, table_id]):
+        print("Error: Ensure PROJECT_ID, REGION, DATASET_ID, and TABLE_ID are set in your .env file.")
+        exit()
+    vertexai.init(project=project_id, location=region)
+
+    with open(args.questions) as f:
+        questions = [line.strip() for line in f if line.strip()]
+    agent = RetailAgent(model="gemini-2.5-flash", name="retail_analytics_agent", dataset=f"{dataset_id}.{table_id}")
+    started = time.perf_counter()
+    payloads = agent.query_batch({"questions": questions, "workers": args.workers,
+                                  "plan_batch_size": args.plan_batch_size})
+    elapsed = time.perf_counter() - started
+    write_report(args.out, report_records(questions, payloads))
+    print(f"{len(questions)} questions in {elapsed:.1f}s ({len(questions) / elapsed:.2f}/s) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# cache.py
+#
+# Three-level result cache for RetailAgent.query:
+#   plan    : normalized user message (+ schema)   -> {"type", "raw_sql", "visualization"}
+#   rows    : raw_sql (+ table version)             -> formatted result rows
+#   summary : (normalized message, data hash)       -> summary "content"
+#
+# Each level has its own backend so size limits and eviction are independent.
+# Backends store JSON text and evict by LRU, TTL and total byte size.
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+LEVELS = ("plan", "rows", "summary")
+
+DEFAULT_TTL_SECONDS = {"plan": 24 * 3600.0, "rows": 3600.0, "summary": 24 * 3600.0}
+DEFAULT_MAX_BYTES = {"plan": 4 * 1024 * 1024, "rows": 64 * 1024 * 1024, "summary": 4 * 1024 * 1024}
+
+
+def normalize_message(message: str) -> str:
+    """Lower-cases, collapses whitespace and strips trailing punctuation so trivial variants share an entry."""
+    text = re.sub(r"\s+", " ", (message or "").strip().lower())
+    return text.rstrip(" .!?")
+
+
+def stable_hash(value) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU + TTL store bounded by the total size of the stored JSON."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (expires_at, text)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, text = item
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._items.move_to_end(key)
+            return text
+
+    def set(self, key, text):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = (time.time() + self.ttl, text)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._items:
+                self._remove(next(iter(self._items)))
+
+    def _remove(self, key):
+        _, text = self._items.pop(key)
+        self._bytes -= len(text.encode("utf-8"))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def items(self):
+        """Unexpired (key, text) pairs, least recently used first."""
+        now = time.time()
+        with self._lock:
+            return [(key, text) for key, (expires_at, text) in self._items.items() if expires_at >= now]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SQLiteBackend:
+    """Local disk store with the same LRU + TTL + byte-size semantics; survives process restarts."""
+
+    def __init__(self, path: str, table: str, max_bytes: int, ttl: float):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT, size INTEGER, expires_at REAL, last_access REAL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_lru ON {table} (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key, text):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, text, size, now + self.ttl, now),
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+            total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = self._conn.execute(
+                    f"SELECT key, size FROM {self.table} ORDER BY last_access LIMIT 1"
+                ).fetchone()
+                if oldest is None:
+                    break
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def items(self):
+        """Unexpired (key, text) pairs, least recently used first."""
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT key, value FROM {self.table} WHERE expires_at >= ? ORDER BY last_access", (time.time(),)
+            ).fetchall()
+
+    def __len__(self):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    # sqlite connections cannot be pickled; reopen on the other side.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_conn", None)
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["table"], state["max_bytes"], state["ttl"])
+
+
+def memory_backends(max_bytes=None, ttl=None) -> dict:
+    max_bytes = {**DEFAULT_MAX_BYTES, **(max_bytes or {})}
+    ttl = {**DEFAULT_TTL_SECONDS, **(ttl or {})}
+    return {level: MemoryBackend(max_bytes[level], ttl[level]) for level in LEVELS}
+
+
+def sqlite_backends(path: str, max_bytes=None, ttl=None) -> dict:
+    max_bytes = {**DEFAULT_MAX_BYTES, **(max_bytes or {})}
+    ttl = {**DEFAULT_TTL_SECONDS, **(ttl or {})}
+    return {level: SQLiteBackend(path, f"cache_{level}", max_bytes[level], ttl[level]) for level in LEVELS}
+
+
+class ResultCache:
+    """
+    Front end over one backend per level. Keys are hashed, values are JSON.
+    Row entries are keyed on the table's `modified` timestamp, and
+    note_table_version() drops the rows level as soon as it changes.
+    """
+
+    def __init__(self, backends: dict = None):
+        self.backends = backends or memory_backends()
+        self.stats = {level: {"hits": 0, "misses": 0} for level in LEVELS}
+        self._table_version = None
+        self._stats_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_stats_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._stats_lock = threading.Lock()
+
+    # --- Keys ---
+    @staticmethod
+    def plan_key(message: str, schema_str: str, context: str = "") -> str:
+        # context: what an earlier turn contributes (a follow-up's meaning depends on it)
+        parts = [normalize_message(message), schema_str]
+        return stable_hash(parts + [context] if context else parts)
+
+    def rows_key(self, raw_sql: str) -> str:
+        return stable_hash([raw_sql.strip(), self._table_version])
+
+    @staticmethod
+    def summary_key(message: str, data) -> str:
+        return stable_hash([normalize_message(message), stable_hash(data)])
+
+    # --- Access ---
+    def get(self, level: str, key: str):
+        text = self.backends[level].get(key)
+        with self._stats_lock:
+            self.stats[level]["hits" if text is not None else "misses"] += 1
+        return json.loads(text) if text is not None else None
+
+    def set(self, level: str, key: str, value):
+        try:
+            self.backends[level].set(key, json.dumps(value, default=str))
+        except Exception as e:
+            print(f"Warning: Could not write {level} cache entry. {e}")
+
+    # --- Invalidation ---
+    def note_table_version(self, modified):
+        """Called with the table's `modified` timestamp; cached rows are dropped when it changes."""
+        version = str(modified) if modified is not None else None
+        if version == self._table_version:
+            return
+        if self._table_version is not None:
+            print(f"Table modified ({self._table_version} -> {version}); invalidating cached results.")
+            self.backends["rows"].clear()
+        self._table_version = version
+
+    def clear(self):
+        for backend in self.backends.values():
+            backend.clear()
+
+    # --- Snapshots (warm start of a new serving instance, see warmup.py) ---
+    def export_snapshot(self, path: str, levels=LEVELS) -> int:
+        """Writes the unexpired entries of levels to a JSONL file; returns how many were written."""
+        written = 0
+        with open(path, "w") as f:
+            f.write(json.dumps({"snapshot": 1, "table_version": self._table_version}) + "\n")
+            for level in levels:
+                for key, text in self.backends[level].items():
+                    f.write(json.dumps({"level": level, "key": key, "value": text}) + "\n")
+                    written += 1
+        return written
+
+    def load_snapshot(self, path: str) -> int:
+        """
+        Loads a snapshot written by export_snapshot; returns how many entries were loaded.
+        Rows are only loaded if they were cached for the table version noted here (call
+        note_table_version first); plans are keyed on the schema and summaries on the data,
+        so stale ones are never matched.
+        """
+        loaded = 0
+        with open(path) as f:
+            header = json.loads(f.readline() or "{}")
+            same_table = header.get("table_version") is not None and header.get("table_version") == self._table_version
+            for line in f:
+                entry = json.loads(line)
+                if entry["level"] not in self.backends or entry["level"] == "rows" and not same_table:
+                    continue
+                self.backends[entry["level"]].set(entry["key"], entry["value"])
+                loaded += 1
+        return loaded
+
+    def snapshot_stats(self) -> dict:
+        with self._stats_lock:
+            return {level: dict(counts) for level, counts in self.stats.items()}
@@ -0,0 +1,113 @@
+# columns.py
+#
+# What the UI needs to re-shape a result in the browser without another turn:
+#   describe_columns : typed column metadata (number/date/string, dimension or
+#                      measure, and the aggregate that produced each measure)
+#   refine_sql       : the same query grouped by one more low-cardinality
+#                      dimension. When that result is small it is sent along
+#                      as "detail", so the UI can also re-group by the added
+#                      dimension.
+# A measure can be re-aggregated over fewer dimensions only if its aggregate
+# is SUM, COUNT, MIN or MAX. AVG and COUNT(DISTINCT) are not re-aggregable,
+# so queries using them are never refined and the UI does not re-group them.
+
+import re
+from typing import Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+# Dimensions of the retail table with few distinct values (those of the rollup tables).
+DETAIL_DIMENSIONS = ("product_category", "region")
+# Detail costs a second warehouse query per turn, so it is off unless RetailAgent is given a
+# detail_rows cap; this is the suggested cap (the detail result is only sent up to this many rows).
+DEFAULT_DETAIL_ROWS = 500
+
+# Aggregates whose partial results combine with the same function (COUNT partials are summed).
+REAGGREGATE = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+_AGGREGATES = {exp.Sum: "sum", exp.Count: "count", exp.Avg: "avg", exp.Min: "min", exp.Max: "max"}
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def _aggregate_name(node: exp.Expression) -> Optional[str]:
+    if isinstance(node, exp.Count) and isinstance(node.this, exp.Distinct):
+        return "count_distinct"
+    for cls, name in _AGGREGATES.items():
+        if isinstance(node, cls):
+            return name
+    return "other" if isinstance(node, exp.AggFunc) or node.find(exp.AggFunc) else None
+
+
+def projection_aggregates(sql: str) -> dict:
+    """
+    {output column: "sum" | "count" | "avg" | "min" | "max" | "count_distinct" | "other" | None} for sql.
+    Columns passed through SELECT * wrappers (as follow-up SQL builds them) are looked up in the inner query.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="bigquery")
+    except sqlglot.errors.ParseError:
+        return {}
+    aggregates = {}
+    for select in tree.find_all(exp.Select):  # outermost first
+        for projection in select.expressions:
+            if not isinstance(projection, exp.Star):
+                aggregates.setdefault(projection.alias_or_name, _aggregate_name(projection.unalias()))
+    return aggregates
+
+
+def describe_columns(sql: str, digest: dict) -> list:
+    """[{"name", "type", "role", "aggregate"}] for every result column, in order."""
+    aggregates = projection_aggregates(sql)
+    described = []
+    for name, stats in (digest.get("columns") or {}).items():
+        aggregate = aggregates.get(name)
+        # NUMERIC/BIGNUMERIC sums arrive as Decimal (text once stored as JSON) but are still numbers.
+        if stats["type"] == "numeric" or aggregate in ("sum", "count", "avg", "count_distinct"):
+            kind = "number"
+        elif stats.get("top_values") and all(_ISO_DATE.match(value) for value, _ in stats["top_values"]):
+            kind = "date"
+        else:
+            kind = "string"
+        role = "measure" if kind == "number" and (aggregate or name not in aggregates) else "dimension"
+        described.append({"name": name, "type": kind, "role": role,
+                          "aggregate": aggregate if role == "measure" else None})
+    return described
+
+
+def refine_sql(sql: str, dimensions=DETAIL_DIMENSIONS) -> Optional[Tuple[str, str]]:
+    """
+    (sql grouped by one more dimension, that dimension), or None if the query
+    cannot be refined exactly: it needs a single GROUP BY over one table, no
+    LIMIT, HAVING, DISTINCT or window functions, and only re-aggregable measures.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="bigquery")
+    except sqlglot.errors.ParseError:
+        return None
+    if not isinstance(tree, exp.Select) or not tree.args.get("group"):
+        return None
+    if any(tree.args.get(arg) for arg in ("limit", "having", "distinct", "qualify")):
+        return None
+    if any(tree.find(node) for node in (exp.Join, exp.CTE, exp.Window, exp.Subquery)):
+        return None
+    names = set()
+    for projection in tree.expressions:
+        if isinstance(projection, exp.Star):
+            return None
+        aggregate = _aggregate_name(projection.unalias())
+        if aggregate is not None and aggregate not in REAGGREGATE:
+            return None
+        names.add(projection.alias_or_name.lower())
+    group = tree.args["group"].expressions
+    if any(isinstance(e, exp.Literal) for e in group):  # GROUP BY 1: positions would shift
+        return None
+    grouped = {e.name.lower() for e in group if isinstance(e, exp.Column)}
+    dimension = next((d for d in dimensions if d not in grouped and d not in names), None)
+    if dimension is None:
+        return None
+    refined = tree.copy()
+    position = next((i for i, p in enumerate(refined.expressions) if p.find(exp.AggFunc)), len(refined.expressions))
+    refined.expressions.insert(position, exp.column(dimension))
+    refined.set("expressions", refined.expressions)
+    refined.args["group"].append("expressions", exp.column(dimension))
+    return refined.sql(dialect="bigquery"), dimension
@@ -3,6 +3,7 @@ import vertexai
 from vertexai import agent_engines
 from agent.retail_agent import RetailAgent
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,6 +19,15 @@ TABLE_ID = os.getenv("TABLE_ID")
 
 DATASET = f"{DATASET_ID}.{TABLE_ID}" if DATASET_ID and TABLE_ID else None
 REQUIREMENTS_FILE = "requirements.txt"  # your local requirements
+# Results of at most this many rows also get _detail rows for re-grouping in the browser (0 = off).
+DETAIL_ROWS = int(os.getenv("AGENT_DETAIL_ROWS", "0"))
+# Instances kept running so a request never waits for a cold start (0 lets the service scale to zero).
+MIN_INSTANCES = int(os.getenv("MIN_INSTANCES", "1"))
+MAX_INSTANCES = int(os.getenv("MAX_INSTANCES", "10"))
+# Result cache loaded by each new instance in set_up(); build it with `python -m agent.warmup snapshot`.
+CACHE_SNAPSHOT = os.getenv("CACHE_SNAPSHOT", "cache_snapshot.jsonl")
+# Asked once after deployment to check the agent answers end to end; empty to skip.
+SMOKE_QUERY = os.getenv("SMOKE_QUERY", "Total sales by region")
 
 def deploy_agent():
     if not all([PROJECT_ID, REGION, STAGING_BUCKET, DATASET]):
@@ -31,11 +41,23 @@ def deploy_agent():
         staging_bucket=STAGING_BUCKET
     )
 
+    extra_packages = ["agent"]
+    snapshot = None
+    if CACHE_SNAPSHOT and os.path.exists(CACHE_SNAPSHOT):
+        snapshot = CACHE_SNAPSHOT
+        extra_packages.append(snapshot)
+        print(f"▶ Shipping cache snapshot {snapshot}")
+    elif CACHE_SNAPSHOT:
+        print(f"⚠️ {CACHE_SNAPSHOT} not found. New instances will start with an empty cache.")
+
     print("▶ Creating RetailAgent instance")
     agent_instance = RetailAgent(
         model="gemini-2.5-flash",
         name="retail_analytics_agent",
-        dataset=DATASET
+        dataset=DATASET,
+        project=PROJECT_ID,
+        detail_rows=DETAIL_ROWS,
+        cache_snapshot=snapshot
     )
 
     # Read requirements.txt for deployment
@@ -46,11 +68,13 @@ def deploy_agent():
         print(f"⚠️ {REQUIREMENTS_FILE} not found. Using empty requirements list.")
         requirements = []
 
-    print("▶ Deploying agent to Vertex AI")
+    print(f"▶ Deploying agent to Vertex AI (min_instances={MIN_INSTANCES}, max_instances={MAX_INSTANCES})")
     remote_agent = agent_engines.create(
         agent_instance,
         requirements=requirements,
-        extra_packages=["agent"]
+        extra_packages=extra_packages,
+        min_instances=MIN_INSTANCES,
+        max_instances=MAX_INSTANCES
     )
 
     print("\n===============================================")
@@ -59,5 +83,25 @@ def deploy_agent():
     print(remote_agent.name)
     print("===============================================")
 
+    if SMOKE_QUERY:
+        smoke_test(remote_agent, SMOKE_QUERY)
+
+
+def smoke_test(remote_agent, message):
+    """Asks one question of the deployed agent; a deployment that cannot answer it is reported, not left for users to find."""
+    print(f"\n▶ Smoke query: {message}")
+    started = time.perf_counter()
+    try:
+        result = remote_agent.query(input={"message": message})
+    except Exception as e:
+        print(f"❌ Smoke query failed: {e}")
+        return False
+    latency = time.perf_counter() - started
+    if result.get("_degraded") or not result.get("data"):
+        print(f"❌ Smoke query returned no data after {latency:.1f}s: {result.get('content')}")
+        return False
+    print(f"✅ Smoke query answered in {latency:.1f}s with {len(result['data'])} rows: {result.get('content')}")
+    return True
+
 if __name__ == "__main__":
     deploy_agent()
@@ -0,0 +1,211 @@
+# followups.py
+#
+# Answers a follow-up question from the rows of the session's previous turn
+# when it only re-shapes a result the session already holds:
+#   chart   : "as a pie chart", "show that as a table"
+#   top N   : "top 3", "bottom 5"
+#   sort    : "sort ascending", "largest first", "alphabetically"
+#   filter  : "only North", "just East and West", "exclude South"
+#   regroup : "by category" when the measure is additive (SUM/COUNT) and the
+#             column is among the rows
+# Like the router's classifier it is deliberately conservative. It acts only
+# when every word of the message is either one of these operations or
+# filler. Anything else goes to the model with the previous SQL as context.
+# The answer carries SQL over the previous query that produces the same rows,
+# so the user and later turns see an accurate query.
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+from agent.columns import projection_aggregates
+from agent.routing import TOKEN_RE
+
+CHART_TYPES = {"pie": "pie_chart", "bar": "bar_chart", "line": "line_chart", "table": "table", "tabular": "table"}
+
+FILLER = {
+    "show", "me", "it", "that", "this", "those", "them", "these", "as", "a", "an", "the", "in", "into", "to",
+    "instead", "now", "please", "make", "change", "switch", "turn", "convert", "display", "view", "chart",
+    "graph", "plot", "format", "only", "just", "exclude", "excluding", "without", "except", "remove", "drop",
+    "not", "and", "or", "but", "with", "same", "data", "result", "results", "rows", "values", "can", "you",
+    "could", "what", "about", "how", "sort", "sorted", "order", "ordered", "by", "per", "again", "then", "also",
+    "let's", "lets", "let", "do", "i", "want", "see", "give", "use", "for", "of", "first", "ok", "okay", "one",
+    "version", "form", "would", "like", "keep", "filter", "filtered", "on",
+}
+EXCLUDE_WORDS = {"exclude", "excluding", "without", "except", "remove", "drop", "not"}
+ASCENDING = re.compile(r"\b(?:asc|ascending|alphabetically|(?:smallest|lowest|least)\s+first|low(?:est)?\s+to\s+high(?:est)?)\b")
+SORT = re.compile(r"\b(?:sort(?:ed)?|order(?:ed)?|desc|descending|(?:largest|highest|biggest|most)\s+first|"
+                  r"high(?:est)?\s+to\s+low(?:est)?)\b")
+TOP_N = re.compile(r"\b(top|bottom|highest|lowest|largest|smallest|best|worst)\s+(\d{1,4})\b")
+CHART = re.compile(r"\b(pie|bar|line)(?:\s+(?:chart|graph))?\b|\b(table|tabular)\b")
+GROUP_BY = re.compile(r"\b(?:by|per)\s+([a-z][a-z_ ]*)")
+MAX_FILTER_VALUES = 200
+
+
+@dataclass
+class FollowUp:
+    rows: list
+    visualization: dict
+    raw_sql: str
+    operations: List[str]
+    reshaped: bool  # False when only the chart changed, so the previous summary still applies
+
+    def as_metadata(self) -> dict:
+        return {"operations": self.operations, "reshaped": self.reshaped}
+
+
+def _ident(column: str) -> str:
+    return f"`{column}`"
+
+
+def _literal(value) -> str:
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def additive_measure(sql: str, measure: str) -> bool:
+    """True if the query computes measure with SUM or COUNT, so sub-totals can be added up."""
+    return projection_aggregates(sql).get(measure) in ("sum", "count")
+
+
+def _column_names(column: str) -> List[str]:
+    words = column.lower().split("_")
+    names = {" ".join(words), words[-1]}
+    for name in list(names):
+        names.add(name[:-1] + "ies" if name.endswith("y") else name + "s")
+    return sorted(names, key=len, reverse=True)
+
+
+def _number(value):
+    # Stored rows went through JSON, where NUMERIC/BIGNUMERIC values became strings.
+    if isinstance(value, (int, float)) or value is None:
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sort_key(column):
+    # Numbers before text, None last, whatever mix the column holds.
+    def key(row):
+        value = row.get(column)
+        if value is None:
+            return (2, 0, "")
+        number = _number(value)
+        if number is not None:
+            return (0, number, "")
+        return (1, 0, str(value).lower())
+    return key
+
+
+def plan_followup(message: str, turn: dict) -> Optional[FollowUp]:
+    """The locally computed answer to message given the previous turn, or None if the model is needed."""
+    rows = turn.get("rows")
+    if not rows or not turn.get("raw_sql"):
+        return None
+    visualization = dict(turn.get("visualization") or {})
+    columns = list(rows[0].keys())
+    measure = visualization.get("y_axis")
+    if measure not in columns:
+        numeric = [c for c in columns if _number(rows[0].get(c)) is not None]
+        if not numeric:
+            return None
+        measure = numeric[-1]
+    text = " " + " ".join((message or "").lower().split()) + " "
+    sql = turn["raw_sql"]
+    operations = []
+    reshaped = False
+
+    # Chart type
+    match = CHART.search(text)
+    if match:
+        chart = CHART_TYPES[match.group(1) or match.group(2)]
+        if chart != visualization.get("chart_type"):
+            visualization["chart_type"] = chart
+            operations.append(f"chart {chart}")
+        text = text[:match.start()] + " " + text[match.end():]
+
+    # Filters on text values present in the rows
+    exclude = bool(EXCLUDE_WORDS & set(TOKEN_RE.findall(text)))
+    for column in columns:
+        if column == measure:
+            continue
+        values = {str(row[column]).lower() for row in rows if isinstance(row.get(column), str)}
+        if not values or len(values) > MAX_FILTER_VALUES:
+            continue
+        found = []
+        for value in sorted(values, key=len, reverse=True):
+            pattern = re.compile(r"\b" + re.escape(value) + r"\b")
+            if pattern.search(text):
+                found.append(value)
+                text = pattern.sub(" ", text)
+        if found:
+            rows = [row for row in rows if (str(row.get(column)).lower() in found) != exclude]
+            originals = sorted({str(row[column]) for row in turn["rows"] if str(row.get(column)).lower() in found})
+            sql = (f"SELECT * FROM ({sql}) WHERE {_ident(column)} {'NOT IN' if exclude else 'IN'} "
+                   f"({', '.join(_literal(v) for v in originals)})")
+            operations.append(f"{'exclude' if exclude else 'only'} {column} {', '.join(originals)}")
+            reshaped = True
+    if not rows:
+        return None
+
+    # Top/bottom N and sorting
+    order = None
+    match = TOP_N.search(text)
+    if match:
+        descending = match.group(1) in ("top", "highest", "largest", "best")
+        order = (measure, descending, int(match.group(2)))
+        text = text[:match.start()] + " " + text[match.end():]
+    elif SORT.search(text) or ASCENDING.search(text):
+        descending = not ASCENDING.search(text)
+        key = visualization.get("x_axis") if "alphabetically" in text else measure
+        by = re.search(r"\bby\s+([a-z_ ]+)", text)
+        if by:
+            for column in columns:
+                name = next((n for n in _column_names(column) if by.group(1).startswith(n)), None)
+                if name:
+                    key = column
+                    text = text[:by.start()] + " " + text[by.start(1) + len(name):]
+                    break
+        order = (key, descending, None)
+        text = SORT.sub(" ", ASCENDING.sub(" ", text))
+
+    # Re-grouping by another column of the rows
+    match = GROUP_BY.search(text)
+    if match:
+        column = next((c for c in columns if c != measure
+                       and any(match.group(1).startswith(n) for n in _column_names(c))), None)
+        if column is not None:
+            if column != visualization.get("x_axis"):
+                if not additive_measure(turn["raw_sql"], measure):
+                    return None
+                totals = OrderedDict()
+                for row in rows:
+                    totals[row.get(column)] = totals.get(row.get(column), 0) + (_number(row.get(measure)) or 0)
+                rows = [{column: key, measure: round(value, 2) if isinstance(value, float) else value}
+                        for key, value in totals.items()]
+                sql = (f"SELECT {_ident(column)}, SUM({_ident(measure)}) AS {_ident(measure)} "
+                       f"FROM ({sql}) GROUP BY {_ident(column)}")
+                visualization["x_axis"] = column
+                operations.append(f"group by {column}")
+                reshaped = True
+            name = next(n for n in _column_names(column) if match.group(1).startswith(n))
+            text = text[:match.start()] + " " + text[match.start(1) + len(name):]
+
+    if order is not None:
+        key, descending, limit = order
+        rows = sorted(rows, key=_sort_key(key), reverse=descending)
+        sql = f"SELECT * FROM ({sql}) ORDER BY {_ident(key)} {'DESC' if descending else 'ASC'}"
+        if limit:
+            rows = rows[:limit]
+            sql += f" LIMIT {limit}"
+        operations.append(f"{'top' if descending else 'bottom'} {limit} by {key}" if limit
+                          else f"sort by {key} {'desc' if descending else 'asc'}")
+        reshaped = True
+
+    # Every remaining word must be filler; otherwise the question asks for something new.
+    if not operations or any(token not in FILLER for token in TOKEN_RE.findall(text)):
+        return None
+    visualization.setdefault("y_axis", measure)
+    return FollowUp(rows=rows, visualization=visualization, raw_sql=sql, operations=operations, reshaped=reshaped)
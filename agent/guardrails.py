@@ -0,0 +1,145 @@
+# guardrails.py
+#
+# Pre-flight checks for model-generated SQL before it reaches BigQuery:
+#   1. parse (BigQuery dialect) and accept a single read-only query only
+#   2. every table must live in the agent's dataset; bare table names are qualified,
+#      and a project-qualified name must name the agent's own project
+#   3. add a LIMIT to the outermost query when there is none
+#   4. dry-run to get the bytes-processed estimate and reject queries over budget
+# Execution itself is bounded by maximum_bytes_billed and a job timeout, which
+# the agent passes to Warehouse.execute_batches.
+
+import os
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional
+
+import sqlglot
+from sqlglot import exp
+
+DEFAULT_ROW_LIMIT = 10000
+DEFAULT_MAX_BYTES_SCANNED = 10 * 1024 ** 3   # 10 GiB per query
+DEFAULT_JOB_TIMEOUT_SECONDS = 30.0
+
+# Any of these anywhere in the tree means the statement is not read-only.
+FORBIDDEN_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop,
+    exp.Alter, exp.Command, exp.TruncateTable,
+)
+
+
+def default_project() -> Optional[str]:
+    """The agent's GCP project: PROJECT_ID from .env, else the one Google Cloud runtimes set."""
+    return os.getenv("PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT")
+
+
+class SqlRejected(Exception):
+    """
+    Raised when generated SQL fails a guardrail; the message is shown to the user.
+    repairable is False when rewriting the query cannot help (e.g. the scan budget).
+    """
+
+    def __init__(self, message: str, repairable: bool = True):
+        super().__init__(message)
+        self.repairable = repairable
+
+
+@dataclass
+class PreflightResult:
+    sql: str
+    original_sql: str
+    limit_injected: bool = False
+    qualified_tables: bool = False
+    estimated_bytes: Optional[int] = None
+    maximum_bytes_billed: Optional[int] = None
+    rollup: Optional[str] = None
+
+    def as_metadata(self) -> dict:
+        data = asdict(self)
+        data.pop("original_sql")
+        data.pop("sql")
+        data["rewritten"] = self.sql != self.original_sql
+        return data
+
+
+class SqlGuard:
+    def __init__(
+        self,
+        dataset: str,
+        row_limit: int = DEFAULT_ROW_LIMIT,
+        max_bytes_scanned: int = DEFAULT_MAX_BYTES_SCANNED,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT_SECONDS,
+        dry_run_enabled: bool = True,
+        project: Optional[str] = None,
+    ):
+        self.dataset = dataset
+        # Tables qualified with any other project (or with any project, when it is unknown) are rejected.
+        self.project = project
+        self.dataset_id, self.table_id = dataset.split(".")
+        self.row_limit = row_limit
+        self.max_bytes_scanned = max_bytes_scanned
+        self.job_timeout = job_timeout
+        self.dry_run_enabled = dry_run_enabled
+
+    # --- Static checks and rewrites (no network) ---
+    def check(self, raw_sql: str) -> PreflightResult:
+        try:
+            statements = [s for s in sqlglot.parse(raw_sql, read="bigquery") if s is not None]
+        except sqlglot.errors.ParseError as e:
+            raise SqlRejected(f"Generated SQL could not be parsed: {e}")
+        if len(statements) != 1:
+            raise SqlRejected("Generated SQL must be a single statement.")
+        tree = statements[0]
+
+        if not isinstance(tree, exp.Query) or any(tree.find_all(*FORBIDDEN_NODES)):
+            raise SqlRejected("Only SELECT queries are allowed.", repairable=False)
+
+        result = PreflightResult(sql=raw_sql, original_sql=raw_sql)
+
+        cte_names = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+        for table in tree.find_all(exp.Table):
+            if not table.db and table.name in cte_names:
+                continue
+            if not table.db and table.name == self.table_id:
+                table.set("db", exp.to_identifier(self.dataset_id))
+                result.qualified_tables = True
+                continue
+            if (table.db != self.dataset_id or table.name != self.table_id
+                    or (table.catalog and table.catalog != self.project)):
+                name = ".".join(part for part in (table.catalog, table.db, table.name) if part)
+                raise SqlRejected(f"Queries may only read {self.dataset}; found {name}.")
+
+        if self.row_limit and tree.args.get("limit") is None:
+            tree = tree.limit(self.row_limit)
+            result.limit_injected = True
+
+        if result.limit_injected or result.qualified_tables:
+            result.sql = tree.sql(dialect="bigquery")
+        return result
+
+    # --- Full pre-flight ---
+    def preflight(self, raw_sql: str, dry_run: Optional[Callable[[str], int]] = None) -> PreflightResult:
+        """
+        Runs check() and, when a dry_run callable is given, estimates the bytes the
+        query would scan. dry_run takes the SQL text and returns bytes processed.
+        """
+        return self.enforce_budget(self.check(raw_sql), dry_run)
+
+    def enforce_budget(self, result: PreflightResult, dry_run: Optional[Callable[[str], int]] = None) -> PreflightResult:
+        """Dry-run half of preflight(), for callers that ran check() earlier (e.g. before a cache lookup)."""
+        result.maximum_bytes_billed = self.max_bytes_scanned
+        if dry_run is not None and self.dry_run_enabled:
+            result.estimated_bytes = dry_run(result.sql)
+            if self.max_bytes_scanned and result.estimated_bytes and result.estimated_bytes > self.max_bytes_scanned:
+                raise SqlRejected(
+                    f"Query would scan {format_bytes(result.estimated_bytes)}, over the "
+                    f"{format_bytes(self.max_bytes_scanned)} budget. Try narrowing the date range or columns.",
+                    repairable=False,
+                )
+        return result
+
+
+def format_bytes(num: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if num < 1024 or unit == "TB":
+            return f"{num:.1f} {unit}" if unit != "B" else f"{int(num)} B"
+        num /= 1024.0
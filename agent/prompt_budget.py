@@ -0,0 +1,146 @@
+# prompt_budget.py
+#
+# Keeps the summary prompt small however large the result is. Results are
+# written for the model as CSV (one header line, numbers rounded to a fixed
+# number of decimals) rather than JSON objects that repeat every key, and the
+# data part of the prompt is held to a token budget:
+#   rows   : a complete result that fits the budget is sent as it is
+#   digest : otherwise the digest (row count, per-column statistics, top rows
+#            by the main measure) plus evenly spaced sample rows, made leaner
+#            (fewer decimals, top values and top rows) until it fits
+# Token counts are estimated from the text length, so building a prompt never
+# costs a tokenizer call.
+
+import csv
+import io
+import math
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from agent.results import MAX_TRACKED_DISTINCT
+
+DEFAULT_SUMMARY_TOKEN_BUDGET = 1000
+# A 1-2 sentence summary gains little from more sample rows than this; the rest of the budget stays unspent.
+MAX_SAMPLE_ROWS = 10
+# Data-heavy text (digits, separators, short names) runs at about 3 characters per token, denser than prose.
+CHARS_PER_TOKEN = 3
+# Digest variants from richest to leanest: (decimals, top values per text column, top rows).
+DIGEST_LEVELS = ((2, 10, 10), (2, 5, 5), (0, 3, 3), (0, 0, 0))
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def format_number(value, decimals: int = 2):
+    """value with at most decimals decimal places and no trailing zeros; non-numbers are returned as they are."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    text = f"{value:.{decimals}f}"
+    return text.rstrip("0").rstrip(".") if "." in text else text
+
+
+def encode_csv(rows: List[dict], columns: Optional[List[str]] = None, decimals: int = 2) -> str:
+    """rows as CSV under a single header line; NULL is an empty field."""
+    if not rows:
+        return ""
+    columns = columns or list(rows[0])
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(["" if row.get(name) is None else format_number(row.get(name), decimals) for name in columns])
+    return out.getvalue()
+
+
+def sample_rows(rows: List[dict], count: int) -> List[dict]:
+    """count rows spread evenly over rows, in their original order."""
+    if count >= len(rows):
+        return list(rows)
+    if count <= 0:
+        return []
+    step = len(rows) / count
+    return [rows[int(i * step)] for i in range(count)]
+
+
+def _describe_column(name: str, stats: dict, decimals: int, top_values: int) -> str:
+    nulls = f", {stats['nulls']} nulls" if stats.get("nulls") else ""
+    if stats["type"] == "numeric":
+        values = ", ".join(f"{k} {format_number(stats[k], decimals)}" for k in ("min", "max", "mean", "sum"))
+        return f"- {name} (number): {values}{nulls}"
+    distinct = f"{stats['distinct']}+" if stats["distinct"] >= MAX_TRACKED_DISTINCT else stats["distinct"]
+    text = f"- {name} (text, {distinct} distinct{nulls})"
+    frequent = (stats.get("top_values") or [])[:top_values]
+    if frequent and frequent[0][1] > 1:  # all-unique values (ids) say nothing by frequency
+        text += ": most frequent " + ", ".join(f"{value} x{count}" for value, count in frequent)
+    return text
+
+
+def encode_digest(digest: dict, decimals: int = 2, top_values: int = 10, top_rows: int = 10,
+                  samples: Optional[List[dict]] = None, sampled_from: Optional[int] = None) -> str:
+    columns = list(digest.get("columns") or {})
+    lines = [f"Result: {digest['row_count']} rows. Columns:"]
+    lines += [_describe_column(name, stats, decimals, top_values) for name, stats in digest["columns"].items()]
+    top = (digest.get("top_rows") or [])[:top_rows]
+    if top:
+        lines.append(f"Top {len(top)} rows by {digest['top_rows_by']}:")
+        lines.append(encode_csv(top, columns, decimals).rstrip("\n"))
+    if samples:
+        source = f"the first {sampled_from} rows" if sampled_from and sampled_from < digest["row_count"] else "all rows"
+        lines.append(f"{len(samples)} rows sampled evenly from {source}:")
+        lines.append(encode_csv(samples, columns, decimals).rstrip("\n"))
+    return "\n".join(lines) + "\n"
+
+
+def _row_chars(rows: List[dict], decimals: int) -> int:
+    """Average CSV characters per row, from a sample of rows."""
+    probe = encode_csv(sample_rows(rows, 20), None, decimals)
+    return max(1, len(probe) // (probe.count("\n") or 1))
+
+
+def _fit_samples(digest: dict, level: tuple, rows: List[dict], budget: int) -> Optional[str]:
+    """The digest at level with as many sample rows as fit in budget, or None if the digest alone does not fit."""
+    decimals, top_values, top_rows = level
+    text = encode_digest(digest, decimals, top_values, top_rows)
+    spare = budget - estimate_tokens(text)
+    if spare < 0:
+        return None
+    if not rows:
+        return text
+    count = min(len(rows), MAX_SAMPLE_ROWS, spare * CHARS_PER_TOKEN // _row_chars(rows, decimals))
+    while count > 0:
+        sampled = encode_digest(digest, decimals, top_values, top_rows, sample_rows(rows, count), len(rows))
+        if estimate_tokens(sampled) <= budget:
+            return sampled
+        count = int(count * 0.8)
+    return text
+
+
+def summary_data(digest: dict, rows: Optional[List[dict]] = None,
+                 budget: int = DEFAULT_SUMMARY_TOKEN_BUDGET) -> Tuple[str, str]:
+    """
+    (the result as text for the summary prompt, "rows" or "digest"), within budget tokens when possible.
+    rows are the result rows the caller holds; they are complete when there are row_count of them.
+    """
+    rows = rows or []
+    # Complete results are encoded whole only when a sample says they can fit.
+    if rows and len(rows) == digest.get("row_count") and len(rows) * _row_chars(rows, 0) <= budget * CHARS_PER_TOKEN:
+        for decimals in (2, 0):
+            text = f"Result: {len(rows)} rows.\n" + encode_csv(rows, list(digest.get("columns") or rows[0]), decimals)
+            if estimate_tokens(text) <= budget:
+                return text, "rows"
+    for level in DIGEST_LEVELS:
+        text = _fit_samples(digest, level, rows, budget)
+        if text is not None:
+            return text, "digest"
+    # Too many columns even for bare statistics: keep the columns that fit.
+    lines = encode_digest(digest, *DIGEST_LEVELS[-1]).splitlines()
+    kept = [lines[0]]
+    for line in lines[1:]:
+        if estimate_tokens("\n".join(kept + [line, f"- ... and {len(lines)} more columns"])) > budget:
+            break
+        kept.append(line)
+    kept.append(f"- ... and {len(lines) - len(kept)} more columns")
+    return "\n".join(kept) + "\n", "digest"
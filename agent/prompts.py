@@ -0,0 +1,121 @@
+import json
+
+UI_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "content": {"type": "string"},
+        "type": {"type": "string"},
+        "visualization": {
+            "type": "object",
+            "properties": {
+                "chart_type": {"type": "string"},
+                "x_axis": {"type": "string"},
+                "y_axis": {"type": "string"}
+            }
+        },
+        "data": {"type": "array", "items": {"type": "object"}},
+        "raw_sql": {"type": "string"},
+    },
+    "required": ["type"], # Only type is always required. Others are optional.
+}
+
+# Serialized once at import time; it is identical for every request.
+UI_SCHEMA_JSON = json.dumps(UI_SCHEMA)
+
+
+def build_schema_prompt(dataset: str, schema_str: str) -> str:
+    if not schema_str:
+        return ""
+    return f"The table schema for {dataset} is: {schema_str}\n\n"
+
+
+def build_system_instruction_1(dataset: str, schema_prompt: str) -> str:
+    """Instruction for the first model call: SQL + visualization, or the reply itself for small talk."""
+    return (
+        "You are a Retail Analytics AI. Your first task is to analyze the user's request. If it's a general conversation, respond with only text. If it requires data analysis, generate a SQL query and a visualization object.\n"
+        f"Answer questions for dataset: {dataset}.\n\n"
+        f"{schema_prompt}"
+        "Your response MUST match the required JSON schema and rules. Only include the 'content' field for general conversation (rule 1).\n"
+        f"{UI_SCHEMA_JSON}\n\n"
+        "Rules:\n"
+        "1. For general conversational questions (e.g., 'Hello', 'How are you?', 'Thank you', 'What can you do?', 'Wonderful'), respond by setting 'type' to 'text', putting a helpful and concise reply in 'content', and by OMITTING 'raw_sql', 'data', and 'visualization'. DO NOT generate SQL or visualization for these questions.\n"
+        "2. If the user asks for a chart (e.g., 'bar chart', 'line chart', 'pie chart'), set 'type' to 'analytics' and populate the 'visualization' object with 'chart_type', 'x_axis' (the column for the x-axis or categories), and 'y_axis' (the column for the y-axis or values). For example, for a bar chart of sales by region, set `visualization: {'chart_type': 'bar_chart', 'x_axis': 'region', 'y_axis': 'total_sales'}`.\n"
+        "3. If the user asks for data in a 'table', 'tabular' format, or asks a question that results in a single row or value (e.g., 'what is the highest...'), set 'type' to 'analytics' and 'visualization.chart_type' to 'table'.\n"
+        "4. Always include the SQL query in `raw_sql` if a visualization is requested (i.e., when 'type' is 'analytics').\n"
+        "5. When filtering by date in BigQuery SQL, use direct comparisons like `transaction_date <= 'YYYY-MM-DD'` or `EXTRACT(MONTH FROM transaction_date) = 6` if extracting date parts. Do NOT use column names as date part names (e.g., `transaction_date` in `EXTRACT(transaction_date FROM transaction_date)` is incorrect).\n"
+        f"6. All table names in SQL queries MUST be fully qualified with the dataset name (e.g., {dataset}).\n"
+        "Return ONLY valid JSON."
+    )
+
+
+# The summary and small-talk instructions are fixed text placed before anything request-specific, so every
+# call starts with the same prefix (which the model service can reuse) and none of it is rebuilt per call.
+SUMMARY_INSTRUCTION = (
+    "You are a Retail Analytics AI. Your second task is to generate a concise, natural language summary of a query result "
+    "that answers the user's question. The result follows the question, as CSV with a header line or as per-column "
+    "statistics with top and sampled rows.\n"
+)
+SUMMARY_JSON_REPLY = (
+    "Provide a short summary (1-2 sentences) in the 'content' field. Your response must be a valid JSON with only the 'content' field.\n\n"
+)
+SUMMARY_TEXT_REPLY = "Provide a short summary (1-2 sentences). Reply with the summary text only, without JSON or markdown.\n\n"
+TEXT_REPLY_INSTRUCTION = (
+    "You are a Retail Analytics AI assistant. The user asked a general conversational question.\n"
+    "Please provide a helpful and concise text response in the 'content' field. Your response must be a valid JSON with only the 'content' field.\n\n"
+)
+
+
+def build_summary_prompt(question: str, data: str, streamed: bool = False) -> str:
+    """data is the result as encoded by prompt_budget.summary_data. Streamed summaries are asked for as plain text."""
+    reply = SUMMARY_TEXT_REPLY if streamed else SUMMARY_JSON_REPLY
+    return f"{SUMMARY_INSTRUCTION}{reply}User's question: {question}\n{data}"
+
+
+def build_text_reply_prompt(question: str) -> str:
+    return f"{TEXT_REPLY_INSTRUCTION}User's question: {question}\n"
+
+
+def build_sql_repair_prompt(sql: str, error: str) -> str:
+    """Follow-up turn after the model's own answer: the SQL it wrote and the error it produced."""
+    return (
+        "The SQL query in your previous answer failed with this error:\n"
+        f"{error}\n\n"
+        f"Failing SQL:\n{sql}\n\n"
+        "Fix the query and answer again with the same JSON response, with the corrected SQL in 'raw_sql'. "
+        "Keep the visualization unless the column names change. Return ONLY valid JSON."
+    )
+
+
+MAX_CONTEXT_SQL_CHARS = 1000
+
+
+def build_session_context(session: dict) -> str:
+    """Earlier turns of the session, placed between the static instruction and the new question."""
+    if not session.get("turns") and not session.get("summary"):
+        return ""
+    lines = ["Conversation so far (oldest first):"]
+    lines.extend(f"- {line}" for line in session.get("summary", []))
+    for turn in session.get("turns", []):
+        lines.append(f"- User asked: {turn['message']}")
+        if turn.get("raw_sql"):
+            lines.append(f"  SQL: {' '.join(turn['raw_sql'].split())[:MAX_CONTEXT_SQL_CHARS]}")
+            lines.append(f"  Visualization: {json.dumps(turn.get('visualization'))}")
+            lines.append(f"  Result: {turn.get('row_count', 0)} rows with columns {', '.join(turn.get('columns') or [])}")
+        else:
+            lines.append(f"  Answer: {(turn.get('content') or '')[:200]}")
+    lines.append(
+        "If the new question follows up on the most recent result (e.g. 'that', 'it', 'now split by ...', "
+        "'only ...', 'for last year instead'), answer it by modifying the most recent SQL rather than starting over."
+    )
+    return "\n".join(lines) + "\n\n"
+
+
+def build_batch_plan_prompt(questions: list) -> str:
+    """Replaces the single user question after system_instruction_1 when a batch is planned in one call."""
+    numbered = "\n".join(f"{i}. {' '.join(question.split())}" for i, question in enumerate(questions, 1))
+    return (
+        f"Answer each of the following {len(questions)} numbered questions independently, following the rules above.\n"
+        f"{numbered}\n\n"
+        f"Return ONLY a JSON array with exactly {len(questions)} objects, one per question in the same order, "
+        "each matching the required JSON schema."
+    )
@@ -0,0 +1,313 @@
+# resilience.py
+#
+# Timeouts, retries, hedging and circuit breaking for the agent's upstream
+# calls (the model and the warehouse):
+#   Deadline       : one per turn, from the request budget. Each stage gets its
+#                    share of the time that is left, so time a fast stage does
+#                    not use carries over to the later ones.
+#   retries        : exponential backoff with full jitter on retryable errors
+#                    (408/429/5xx, timeouts, dropped connections), never
+#                    sleeping past the stage deadline
+#   hedging        : when a model call has not answered after that stage's
+#                    observed p95 latency, a duplicate request is sent and the
+#                    first answer wins
+#   CircuitBreaker : one per dependency. After N consecutive failures, calls
+#                    fail fast for a cool-down, then a single probe is let through.
+# Exhausted retries, a blown deadline or an open circuit raise
+# UpstreamUnavailable, which RetailAgent turns into a degraded answer built
+# from cached parts where it has them, text only otherwise.
+
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from agent.tracing import current_span
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Share of the request budget per stage, in pipeline order. Stages not listed
+# (e.g. the text-only reply) may use whatever time is left.
+STAGE_ORDER = ("model.plan", "warehouse", "model.summary")
+DEFAULT_STAGE_SHARES = {"model.plan": 0.35, "warehouse": 0.4, "model.summary": 0.25}
+
+_current_deadline = contextvars.ContextVar("agent_deadline", default=None)
+
+
+class UpstreamUnavailable(Exception):
+    """A dependency could not answer within the turn's budget (or its circuit is open)."""
+
+    def __init__(self, dependency: str, stage: str, reason: str):
+        super().__init__(f"{dependency} unavailable during {stage}: {reason}")
+        self.dependency = dependency
+        self.stage = stage
+        self.reason = reason
+
+    def as_metadata(self) -> dict:
+        return {"dependency": self.dependency, "stage": self.stage, "reason": self.reason}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # google.api_core exceptions carry the HTTP status as .code (TooManyRequests -> 429, ...).
+    code = getattr(exc, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS
+
+
+@dataclass
+class ResiliencePolicy:
+    request_budget: float = 60.0
+    stage_shares: dict = field(default_factory=lambda: dict(DEFAULT_STAGE_SHARES))
+    max_attempts: int = 3
+    backoff_base: float = 0.2
+    backoff_cap: float = 5.0
+    hedge: bool = True
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    hedge_default_delay: Optional[float] = None  # used until enough latencies have been observed
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        """AGENT_REQUEST_BUDGET, AGENT_MAX_ATTEMPTS, AGENT_HEDGE, AGENT_BREAKER_THRESHOLD, AGENT_BREAKER_RESET."""
+        policy = cls()
+        for name, attribute, cast in (("AGENT_REQUEST_BUDGET", "request_budget", float),
+                                      ("AGENT_MAX_ATTEMPTS", "max_attempts", int),
+                                      ("AGENT_BREAKER_THRESHOLD", "breaker_failure_threshold", int),
+                                      ("AGENT_BREAKER_RESET", "breaker_reset_timeout", float)):
+            value = os.getenv(name)
+            if value:
+                try:
+                    setattr(policy, attribute, cast(value))
+                except ValueError:
+                    print(f"Warning: ignoring invalid {name}={value!r}.")
+        if os.getenv("AGENT_HEDGE"):
+            policy.hedge = os.getenv("AGENT_HEDGE").lower() in ("1", "true", "yes")
+        return policy
+
+
+class Deadline:
+    def __init__(self, budget: float, stage_shares: dict):
+        self.budget = budget
+        self.stage_shares = stage_shares
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def stage_timeout(self, stage: str) -> float:
+        remaining = self.remaining()
+        share = self.stage_shares.get(stage)
+        if share is None or stage not in STAGE_ORDER:
+            return remaining
+        later = sum(self.stage_shares.get(s, 0.0) for s in STAGE_ORDER[STAGE_ORDER.index(stage):])
+        return remaining * share / later if later else remaining
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one stage."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"  # let exactly one probe through
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Warning: circuit for {self.name} opened after {self.failures} failures.")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class Resilience:
+    def __init__(self, policy: Optional[ResiliencePolicy] = None):
+        self.policy = policy or ResiliencePolicy()
+        self._reset_runtime_state()
+
+    def _reset_runtime_state(self):
+        self._breakers = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    # Breaker state and latency history are per process; start fresh after unpickling.
+    def __getstate__(self):
+        return {"policy": self.policy}
+
+    def __setstate__(self, state):
+        self.policy = state["policy"]
+        self._reset_runtime_state()
+
+    def breaker(self, dependency: str) -> CircuitBreaker:
+        with self._lock:
+            if dependency not in self._breakers:
+                self._breakers[dependency] = CircuitBreaker(
+                    dependency, self.policy.breaker_failure_threshold, self.policy.breaker_reset_timeout
+                )
+            return self._breakers[dependency]
+
+    def latencies(self, stage: str) -> LatencyTracker:
+        with self._lock:
+            return self._latencies.setdefault(stage, LatencyTracker())
+
+    @contextmanager
+    def turn(self):
+        """Starts the deadline for one turn; calls made inside share its budget."""
+        token = _current_deadline.set(Deadline(self.policy.request_budget, self.policy.stage_shares))
+        try:
+            yield
+        finally:
+            _current_deadline.reset(token)
+
+    def _deadline(self) -> Deadline:
+        return _current_deadline.get() or Deadline(self.policy.request_budget, self.policy.stage_shares)
+
+    def stage_timeout(self, stage: str) -> float:
+        """Seconds the stage may use, given what is left of the current turn's budget."""
+        return self._deadline().stage_timeout(stage)
+
+    async def call(self, stage: str, dependency: str, attempt: Callable[[float], Awaitable], hedge: bool = False,
+                   retry_if: Optional[Callable[[], bool]] = None):
+        """
+        Runs attempt(timeout) under the stage deadline with retries, optional
+        hedging and the dependency's circuit breaker. retry_if, when given, can
+        veto a retry (e.g. after rows were already streamed to the client).
+        """
+        policy = self.policy
+        breaker = self.breaker(dependency)
+        stage_expires = time.monotonic() + self.stage_timeout(stage)
+        span = current_span()
+        failures = 0
+        while True:
+            if not breaker.allow():
+                span.set("circuit", "open")
+                raise UpstreamUnavailable(dependency, stage, "circuit open")
+            timeout = stage_expires - time.monotonic()
+            if timeout <= 0:
+                raise UpstreamUnavailable(dependency, stage, "deadline exceeded")
+            started = time.monotonic()
+            try:
+                if hedge and policy.hedge:
+                    result = await self._hedged(stage, attempt, timeout)
+                else:
+                    result = await asyncio.wait_for(attempt(timeout), timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The dependency answered (e.g. a 400 for bad SQL); that is not an outage.
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                failures += 1
+                reason = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                if failures >= policy.max_attempts or (retry_if is not None and not retry_if()):
+                    raise UpstreamUnavailable(dependency, stage, reason) from e
+                delay = random.uniform(0, min(policy.backoff_cap, policy.backoff_base * 2 ** (failures - 1)))
+                if time.monotonic() + delay >= stage_expires:
+                    raise UpstreamUnavailable(dependency, stage, f"deadline exceeded after {reason}") from e
+                span.add("retries")
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            self.latencies(stage).add(time.monotonic() - started)
+            return result
+
+    async def call_optional(self, stage: str, dependency: str, attempt: Callable[[float], Awaitable]):
+        """
+        A single attempt(timeout) for work the answer can do without (e.g. a speculative query):
+        skipped while the dependency's circuit is not closed, never retried, and never counted by
+        the breaker, so it cannot open the circuit for the turn's required calls.
+        """
+        if self.breaker(dependency).state != "closed":
+            current_span().set("circuit", "open")
+            raise UpstreamUnavailable(dependency, stage, "circuit not closed")
+        timeout = self.stage_timeout(stage)
+        if timeout <= 0:
+            raise UpstreamUnavailable(dependency, stage, "deadline exceeded")
+        return await asyncio.wait_for(attempt(timeout), timeout)
+
+    def _hedge_delay(self, stage: str) -> Optional[float]:
+        observed = self.latencies(stage).quantile(self.policy.hedge_quantile, self.policy.hedge_min_samples)
+        return observed if observed is not None else self.policy.hedge_default_delay
+
+    async def _hedged(self, stage: str, attempt: Callable[[float], Awaitable], timeout: float):
+        delay = self._hedge_delay(stage)
+        if delay is None or delay >= timeout:
+            return await asyncio.wait_for(attempt(timeout), timeout)
+
+        expires = time.monotonic() + timeout
+        primary = asyncio.ensure_future(attempt(timeout))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                current_span().set("hedged", True)
+                tasks.append(asyncio.ensure_future(attempt(expires - time.monotonic())))
+            pending = {task for task in tasks if not task.done()}
+            error = None
+            for task in tasks:
+                if task.done():
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, expires - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            current_span().set("hedge_won", True)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
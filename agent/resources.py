@@ -0,0 +1,193 @@
+# resources.py
+#
+# Long-lived clients (the model and the data warehouse) and schema metadata
+# shared by every RetailAgent.query call.
+# Everything is created lazily on first use so that the agent stays picklable
+# for deployment (locks and network clients are dropped in __getstate__ and
+# rebuilt on the serving replica).
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent.prompts import build_schema_prompt, build_system_instruction_1
+from agent.warehouse import Warehouse, warehouse_from_env
+
+DEFAULT_MODEL_NAME = "gemini-2.5-flash"
+DEFAULT_SCHEMA_TTL_SECONDS = 300.0
+DEFAULT_HTTP_POOL_SIZE = 16
+DEFAULT_EXECUTOR_WORKERS = 16
+
+
+def default_bq_client_factory(pool_size: int = DEFAULT_HTTP_POOL_SIZE):
+    """Creates a BigQuery client whose HTTP session keeps up to pool_size connections alive."""
+    from google.cloud import bigquery
+    import requests
+
+    client = bigquery.Client()
+    try:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        client._http.mount("https://", adapter)
+    except Exception as e:
+        print(f"Warning: Could not resize BigQuery HTTP pool. {e}")
+    return client
+
+
+def default_model_factory(model_name: str):
+    from vertexai.preview.generative_models import GenerativeModel
+
+    return GenerativeModel(model_name)
+
+
+class AgentResources:
+    """
+    Thread-safe holder for the Warehouse, the GenerativeModel and the table
+    schema. The schema is cached for schema_ttl seconds (or until
+    invalidate_schema() is called) and system_instruction_1 is only rebuilt
+    when the schema text actually changes.
+    """
+
+    def __init__(
+        self,
+        dataset: str,
+        model_name: str = DEFAULT_MODEL_NAME,
+        schema_ttl: float = DEFAULT_SCHEMA_TTL_SECONDS,
+        pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+        executor_workers: int = DEFAULT_EXECUTOR_WORKERS,
+        bq_client_factory=None,
+        model_factory=None,
+        warehouse_factory=None,
+    ):
+        self.dataset = dataset
+        self.model_name = model_name
+        self.schema_ttl = schema_ttl
+        self.pool_size = pool_size
+        self.executor_workers = executor_workers
+        self._bq_client_factory = bq_client_factory
+        self._model_factory = model_factory
+        self._warehouse_factory = warehouse_factory
+        self._reset_runtime_state()
+
+    def _reset_runtime_state(self):
+        self._lock = threading.RLock()
+        self._warehouse = None
+        self._model = None
+        self._executor = None
+        self._event_loop = None
+        self._schema_str = None
+        self._table_modified = None
+        self._schema_loaded_at = 0.0
+        self._instruction_key = None
+        self._system_instruction_1 = None
+
+    # --- Pickling: never ship live clients or locks to the deployment ---
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_lock", "_warehouse", "_model", "_executor", "_event_loop", "_schema_str", "_table_modified",
+                    "_schema_loaded_at", "_instruction_key", "_system_instruction_1"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_runtime_state()
+
+    # --- Clients ---
+    def _make_bq_client(self):
+        if self._bq_client_factory:
+            return self._bq_client_factory()
+        return default_bq_client_factory(self.pool_size)
+
+    @property
+    def warehouse(self) -> Warehouse:
+        """BigQuery by default; WAREHOUSE_BACKEND=duckdb or a warehouse_factory selects another backend."""
+        if self._warehouse is None:
+            with self._lock:
+                if self._warehouse is None:
+                    if self._warehouse_factory:
+                        self._warehouse = self._warehouse_factory()
+                    else:
+                        self._warehouse = warehouse_from_env(self.dataset, self._make_bq_client)
+        return self._warehouse
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    factory = self._model_factory or default_model_factory
+                    self._model = factory(self.model_name)
+        return self._model
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker threads for blocking calls (warehouse queries, row formatting) made from aquery."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.executor_workers, thread_name_prefix="retail-agent"
+                    )
+        return self._executor
+
+    @property
+    def event_loop(self) -> asyncio.AbstractEventLoop:
+        """Background event loop that the sync query() wrapper submits aquery() to."""
+        if self._event_loop is None:
+            with self._lock:
+                if self._event_loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="retail-agent-loop", daemon=True)
+                    thread.start()
+                    self._event_loop = loop
+        return self._event_loop
+
+    # --- Schema cache ---
+    def _schema_is_fresh(self) -> bool:
+        return self._schema_str is not None and (time.monotonic() - self._schema_loaded_at) < self.schema_ttl
+
+    def _load_schema(self):
+        table_info = self.warehouse.get_schema()
+        schema_str = ", ".join([f"{name}: {field_type}" for name, field_type in table_info.columns])
+        return schema_str, table_info.modified
+
+    def get_schema(self) -> str:
+        """Returns the cached "col: TYPE, ..." schema string, refreshing it after the TTL expires."""
+        if self._schema_is_fresh():
+            return self._schema_str
+        with self._lock:
+            if self._schema_is_fresh():
+                return self._schema_str
+            try:
+                self._schema_str, self._table_modified = self._load_schema()
+                self._schema_loaded_at = time.monotonic()
+            except Exception as e:
+                # Do not cache the failure; the next request will try again.
+                print(f"Warning: Could not get table schema. {e}")
+                return ""
+            return self._schema_str
+
+    @property
+    def table_modified(self):
+        """Last-modified timestamp of the table as of the most recent schema refresh."""
+        self.get_schema()
+        return self._table_modified
+
+    def invalidate_schema(self):
+        """Forces the next request to re-read the table schema."""
+        with self._lock:
+            self._schema_str = None
+            self._schema_loaded_at = 0.0
+
+    # --- Compiled prompts ---
+    def system_instruction_1(self) -> str:
+        schema_str = self.get_schema()
+        if self._instruction_key == schema_str and self._system_instruction_1 is not None:
+            return self._system_instruction_1
+        with self._lock:
+            if self._instruction_key != schema_str or self._system_instruction_1 is None:
+                schema_prompt = build_schema_prompt(self.dataset, schema_str)
+                self._system_instruction_1 = build_system_instruction_1(self.dataset, schema_prompt)
+                self._instruction_key = schema_str
+            return self._system_instruction_1
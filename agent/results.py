@@ -0,0 +1,244 @@
+# results.py
+#
+# Streams warehouse result pages (Arrow record batches, or pages of rows) into
+# a column-oriented buffer instead of materializing list-of-dicts twice. Each
+# page is held as Arrow arrays and formatted with column operations (float
+# rounding, DATE -> ISO string); only the rows kept for the UI, up to the
+# row/byte cap, are converted to Python values. Every page, including those
+# past the cap, also feeds a running digest (min/max/sum per numeric column,
+# top-k values per text column, top-k rows by the main measure) that is sent
+# to the summary model instead of the raw rows. Digest statistics are Arrow
+# aggregates and value counts, so a page costs per-column work, not per-cell.
+
+import heapq
+import json
+from collections import Counter
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DEFAULT_PAGE_SIZE = 5000
+DEFAULT_MAX_ROWS = 5000
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+DEFAULT_TOP_K = 10
+# Text columns stop tracking new distinct values beyond this (counts stay exact for tracked ones).
+MAX_TRACKED_DISTINCT = 10000
+# The UI payload size of a page is estimated from the JSON size of this many of its rows.
+BYTES_SAMPLE_ROWS = 200
+
+
+def to_array(values: list) -> pa.Array:
+    """A column of Python values as an Arrow array; a column of mixed types becomes text."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+def is_numeric(array: pa.Array) -> bool:
+    return pa.types.is_integer(array.type) or pa.types.is_floating(array.type)
+
+
+def format_array(array: pa.Array) -> pa.Array:
+    """Floats rounded to 2 dp and dates as ISO strings, as the UI payload shows them."""
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    if pa.types.is_floating(array.type):
+        return pc.round(array, 2)
+    if pa.types.is_date(array.type):
+        return array.cast(pa.string())
+    if pa.types.is_timestamp(array.type):
+        # isoformat() keeps the offset and drops zero microseconds, which no Arrow format string does.
+        return pa.array([None if v is None else v.isoformat() for v in array.to_pylist()], pa.string())
+    return array
+
+
+def iter_pages(row_iterator, page_size: int):
+    """Yields lists of rows, using RowIterator.pages when available so only one page is held at a time."""
+    pages = getattr(row_iterator, "pages", None)
+    if pages is not None:
+        for page in pages:
+            yield list(page)
+        return
+    page = []
+    for row in row_iterator:
+        page.append(row)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+class ColumnStats:
+    def __init__(self):
+        self.count = 0
+        self.nulls = 0
+        self.numeric = True
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+        self.values = Counter()
+
+    def update(self, array: pa.Array):
+        self.nulls += array.null_count
+        self.count += len(array) - array.null_count
+        if array.null_count == len(array):
+            return
+        if self.numeric and is_numeric(array):
+            bounds = pc.min_max(array)
+            page_min, page_max = float(bounds["min"].as_py()), float(bounds["max"].as_py())
+            self.min = page_min if self.min is None else min(self.min, page_min)
+            self.max = page_max if self.max is None else max(self.max, page_max)
+            self.sum += float(pc.sum(array).as_py())
+            return
+        self.numeric = False
+        if not pa.types.is_string(array.type) and not pa.types.is_large_string(array.type):
+            # Counted by their text, as the digest shows them (str(True), str(Decimal(...))).
+            array = pa.array([str(v) for v in array.drop_null().to_pylist()], pa.string())
+        counts = pc.value_counts(array.drop_null())
+        for key, count in zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()):
+            if key in self.values or len(self.values) < MAX_TRACKED_DISTINCT:
+                self.values[key] += count
+
+    def as_dict(self, top_k: int) -> dict:
+        if self.numeric and self.min is not None:
+            return {
+                "type": "numeric", "count": self.count, "nulls": self.nulls,
+                "min": round(self.min, 2), "max": round(self.max, 2), "sum": round(self.sum, 2),
+                "mean": round(self.sum / self.count, 2),
+            }
+        return {
+            "type": "text", "count": self.count, "nulls": self.nulls,
+            "distinct": len(self.values),
+            "top_values": self.values.most_common(top_k),
+        }
+
+
+class ResultBuffer:
+    """Columnar buffer for one query result, capped for the UI and digested for the summary model."""
+
+    def __init__(self, max_rows: int = DEFAULT_MAX_ROWS, max_bytes: int = DEFAULT_MAX_BYTES, top_k: int = DEFAULT_TOP_K):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.top_k = top_k
+        self.columns = None
+        self.data = {}
+        self.stats = {}
+        self.total_rows = 0
+        self.kept_rows = 0
+        self.kept_bytes = 0
+        self.truncated = False
+        self._measure = None
+        self._top_rows = []  # min-heap of (measure, seq, row)
+
+    def _init_columns(self, names):
+        self.columns = list(names)
+        self.data = {name: [] for name in self.columns}
+        self.stats = {name: ColumnStats() for name in self.columns}
+
+    def add_page(self, rows: list):
+        """Adds a page of row objects (dicts or bigquery Rows)."""
+        if not rows:
+            return
+        names = list(rows[0].keys())
+        raw_columns = [list(values) for values in zip(*(tuple(row.values()) for row in rows))]
+        self.add_arrays(names, [to_array(values) for values in raw_columns])
+
+    def add_batch(self, batch):
+        """Adds a pyarrow RecordBatch without going through per-row objects."""
+        if batch.num_rows == 0:
+            if self.columns is None:
+                self._init_columns(batch.schema.names)
+            return
+        self.add_arrays(batch.schema.names, batch.columns)
+
+    def add_arrays(self, names: list, arrays: list):
+        if self.columns is None:
+            self._init_columns(names)
+        n = len(arrays[0]) if arrays else 0
+        if n == 0:
+            return
+        formatted = {name: format_array(array) for name, array in zip(self.columns, arrays)}
+
+        for name in self.columns:
+            self.stats[name].update(formatted[name])
+        self._update_top_rows(formatted, n)
+        self.total_rows += n
+
+        if self.truncated:
+            return
+        take = min(n, self.max_rows - self.kept_rows)
+        # Bytes are estimated from the JSON size of a sample of the page, which is what the UI payload will cost.
+        sample = min(n, BYTES_SAMPLE_ROWS)
+        per_row = len(json.dumps({name: formatted[name].slice(0, sample).to_pylist() for name in self.columns},
+                                 default=str)) / sample
+        if self.kept_bytes + per_row * take > self.max_bytes:
+            take = max(0, int((self.max_bytes - self.kept_bytes) // per_row))
+        for name in self.columns:
+            self.data[name].extend(formatted[name].slice(0, take).to_pylist())
+        self.kept_rows += take
+        self.kept_bytes += int(per_row * take)
+        if take < n:
+            self.truncated = True
+
+    def _update_top_rows(self, formatted: dict, n: int):
+        if self._measure is None:
+            numeric = [name for name in self.columns if self.stats[name].numeric and self.stats[name].min is not None]
+            if not numeric:
+                return
+            # The last numeric column is usually the aggregate (e.g. total_sales after region).
+            self._measure = numeric[-1]
+        measure = formatted[self._measure]
+        if not is_numeric(measure) or measure.null_count == n:
+            return
+        values = measure.to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+        # Only rows at or above the page's k-th largest value can enter the top rows; the rest are
+        # never looked at. Ties at the threshold are all kept, so the heap sees what it did row by row.
+        valid = ~np.isnan(values)
+        if self.top_k < valid.sum():
+            threshold = np.partition(values[valid], -self.top_k)[-self.top_k]
+            candidates = np.flatnonzero(valid & (values >= threshold))
+        else:
+            candidates = np.flatnonzero(valid)
+        for i in candidates.tolist():
+            value = measure[i].as_py()
+            if len(self._top_rows) >= self.top_k and value <= self._top_rows[0][0]:
+                continue
+            entry = (value, self.total_rows + i, {name: formatted[name][i].as_py() for name in self.columns})
+            if len(self._top_rows) < self.top_k:
+                heapq.heappush(self._top_rows, entry)
+            else:
+                heapq.heapreplace(self._top_rows, entry)
+
+    def consume(self, row_iterator, page_size: int = DEFAULT_PAGE_SIZE) -> "ResultBuffer":
+        for page in iter_pages(row_iterator, page_size):
+            self.add_page(page)
+        return self
+
+    def consume_batches(self, batches) -> "ResultBuffer":
+        for batch in batches:
+            self.add_batch(batch)
+        return self
+
+    def to_rows(self, start: int = 0) -> list:
+        """Row-oriented view of the kept rows (from index start), in the shape the UI expects."""
+        if not self.columns:
+            return []
+        return [dict(zip(self.columns, values)) for values in zip(*(self.data[name][start:] for name in self.columns))]
+
+    def digest(self) -> dict:
+        top_rows = [row for _, _, row in sorted(self._top_rows, key=lambda item: (-item[0], item[1]))]
+        return {
+            "row_count": self.total_rows,
+            "columns": {name: self.stats[name].as_dict(self.top_k) for name in (self.columns or [])},
+            "top_rows_by": self._measure,
+            "top_rows": top_rows,
+        }
+
+    def metadata(self) -> dict:
+        return {"total_rows": self.total_rows, "returned_rows": self.kept_rows, "truncated": self.truncated}
+
@@ -1,157 +1,1034 @@
+import asyncio
+import contextvars
+import inspect
 import json
-import datetime
+import time
+from typing import AsyncIterator, Callable, Iterator, Optional, Tuple
 from google.adk.agents import Agent
-from vertexai.preview.generative_models import GenerativeModel
-from google.cloud import bigquery
-
-UI_SCHEMA = {
-    "type": "object",
-    "properties": {
-        "content": {"type": "string"},
-        "type": {"type": "string"},
-        "visualization": {
-            "type": "object",
-            "properties": {
-                "chart_type": {"type": "string"},
-                "x_axis": {"type": "string"},
-                "y_axis": {"type": "string"}
-            }
-        },
-        "data": {"type": "array", "items": {"type": "object"}},
-        "raw_sql": {"type": "string"},
-    },
-    "required": ["type"], # Only type is always required. Others are optional.
+
+from agent.batch import (DEFAULT_BATCH_WORKERS, DEFAULT_PLAN_BATCH_SIZE, MAX_BATCH_QUESTIONS, GroupingSetsMerge,
+                         aggregate_shape, parse_batch_plans, plan_merges)
+from agent.cache import ResultCache
+from agent.columns import describe_columns, refine_sql
+from agent.followups import FollowUp, plan_followup
+from agent.guardrails import PreflightResult, SqlGuard, SqlRejected, default_project
+from agent.prompt_budget import DEFAULT_SUMMARY_TOKEN_BUDGET, estimate_tokens, summary_data
+from agent.prompts import (build_batch_plan_prompt, build_session_context, build_sql_repair_prompt,
+                           build_summary_prompt, build_text_reply_prompt)
+from agent.resilience import Resilience, ResiliencePolicy, UpstreamUnavailable
+from agent.resources import AgentResources
+from agent.results import DEFAULT_MAX_BYTES, DEFAULT_MAX_ROWS, DEFAULT_PAGE_SIZE, ResultBuffer
+from agent.rollups import RollupFreshness, RollupRewriter
+from agent.routing import IntentRouter, RouteDecision
+from agent.sessions import SessionStore, last_analytics_turn, session_context_key
+from agent.sql_repair import SqlFixCache, error_text, is_repairable
+from agent.tracing import Tracer, current_span, record_span, span
+from agent.warmup import warm_up
+
+def extract_json_text(model_output: str) -> str:
+    if "```json" in model_output:
+        model_output = model_output.split("```json")[1].split("```")[0]
+    return model_output
+
+
+# Model round trips allowed per turn to repair SQL that fails pre-flight or the dry run.
+DEFAULT_MAX_SQL_REPAIRS = 2
+
+# Event names yielded by RetailAgent.astream / stream_query, in pipeline order.
+STREAM_EVENTS = ("routing", "plan", "data", "content", "done")
+
+
+def error_payload(content: str) -> dict:
+    return {"content": content, "type": "text", "visualization": {"chart_type": "none"}, "data": [], "raw_sql": ""}
+
+
+# Shown when a dependency is down and no cached part of the answer can stand in for it.
+DEGRADED_MESSAGES = {
+    "model": "The assistant is temporarily unavailable. Please try again in a moment.",
+    "warehouse": "The data warehouse is not responding right now, so this query could not be run. Please try again in a moment.",
+    "summary": "Here are the results. A written summary is temporarily unavailable.",
 }
 
+
+def degraded_payload(content: str, error: UpstreamUnavailable, **fields) -> dict:
+    payload = dict(error_payload(content), **fields)
+    payload["_degraded"] = error.as_metadata()
+    return payload
+
+
+def record_token_usage(response):
+    """Adds the response's token counts (Vertex AI usage_metadata) to the current span."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    sp = current_span()
+    for attribute, key in (("prompt_token_count", "tokens.prompt"), ("candidates_token_count", "tokens.output")):
+        count = getattr(usage, attribute, None)
+        if count:
+            sp.add(key, count)
+
+
 class RetailAgent(Agent):
-    def __init__(self, model: str, name: str, dataset: str):
+    def __init__(self, model: str, name: str, dataset: str, resources: Optional[AgentResources] = None,
+                 cache: Optional[ResultCache] = None, router: Optional[IntentRouter] = None,
+                 max_result_rows: int = DEFAULT_MAX_ROWS, max_result_bytes: int = DEFAULT_MAX_BYTES,
+                 page_size: int = DEFAULT_PAGE_SIZE, guard: Optional[SqlGuard] = None,
+                 rollups: Optional[RollupRewriter] = None, use_rollups: bool = True,
+                 tracer: Optional[Tracer] = None, resilience: Optional[Resilience] = None,
+                 sql_fixes: Optional[SqlFixCache] = None, max_sql_repairs: int = DEFAULT_MAX_SQL_REPAIRS,
+                 sessions: Optional[SessionStore] = None, detail_rows: int = 0,
+                 summary_token_budget: int = DEFAULT_SUMMARY_TOKEN_BUDGET, cache_snapshot: Optional[str] = None,
+                 project: Optional[str] = None):
         super().__init__(model=model, name=name)
         self._dataset = dataset
+        self._resources = resources
+        self._cache = cache
+        self._router = router
+        self._max_result_rows = max_result_rows
+        self._max_result_bytes = max_result_bytes
+        self._page_size = page_size
+        self._guard = guard
+        self._rollups = rollups
+        self._use_rollups = use_rollups
+        self._tracer = tracer
+        self._resilience = resilience
+        self._sql_fixes = sql_fixes
+        self._max_sql_repairs = max_sql_repairs
+        self._sessions = sessions
+        self._detail_rows = detail_rows
+        self._summary_token_budget = summary_token_budget
+        self._cache_snapshot = cache_snapshot
+        # Resolved now so that the project configured at deploy time is pickled with the agent.
+        self._project = project or default_project()
+
+    @property
+    def resources(self) -> AgentResources:
+        # Created on first use so that nothing heavy is pickled at deploy time.
+        if self._resources is None:
+            self._resources = AgentResources(self._dataset)
+        return self._resources
+
+    @property
+    def cache(self) -> ResultCache:
+        if self._cache is None:
+            self._cache = ResultCache()
+        return self._cache
+
+    @property
+    def router(self) -> IntentRouter:
+        if self._router is None:
+            self._router = IntentRouter()
+        return self._router
+
+    @property
+    def guard(self) -> SqlGuard:
+        if self._guard is None:
+            self._guard = SqlGuard(self._dataset, project=self._project)
+        return self._guard
+
+    @property
+    def tracer(self) -> Tracer:
+        if self._tracer is None:
+            self._tracer = Tracer.from_env()
+        return self._tracer
+
+    @property
+    def resilience(self) -> Resilience:
+        if self._resilience is None:
+            self._resilience = Resilience(ResiliencePolicy.from_env())
+        return self._resilience
+
+    @property
+    def sql_fixes(self) -> SqlFixCache:
+        if self._sql_fixes is None:
+            self._sql_fixes = SqlFixCache.from_env()
+        return self._sql_fixes
+
+    @property
+    def sessions(self) -> SessionStore:
+        if self._sessions is None:
+            self._sessions = SessionStore.from_env()
+        return self._sessions
+
+    @property
+    def rollups(self) -> Optional[RollupRewriter]:
+        if not self._use_rollups:
+            return None
+        if self._rollups is None:
+            # Only rollups stamped with the base table's current `modified` time are used.
+            resources = self.resources
+            freshness = RollupFreshness(
+                self._dataset, lambda name: resources.warehouse.get_description(name), lambda: resources.table_modified
+            )
+            self._rollups = RollupRewriter(self._dataset, available=freshness)
+        return self._rollups
+
+    def set_up(self):
+        """
+        Called by Agent Engine once on each new serving instance, before it takes traffic: clients,
+        schema, prompts, SQL tooling and the result cache (from cache_snapshot) are loaded here
+        instead of in the instance's first request. See warmup.py.
+        """
+        warm_up(self, self._cache_snapshot)
 
     def query(self, input: dict) -> dict:
-        user_message = (input or {}).get("message", "")
-        print("User message:", user_message)
+        # Thin wrapper: run aquery on the agent's long-lived event loop so async
+        # clients created on the first call stay bound to a loop that is still open.
+        future = asyncio.run_coroutine_threadsafe(self.aquery(input), self.resources.event_loop)
+        return future.result()
 
-        bq_client = bigquery.Client()
-        model = GenerativeModel("gemini-2.5-flash")
+    def stream_query(self, input: dict) -> Iterator[dict]:
+        """Sync generator over astream() (exposed by Agent Engine as a streaming method)."""
+        loop = self.resources.event_loop
+        stream = self.astream(input)
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(stream.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            asyncio.run_coroutine_threadsafe(stream.aclose(), loop).result()
+
+    async def aquery(self, input: dict) -> dict:
+        return await self._arun(input)
+
+    async def astream(self, input: dict) -> AsyncIterator[dict]:
+        """
+        Runs the same pipeline as aquery but yields {"event", "data"} stages as
+        they become available: routing, plan (raw_sql + visualization), data
+        (pages of rows), content (summary text chunks) and finally done with the
+        normalized payload. When rows were streamed, done omits "data".
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
 
+        def emit(event: str, data):
+            # Called from the loop and from executor threads alike.
+            loop.call_soon_threadsafe(events.put_nowait, {"event": event, "data": data})
+
+        task = asyncio.ensure_future(self._arun(input, emit))
+        task.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+        streamed_rows = False
         try:
-            dataset_id, table_id = self._dataset.split('.')
-            table_ref = bq_client.dataset(dataset_id).table(table_id)
-            table = bq_client.get_table(table_ref)
-            schema_str = ", ".join([f"{col.name}: {col.field_type}" for col in table.schema])
-            schema_prompt = f"The table schema for {self._dataset} is: {schema_str}\n\n"
-        except Exception as e:
-            print(f"Warning: Could not get table schema. {e}")
-            schema_prompt = ""
-
-        # First call to the model to get the SQL and visualization
-        system_instruction_1 = (
-            "You are a Retail Analytics AI. Your first task is to analyze the user's request. If it's a general conversation, respond with only text. If it requires data analysis, generate a SQL query and a visualization object.\n"
-            f"Answer questions for dataset: {self._dataset}.\n\n"
-            f"{schema_prompt}"
-            "Your response MUST match the required JSON schema and rules. Do not include the 'content' field in this response.\n"
-            f"{json.dumps(UI_SCHEMA)}\n\n"
-            "Rules:\n"
-            "1. For general conversational questions (e.g., 'Hello', 'How are you?', 'Thank you', 'What can you do?', 'Wonderful'), respond by setting 'type' to 'text' and by OMITTING 'raw_sql', 'data', and 'visualization'. DO NOT generate SQL or visualization for these questions.\n"
-            "2. If the user asks for a chart (e.g., 'bar chart', 'line chart', 'pie chart'), set 'type' to 'analytics' and populate the 'visualization' object with 'chart_type', 'x_axis' (the column for the x-axis or categories), and 'y_axis' (the column for the y-axis or values). For example, for a bar chart of sales by region, set `visualization: {'chart_type': 'bar_chart', 'x_axis': 'region', 'y_axis': 'total_sales'}`.\n"
-            "3. If the user asks for data in a 'table', 'tabular' format, or asks a question that results in a single row or value (e.g., 'what is the highest...'), set 'type' to 'analytics' and 'visualization.chart_type' to 'table'.\n"
-            "4. Always include the SQL query in `raw_sql` if a visualization is requested (i.e., when 'type' is 'analytics').\n"
-            "5. When filtering by date in BigQuery SQL, use direct comparisons like `transaction_date <= 'YYYY-MM-DD'` or `EXTRACT(MONTH FROM transaction_date) = 6` if extracting date parts. Do NOT use column names as date part names (e.g., `transaction_date` in `EXTRACT(transaction_date FROM transaction_date)` is incorrect).\n"
-            f"6. All table names in SQL queries MUST be fully qualified with the dataset name (e.g., {self._dataset}).\n"
-            "Return ONLY valid JSON."
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                streamed_rows = streamed_rows or item["event"] == "data"
+                yield item
+            payload = task.result()
+            if streamed_rows and payload.get("type") == "analytics":
+                payload = {k: v for k, v in payload.items() if k != "data"}
+            yield {"event": "done", "data": payload}
+        finally:
+            if not task.done():
+                task.cancel()
+
+    # --- Batches (offline reports) ---
+    def query_batch(self, input: dict) -> list:
+        """Sync wrapper over aquery_batch, run on the agent's event loop like query."""
+        future = asyncio.run_coroutine_threadsafe(self.aquery_batch(input), self.resources.event_loop)
+        return future.result()
+
+    def register_operations(self) -> dict:
+        # Methods Agent Engine exposes on the deployed agent ("" = request/response, "stream" = streaming).
+        return {"": ["query", "query_batch"], "stream": ["stream_query"]}
+
+    async def aquery_batch(self, input: dict) -> list:
+        """
+        Answers input["questions"] for offline reports and returns one payload per question, in order.
+        Every plan-cache miss is planned in one model request per plan_batch_size questions, identical SQL
+        runs once, aggregates over the same table and filter share one GROUPING SETS scan, and the rest
+        runs on at most input["workers"] concurrent queries and summaries. Each payload's _batch says how
+        it was planned ("cache", "batch", "single") and where its rows came from ("cache", "query",
+        "merged", "shared").
+        """
+        input = input or {}
+        questions = [str(q) for q in input.get("questions") or []]
+        if len(questions) > MAX_BATCH_QUESTIONS:
+            raise ValueError(f"A batch holds at most {MAX_BATCH_QUESTIONS} questions, got {len(questions)}.")
+        workers = max(1, int(input.get("workers") or DEFAULT_BATCH_WORKERS))
+        plan_batch_size = max(1, int(input.get("plan_batch_size") or DEFAULT_PLAN_BATCH_SIZE))
+        with self.tracer.trace("agent.batch", questions=len(questions), workers=workers):
+            return await self._abatch(questions, workers, plan_batch_size)
+
+    async def _abatch(self, questions: list, workers: int, plan_batch_size: int) -> list:
+        resources = self.resources
+        cache = self.cache
+        slots = asyncio.Semaphore(workers)
+
+        async def bounded(coro):
+            async with slots:
+                return await coro
+
+        payloads = [None] * len(questions)
+        meta = [{"index": i, "plan": None, "rows": None} for i in range(len(questions))]
+        with span("routing"):
+            decisions = [self.router.route(question) for question in questions]
+
+        # Plans: the plan cache, then one model request per chunk of distinct misses
+        with span("schema"):
+            system_instruction_1 = await self._in_executor(resources.system_instruction_1)
+            cache.note_table_version(resources.table_modified)
+            schema = resources.get_schema()
+        plan_keys, plans, misses, single = {}, {}, {}, []
+        for i, question in enumerate(questions):
+            if decisions[i].route == "conversational":
+                single.append(i)
+                continue
+            plan_keys[i] = cache.plan_key(question, schema)
+            plan = cache.get("plan", plan_keys[i])
+            if plan is not None:
+                plans[i], meta[i]["plan"] = plan, "cache"
+            else:
+                misses.setdefault(plan_keys[i], []).append(i)
+        keys = list(misses)
+        chunks = [keys[k:k + plan_batch_size] for k in range(0, len(keys), plan_batch_size)]
+        answers = await asyncio.gather(*(
+            bounded(self._aplan_batch(system_instruction_1, [questions[misses[key][0]] for key in chunk]))
+            for chunk in chunks
+        ))
+        for chunk, answer in zip(chunks, answers):
+            for key, plan in zip(chunk, answer or [None] * len(chunk)):
+                if not plan or not (plan.get("raw_sql") or plan.get("content")):
+                    single.extend(misses[key])  # planned on its own below
+                    continue
+                fields = ("type", "raw_sql", "visualization") if plan.get("raw_sql") else ("type", "content")
+                cache.set("plan", key, {k: plan[k] for k in fields if k in plan})
+                for i in misses[key]:
+                    plans[i], meta[i]["plan"] = {k: plan[k] for k in fields if k in plan}, "batch"
+
+        async def answer_single(i):
+            # Small talk and questions the batched plan missed take the normal pipeline.
+            payload = await self._arun({"message": questions[i]})
+            payloads[i] = payload
+            meta[i]["plan"] = "single"
+            if payload.get("raw_sql"):
+                meta[i]["rows"] = "cache" if (payload.get("_cost") or {}).get("cached") else "query"
+
+        async def answer_text(i):
+            payload = plans[i]
+            payload["data"] = []
+            if not payload.get("content"):
+                try:
+                    payload["content"] = await self._atext_only_reply(questions[i])
+                except UpstreamUnavailable as e:
+                    payload["content"] = DEGRADED_MESSAGES["model"]
+                    payload["_degraded"] = e.as_metadata()
+                decisions[i].model_calls += 1
+            decisions[i].route = "conversational"
+            payloads[i] = self._finish(payload, decisions[i])
+
+        # Pre-flight each distinct plan once: guardrails, rollups, rows cache, dry run and repairs
+        analytics = {}
+        for i, payload in plans.items():
+            if payload.get("raw_sql"):
+                analytics.setdefault(plan_keys[i], []).append(i)
+        checks = {}
+
+        async def preflight(indices):
+            first = indices[0]
+            try:
+                check = await self._apreflight(questions[first], plans[first], plan_keys[first], decisions[first])
+            except UpstreamUnavailable as e:
+                error = degraded_payload(DEGRADED_MESSAGES[e.dependency], e, raw_sql=plans[first]["raw_sql"])
+            except SqlRejected as e:
+                error = error_payload(f"Query rejected: {e}")
+            except Exception as e:
+                error = error_payload(f"Error executing SQL: {e}")
+            else:
+                for i in indices:
+                    plans[i].update(plans[first])
+                    checks[i] = check
+                return
+            for i in indices:
+                payloads[i] = dict(error)
+
+        await asyncio.gather(
+            *(bounded(answer_single(i)) for i in single),
+            *(bounded(answer_text(i)) for i, payload in plans.items() if not payload.get("raw_sql")),
+            *(bounded(preflight(indices)) for indices in analytics.values()),
         )
 
-        contents = [{"role": "user", "parts": [{"text": system_instruction_1}, {"text": user_message}]}]
+        # Execution: cached rows, then one run per distinct SQL, with compatible aggregates merged
+        results = {}
+        to_run = {}
+        for i, (checked, rows_key, result) in checks.items():
+            if result is not None:
+                results[i], meta[i]["rows"] = result, "cache"
+            else:
+                to_run.setdefault(checked.sql, (checked, rows_key, []))[2].append(i)
+        shapes = {}
+        for sql, (checked, _, _) in to_run.items():
+            shape = aggregate_shape(sql) if checked.rollup is None else None
+            if shape is not None:
+                shapes[sql] = shape
+        shape_sqls = list(shapes)
+        merges = [[shape_sqls[k] for k in group] for group in plan_merges([shapes[sql] for sql in shape_sqls])]
+        merged = {sql for group in merges for sql in group}
+
+        def store(sql, result, how):
+            _, rows_key, indices = to_run[sql]
+            cache.set("rows", rows_key, result)
+            for k, i in enumerate(indices):
+                results[i], meta[i]["rows"] = result, how if k == 0 else "shared"
+
+        async def run_single(sql):
+            checked, _, indices = to_run[sql]
+            try:
+                result = await self.resilience.call(
+                    "warehouse", "warehouse",
+                    lambda timeout: self._in_executor(self._execute_sql, checked, None, timeout),
+                )
+            except UpstreamUnavailable as e:
+                error = degraded_payload(DEGRADED_MESSAGES["warehouse"], e, raw_sql=plans[indices[0]]["raw_sql"])
+            except SqlRejected as e:
+                error = error_payload(f"Query rejected: {e}")
+            except Exception as e:
+                error = error_payload(f"Error executing SQL: {e}")
+            else:
+                store(sql, result, "query")
+                return
+            for i in indices:
+                payloads[i] = dict(error)
+
+        async def run_merge(group):
+            try:
+                split = await self._aexecute_merge(GroupingSetsMerge([shapes[sql] for sql in group]))
+            except Exception as e:
+                print(f"Warning: Could not run merged batch query. {e}")
+                split = None
+            if split is None:
+                for sql in group:  # still inside this worker's slot
+                    await run_single(sql)
+                return
+            for sql, result in zip(group, split):
+                store(sql, result, "merged")
+
+        await asyncio.gather(*(bounded(run_merge(group)) for group in merges),
+                             *(bounded(run_single(sql)) for sql in to_run if sql not in merged))
+
+        # Summaries, from the summary cache or the model; a repeated question is summarized once
+        summaries = {}
+        for i, result in results.items():
+            summaries.setdefault(cache.summary_key(questions[i], result["digest"]), []).append(i)
+
+        async def summarize(summary_key, indices):
+            first = indices[0]
+            degraded = None
+            summary = cache.get("summary", summary_key)
+            if summary is None:
+                try:
+                    summary = await self._asummary(questions[first], results[first]["digest"],
+                                                   rows=results[first]["data"])
+                    if summary:
+                        cache.set("summary", summary_key, summary)
+                except UpstreamUnavailable as e:
+                    summary, degraded = DEGRADED_MESSAGES["summary"], e.as_metadata()
+                decisions[first].model_calls += 1
+            for i in indices:
+                payload, result = plans[i], results[i]
+                payload["data"] = result["data"]
+                payload["_result"] = result["meta"]
+                payload["_cost"] = dict(result.get("cost") or {}, cached=meta[i]["rows"] == "cache")
+                payload["_columns"] = describe_columns(payload["raw_sql"], result["digest"])
+                payload["content"] = summary
+                if degraded:
+                    payload["_degraded"] = degraded
+                payloads[i] = self._finish(payload, decisions[i])
+
+        await asyncio.gather(*(bounded(summarize(key, indices)) for key, indices in summaries.items()))
+
+        for i, payload in enumerate(payloads):
+            payload["_batch"] = meta[i]
+        return payloads
+
+    async def _aplan_batch(self, system_instruction_1: str, questions: list) -> Optional[list]:
+        """Plans for questions from one model request, or None if it failed or did not answer each one."""
+        contents = [{"role": "user", "parts": [{"text": system_instruction_1},
+                                               {"text": build_batch_plan_prompt(questions)}]}]
+        try:
+            model_output = await self._agenerate_text(contents, "model.plan_batch")
+        except UpstreamUnavailable as e:
+            print(f"Warning: Could not plan batch. {e}")
+            return None
+        plans = parse_batch_plans(extract_json_text(model_output or ""), len(questions))
+        if plans is None:
+            print(f"Warning: Batch plan did not answer each of the {len(questions)} questions.")
+        return plans
+
+    async def _aexecute_merge(self, merge: GroupingSetsMerge) -> Optional[list]:
+        """Runs a GROUPING SETS merge; one result per merged query, or None if the merged rows were truncated."""
+        with span("batch.merge", queries=len(merge.shapes)) as sp:
+            checked = self.guard.check(merge.sql)
 
-        response = model.generate_content(contents=contents)
-        model_output = getattr(response, "text", None)
+            def run(timeout):
+                self._dry_run(checked)
+                return self._execute_sql(checked, None, timeout)
 
-        if not model_output:
-            return {"content": "Model returned no text.", "type": "text", "visualization": {"chart_type": "none"}, "data": [], "raw_sql": ""}
+            combined = await self.resilience.call(
+                "warehouse", "warehouse", lambda timeout: self._in_executor(run, timeout)
+            )
+            sp.set("rows", len(combined["data"]))
+        # The merged rows hold every query's rows; if any were cut off, the queries run on their own.
+        if combined["meta"]["truncated"] or checked.limit_injected and len(combined["data"]) >= self.guard.row_limit:
+            return None
+        results = []
+        for rows in merge.split(combined["data"]):
+            buffer = ResultBuffer(self._max_result_rows, self._max_result_bytes)
+            buffer.add_page(rows)
+            results.append({"data": buffer.to_rows(), "digest": buffer.digest(), "meta": buffer.metadata(),
+                            "cost": dict(combined.get("cost") or {}, merged=len(merge.shapes))})
+        return results
+
+    # --- Blocking helpers, run on the resources executor ---
+    async def _in_executor(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so spans opened in the worker nest under the current one.
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.resources.executor, context.run, fn, *args)
+
+    async def _arewrite(self, sql: str) -> Optional[tuple]:
+        """RollupRewriter.rewrite off the event loop: a stale freshness check reads every rollup's metadata."""
+        rollups = self.rollups
+        return await self._in_executor(rollups.rewrite, sql) if rollups else None
+
+    def _execute_sql(self, checked: PreflightResult, on_rows: Optional[Callable[[list], None]] = None,
+                     timeout: Optional[float] = None) -> dict:
+        warehouse = self.resources.warehouse
+        guard = self.guard
+        # The job may not outlive the warehouse stage's share of the request budget.
+        job_timeout = min(guard.job_timeout, timeout) if timeout else guard.job_timeout
+
+        # Pages are streamed into a columnar buffer; only the capped UI rows and a digest are kept.
+        buffer = ResultBuffer(max_rows=self._max_result_rows, max_bytes=self._max_result_bytes)
+        with span("warehouse.execute", rollup=checked.rollup) as s:
+            batches = iter(warehouse.execute_batches(
+                checked.sql, batch_size=self._page_size, timeout=job_timeout,
+                max_bytes_billed=guard.max_bytes_scanned,
+            ))
+            pages, format_seconds = 0, 0.0
+            while True:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                pages += 1
+                kept = buffer.kept_rows
+                started = time.perf_counter()
+                buffer.add_batch(batch)
+                format_seconds += time.perf_counter() - started
+                # Streaming: hand each page's newly kept rows to the caller as soon as it is formatted.
+                if on_rows is not None and buffer.kept_rows > kept:
+                    on_rows(buffer.to_rows(kept))
+            record_span("rows.format", format_seconds, pages=pages)
+            s.set("rows", buffer.total_rows).set("rows_returned", buffer.kept_rows).set("pages", pages)
+            s.set("bytes_processed", checked.estimated_bytes)
+        return {"data": buffer.to_rows(), "digest": buffer.digest(), "meta": buffer.metadata(),
+                "cost": checked.as_metadata()}
 
-        if "```json" in model_output:
-            model_output = model_output.split("```json")[1].split("```")[0]
+    def _dry_run(self, checked: PreflightResult) -> PreflightResult:
+        # Dry run first: invalid SQL fails and over-budget queries are rejected before any bytes are billed.
+        with span("warehouse.dry_run") as s:
+            self.guard.enforce_budget(checked, self.resources.warehouse.dry_run)
+            s.set("bytes_estimated", checked.estimated_bytes)
+        return checked
 
+    async def _agenerate_text(self, contents: list, stage: str = "model.generate"):
+        model = self.resources.model
+        generate_async = getattr(model, "generate_content_async", None)
+
+        async def attempt(timeout):
+            if generate_async is not None:
+                return await generate_async(contents=contents)
+            return await self._in_executor(lambda: model.generate_content(contents=contents))
+
+        with span(stage):
+            # Retried on 429/5xx and hedged with a duplicate request once the call runs past the stage's p95.
+            response = await self.resilience.call(stage, "model", attempt, hedge=True)
+            record_token_usage(response)
+        return getattr(response, "text", None)
+
+    def _can_stream_text(self) -> bool:
+        generate_async = getattr(self.resources.model, "generate_content_async", None)
+        if generate_async is None:
+            return False
         try:
-            payload = json.loads(model_output)
+            return "stream" in inspect.signature(generate_async).parameters
+        except (TypeError, ValueError):
+            return False
+
+    async def _astream_text(self, contents: list, on_text: Callable[[str], None], stage: str = "model.generate") -> str:
+        """
+        Streams a plain-text completion, passing each chunk to on_text; returns the full text.
+        Opening the stream is retried like any model call. Once chunks have been shown the
+        call cannot be retried, so a stream cut off by the deadline returns what arrived.
+        """
+        resilience = self.resilience
+        expires = time.monotonic() + resilience.stage_timeout(stage)
+        model = self.resources.model
+        started = time.perf_counter()
+        with span(stage, streamed=True) as s:
+            stream = await resilience.call(
+                stage, "model", lambda timeout: model.generate_content_async(contents=contents, stream=True)
+            )
+            chunks = []
+            response = None
+            while True:
+                try:
+                    response = await asyncio.wait_for(stream.__anext__(), max(0.0, expires - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    s.set("truncated", True)
+                    if not chunks:
+                        raise UpstreamUnavailable("model", stage, "deadline exceeded")
+                    break
+                try:
+                    text = response.text
+                except (ValueError, AttributeError):
+                    text = None  # e.g. a final chunk carrying only the finish reason
+                if text:
+                    if not chunks:
+                        s.set("first_chunk_ms", round((time.perf_counter() - started) * 1000, 2))
+                    chunks.append(text)
+                    on_text(text)
+            record_token_usage(response)  # the last chunk carries the usage totals
+        return "".join(chunks).strip()
+
+    async def _atext_only_reply(self, user_message: str) -> str:
+        # If no raw_sql, then no data analysis was performed, so content should be a simple text response.
+        # We need to ask the model to generate a text response based on the user's input directly.
+        system_instruction_text_only = build_text_reply_prompt(user_message)
+        contents_text_only = [{"role": "user", "parts": [{"text": system_instruction_text_only}]}]
+        model_output_text_only = await self._agenerate_text(contents_text_only, "model.reply")
+        if model_output_text_only:
+            try:
+                text_payload = json.loads(extract_json_text(model_output_text_only))
+                return text_payload.get("content", "")
+            except Exception as e:
+                print(f"Warning: Could not generate text-only response. {e}")
+                return ""
+        return "I'm sorry, I couldn't generate a response."
+
+    async def _asummary(self, user_message: str, digest: dict, on_text: Optional[Callable[[str], None]] = None,
+                        rows: Optional[list] = None) -> str:
+        """
+        rows are the result rows at hand: a complete result that fits summary_token_budget is sent whole,
+        anything larger as the digest plus sampled rows (see prompt_budget).
+        """
+        streamed = on_text is not None and self._can_stream_text()
+        with span("prompt.summary") as sp:
+            data, encoding = summary_data(digest, rows, self._summary_token_budget)
+            prompt = build_summary_prompt(user_message, data, streamed)
+            sp.set("encoding", encoding).set("tokens.estimate", estimate_tokens(prompt))
+        if streamed:
+            # Streamed summaries are requested as plain text so chunks can be shown as they arrive.
+            try:
+                return await self._astream_text([{"role": "user", "parts": [{"text": prompt}]}], on_text, "model.summary")
+            except UpstreamUnavailable:
+                raise
+            except Exception as e:
+                print(f"Warning: Could not stream summary. {e}")
+                return ""
+
+        contents_2 = [{"role": "user", "parts": [{"text": prompt}]}]
+        model_output_2 = await self._agenerate_text(contents_2, "model.summary")
+        if model_output_2:
+            try:
+                summary_payload = json.loads(extract_json_text(model_output_2))
+                content = summary_payload.get("content", "")
+                if on_text is not None and content:
+                    on_text(content)
+                return content
+            except Exception as e:
+                print(f"Warning: Could not generate summary. {e}")
+        return ""
+
+    async def _apreflight(self, user_message: str, payload: dict, plan_key: str,
+                          decision: RouteDecision) -> Tuple[PreflightResult, str, Optional[dict]]:
+        """
+        Guardrails, rollup rewrite, rows-cache lookup and (on a miss) the dry run for payload["raw_sql"].
+        A known fix from the fix cache is applied up front. SQL that still fails with a repairable error
+        goes back to the model with the error, at most max_sql_repairs times. A repair that passes
+        updates payload, the plan cache and the fix cache.
+        Returns (checked, rows_key, cached rows or None); raises the last error when it gives up.
+        """
+        cache = self.cache
+        fixes = self.sql_fixes
+        sql = payload["raw_sql"]
+        failed = []  # SQL texts that failed, learned against the SQL that finally passes
+        with span("sql.fix_cache") as sp:
+            known = fixes.lookup(sql)
+            sp.set("hit", known is not None)
+        if known:
+            failed.append(sql)
+            sql = known
+        repairs = 0
+        while True:
+            try:
+                with span("sql.guard") as sp:
+                    checked = self.guard.check(sql)
+                    sp.set("limit_injected", checked.limit_injected)
+                guarded_sql = checked.sql
+
+                # Transparently answer from the smallest fresh rollup table when it is equivalent
+                with span("sql.rollup") as sp:
+                    rewritten = await self._arewrite(checked.sql)
+                    if rewritten:
+                        checked.sql, checked.rollup = rewritten
+                    sp.set("rollup", checked.rollup)
+
+                with span("cache.rows") as sp:
+                    rows_key = cache.rows_key(checked.sql)
+                    result = cache.get("rows", rows_key)
+                    sp.set("hit", result is not None)
+                if result is None:
+                    await self.resilience.call(
+                        "warehouse", "warehouse", lambda timeout: self._in_executor(self._dry_run, checked)
+                    )
+                break
+            except Exception as e:
+                if not is_repairable(e) or repairs >= self._max_sql_repairs:
+                    raise
+                failed.append(sql)
+                repairs += 1
+                repaired = await self._arepair_sql(user_message, payload, sql, error_text(e))
+                decision.model_calls += 1
+                if repaired is None:
+                    raise
+                sql = repaired["raw_sql"]
+                payload.update(repaired)
+
+        if failed:
+            payload["raw_sql"] = sql
+            payload["_sql_repair"] = {"attempts": repairs, "local_fix": known is not None and repairs == 0}
+            cache.set("plan", plan_key, {k: payload[k] for k in ("type", "raw_sql", "visualization") if k in payload})
+            if repairs:
+                for bad in failed:
+                    fixes.learn(bad, sql)
+        payload["raw_sql"] = guarded_sql
+        return checked, rows_key, result
+
+    async def _arepair_sql(self, user_message: str, payload: dict, sql: str, error: str) -> Optional[dict]:
+        """Asks the model to fix sql given the error it produced; returns {"raw_sql", ...} or None."""
+        system_instruction_1 = await self._in_executor(self.resources.system_instruction_1)
+        previous = {k: payload[k] for k in ("type", "visualization") if k in payload}
+        previous["raw_sql"] = sql
+        contents = [
+            {"role": "user", "parts": [{"text": system_instruction_1}, {"text": user_message}]},
+            {"role": "model", "parts": [{"text": json.dumps(previous)}]},
+            {"role": "user", "parts": [{"text": build_sql_repair_prompt(sql, error)}]},
+        ]
+        model_output = await self._agenerate_text(contents, "model.repair")
+        try:
+            repaired = json.loads(extract_json_text(model_output or ""))
         except Exception as e:
-            return {"content": f"Error parsing JSON: {e}. Raw output: {model_output}", "type": "text", "visualization": {"chart_type": "none"}, "data": [], "raw_sql": ""}
+            print(f"Warning: Could not parse SQL repair. {e}")
+            return None
+        if not isinstance(repaired, dict) or not repaired.get("raw_sql"):
+            return None
+        return {k: repaired[k] for k in ("raw_sql", "visualization") if k in repaired}
+
+    async def _arun(self, input: dict, emit: Optional[Callable[[str, object], None]] = None) -> dict:
+        """
+        Traces one turn; input {"timings": true} also returns the spans as the payload's _timings.
+        With input {"session_id": ...} the turn sees, and is added to, that session's earlier turns.
+        """
+        record = bool((input or {}).get("timings"))
+        session_id = (input or {}).get("session_id")
+        with self.tracer.trace("agent.turn", record=record, streaming=emit is not None) as trace:
+            session = None
+            if session_id:
+                with span("session.load") as sp:
+                    session = await self._in_executor(self.sessions.get, session_id)
+                    sp.set("turns", len(session["turns"]))
+            with self.resilience.turn():
+                payload = await self._apipeline(input, emit, session)
+            # Errors and outage messages are not part of the conversation; a chart without its summary is.
+            if session is not None and "_routing" in payload and (payload.get("data") or not payload.get("_degraded")):
+                with span("session.save"):
+                    await self._in_executor(self.sessions.record, session_id, session,
+                                            input.get("message", ""), payload)
+            if trace is not None:
+                trace.root.set("type", payload.get("type"))
+                if payload.get("_degraded"):
+                    trace.root.set("degraded", payload["_degraded"]["dependency"])
+                for key, value in (payload.get("_routing") or {}).items():
+                    trace.root.set(f"routing.{key}", value)
+        if record and trace is not None:
+            payload["_timings"] = trace.as_timings()
+        return payload
+
+    async def _apipeline(self, input: dict, emit: Optional[Callable[[str, object], None]] = None,
+                         session: Optional[dict] = None) -> dict:
+        """
+        The query pipeline. emit(event, data), when given, receives each stage as it completes.
+        session, when given, holds the earlier turns: a follow-up that only re-shapes the last result
+        is answered from its rows, anything else is planned by the model with the turns as context.
+        """
+        streaming = emit is not None
+        emit = emit or (lambda event, data: None)
+        # Row pages and summary chunks are only produced incrementally when someone is listening.
+        on_rows = (lambda rows: emit("data", rows)) if streaming else None
+        on_text = (lambda text: emit("content", text)) if streaming else None
+        user_message = (input or {}).get("message", "")
+        print("User message:", user_message)
+
+        resources = self.resources
+        cache = self.cache
+
+        # Follow-ups such as "as a pie chart" or "only North" re-shape the previous result locally.
+        previous = last_analytics_turn(session) if session else None
+        if previous is not None:
+            with span("session.followup") as sp:
+                followup = plan_followup(user_message, previous)
+                sp.set("local", followup is not None)
+            if followup is not None:
+                return await self._afollowup(user_message, previous, followup, emit, on_text)
+
+        # Routing: confident small talk is answered with one text-only call and no classification call.
+        with span("routing") as sp:
+            decision = self.router.route(user_message)
+            sp.set("route", decision.route).set("source", decision.source)
+        emit("routing", decision.as_metadata())
+        if decision.route == "conversational":
+            try:
+                payload = {"type": "text", "data": [], "content": await self._atext_only_reply(user_message)}
+            except UpstreamUnavailable as e:
+                payload = degraded_payload(DEGRADED_MESSAGES["model"], e)
+            emit("content", payload["content"])
+            decision.model_calls = 1
+            return self._finish(payload, decision)
+
+        # First call to the model to get the SQL and visualization (or the reply, for small talk)
+        with span("schema"):
+            system_instruction_1 = await self._in_executor(resources.system_instruction_1)
+            cache.note_table_version(resources.table_modified)
+            # Earlier turns go between the static instruction and the question; the same question after
+            # a different previous query is a different plan.
+            context = build_session_context(session) if session else ""
+            plan_key = cache.plan_key(user_message, resources.get_schema(),
+                                      session_context_key(session) if session else "")
+        with span("cache.plan") as sp:
+            payload = cache.get("plan", plan_key)
+            sp.set("hit", payload is not None)
+
+        if payload is None:
+            parts = [{"text": system_instruction_1}] + ([{"text": context}] if context else []) + [{"text": user_message}]
+            contents = [{"role": "user", "parts": parts}]
+            try:
+                model_output = await self._agenerate_text(contents, "model.plan")
+            except UpstreamUnavailable as e:
+                payload = degraded_payload(DEGRADED_MESSAGES["model"], e)
+                emit("content", payload["content"])
+                return self._finish(payload, decision)
+            decision.model_calls += 1
+
+            if not model_output:
+                return error_payload("Model returned no text.")
+
+            model_output = extract_json_text(model_output)
+            try:
+                payload = json.loads(model_output)
+            except Exception as e:
+                return error_payload(f"Error parsing JSON: {e}. Raw output: {model_output}")
+
+            plan_fields = ("type", "raw_sql", "visualization") if payload.get("raw_sql") else ("type", "content")
+            cache.set("plan", plan_key, {k: payload[k] for k in plan_fields if k in payload})
 
         # Execute the SQL and format the data
         if payload.get("raw_sql"):
+            # SQL pre-flight: read-only, scoped to our dataset, bounded by LIMIT and a scan budget.
+            # SQL that fails it is repaired from the fix cache or by the model.
             try:
-                query_job = bq_client.query(payload["raw_sql"])
-                results = [dict(row) for row in query_job.result()]
-                
-                # Format floating point numbers and date/datetime objects
-                formatted_results = []
-                for row in results:
-                    formatted_row = {}
-                    for key, value in row.items():
-                        if isinstance(value, float):
-                            formatted_row[key] = round(value, 2)
-                        elif isinstance(value, (datetime.date, datetime.datetime)):
-                            formatted_row[key] = value.isoformat()
-                        else:
-                            formatted_row[key] = value
-                    formatted_results.append(formatted_row)
-                
-                payload["data"] = formatted_results
+                checked, rows_key, result = await self._apreflight(user_message, payload, plan_key, decision)
+            except UpstreamUnavailable as e:
+                payload = degraded_payload(DEGRADED_MESSAGES[e.dependency], e, raw_sql=payload["raw_sql"])
+                emit("content", payload["content"])
+                return self._finish(payload, decision)
+            except SqlRejected as e:
+                return error_payload(f"Query rejected: {e}")
             except Exception as e:
-                return {"content": f"Error executing SQL: {e}", "type": "text", "visualization": {"chart_type": "none"}, "data": [], "raw_sql": ""}
-        else:
-            payload["data"] = []
+                return error_payload(f"Error executing SQL: {e}")
+            emit("plan", {"type": payload.get("type", "analytics"), "raw_sql": payload["raw_sql"],
+                          "visualization": payload.get("visualization")})
 
+            cached_rows = result is not None
+            if cached_rows:
+                for start in range(0, len(result["data"]), self._page_size):
+                    emit("data", result["data"][start:start + self._page_size])
+            else:
+                # A job that already streamed rows to the client is not retried (the rows would repeat).
+                streamed = []
+
+                def on_page(rows):
+                    streamed.append(len(rows))
+                    on_rows(rows)
 
-        # Second call to the model to get the summary
-        if payload.get("raw_sql"): # Only generate summary if SQL was generated
-            system_instruction_2 = (
-                "You are a Retail Analytics AI. Your second task is to generate a concise, natural language summary of the provided data.\n"
-                "The user's original question was: " + user_message + "\n"
-                "The data is: " + json.dumps(payload["data"]) + "\n"
-                "Based on the data, provide a short summary (1-2 sentences) in the 'content' field. Your response must be a valid JSON with only the 'content' field."
-            )
-            
-            contents_2 = [{"role": "user", "parts": [{"text": system_instruction_2}]}]
-            response_2 = model.generate_content(contents=contents_2)
-            model_output_2 = getattr(response_2, "text", None)
-            
-            if model_output_2:
                 try:
-                    if "```json" in model_output_2:
-                        model_output_2 = model_output_2.split("```json")[1].split("```")[0]
-                    summary_payload = json.loads(model_output_2)
-                    payload["content"] = summary_payload.get("content", "")
+                    result = await self.resilience.call(
+                        "warehouse", "warehouse",
+                        lambda timeout: self._in_executor(self._execute_sql, checked, on_page if on_rows else None,
+                                                          timeout),
+                        retry_if=lambda: not streamed,
+                    )
+                except UpstreamUnavailable as e:
+                    payload = degraded_payload(DEGRADED_MESSAGES["warehouse"], e, raw_sql=payload["raw_sql"])
+                    emit("content", payload["content"])
+                    return self._finish(payload, decision)
+                except SqlRejected as e:
+                    return error_payload(f"Query rejected: {e}")
                 except Exception as e:
-                    print(f"Warning: Could not generate summary. {e}")
-                    payload["content"] = ""
-            else:
-                payload["content"] = ""
-        else: # If no raw_sql, then no data analysis was performed, so content should be a simple text response.
-            # This case means payload["type"] is "text" from the first model call
-            # We need to ask the model to generate a text response based on the user's input directly.
-            system_instruction_text_only = (
-                "You are a Retail Analytics AI assistant. The user asked a general conversational question:\n"
-                "User's question: " + user_message + "\n"
-                "Please provide a helpful and concise text response in the 'content' field. Your response must be a valid JSON with only the 'content' field."
-            )
-            contents_text_only = [{"role": "user", "parts": [{"text": system_instruction_text_only}]}]
-            response_text_only = model.generate_content(contents=contents_text_only)
-            model_output_text_only = getattr(response_text_only, "text", None)
-            if model_output_text_only:
+                    return error_payload(f"Error executing SQL: {e}")
+            payload["data"] = result["data"]
+            payload["_result"] = result["meta"]
+            payload["_cost"] = dict(result.get("cost") or {}, cached=cached_rows)
+            payload["_columns"] = describe_columns(payload["raw_sql"], result["digest"])
+            # A small result also gets a finer-grained copy for re-grouping in the browser, fetched while
+            # the summary is written.
+            detail_task = None
+            if self._detail_rows and not result["meta"]["truncated"] and len(result["data"]) <= self._detail_rows:
+                detail_task = asyncio.ensure_future(self._adetail(checked))
+
+            try:
+                # Second call to the model to get the summary, overlapped with the rows cache write
+                with span("cache.summary") as sp:
+                    summary_key = cache.summary_key(user_message, result["digest"])
+                    cached_summary = cache.get("summary", summary_key)
+                    sp.set("hit", cached_summary is not None)
+                if cached_summary is not None:
+                    payload["content"] = cached_summary
+                    emit("content", cached_summary)
+                    if not cached_rows:
+                        cache.set("rows", rows_key, result)
+                else:
+                    pending = [self._asummary(user_message, result["digest"], on_text, result["data"])]
+                    if not cached_rows:
+                        pending.append(self._in_executor(cache.set, "rows", rows_key, result))
+                    summary, *_ = await asyncio.gather(*pending, return_exceptions=True)
+                    decision.model_calls += 1
+                    if isinstance(summary, UpstreamUnavailable):
+                        # Keep the chart and rows; only the prose is missing (and is not cached).
+                        payload["content"] = DEGRADED_MESSAGES["summary"]
+                        payload["_degraded"] = summary.as_metadata()
+                        emit("content", payload["content"])
+                    elif isinstance(summary, BaseException):
+                        raise summary
+                    else:
+                        payload["content"] = summary
+                        if summary:
+                            cache.set("summary", summary_key, summary)
+                if detail_task is not None:
+                    detail = await detail_task
+                    if detail:
+                        payload["_detail"] = detail
+            finally:
+                # An error path must not leave the speculative query running (or its exception unretrieved).
+                if detail_task is not None and not detail_task.done():
+                    detail_task.cancel()
+        else:
+            # Conversational turn classified by the model; the reply normally came back in the same call.
+            decision.route = "conversational"
+            payload["data"] = []
+            if not payload.get("content"):
                 try:
-                    if "```json" in model_output_text_only:
-                        model_output_text_only = model_output_text_only.split("```json")[1].split("```")[0]
-                    text_payload = json.loads(model_output_text_only)
-                    payload["content"] = text_payload.get("content", "")
-                except Exception as e:
-                    print(f"Warning: Could not generate text-only response. {e}")
-                    payload["content"] = ""
-            else:
-                payload["content"] = "I'm sorry, I couldn't generate a response."
+                    payload["content"] = await self._atext_only_reply(user_message)
+                except UpstreamUnavailable as e:
+                    payload["content"] = DEGRADED_MESSAGES["model"]
+                    payload["_degraded"] = e.as_metadata()
+                decision.model_calls += 1
+            emit("content", payload["content"])
 
+        return self._finish(payload, decision)
+
+    async def _adetail(self, checked: PreflightResult) -> Optional[dict]:
+        """
+        The turn's query grouped by one more dimension (agent/columns.py) as {"dimension", "data", "columns"},
+        or None when the query cannot be refined, the detail fails or it is larger than detail_rows.
+        """
+        refined = refine_sql(checked.original_sql)
+        if refined is None:
+            return None
+        sql, dimension = refined
+        cache = self.cache
+        try:
+            with span("detail", dimension=dimension) as sp:
+                detail = self.guard.check(sql)
+                rewritten = await self._arewrite(detail.sql)
+                if rewritten:
+                    detail.sql, detail.rollup = rewritten
+                rows_key = cache.rows_key(detail.sql)
+                result = cache.get("rows", rows_key)
+                sp.set("cached", result is not None)
+                if result is None:
+                    def run(timeout):
+                        self._dry_run(detail)
+                        return self._execute_sql(detail, None, timeout)
+
+                    # Optional work: one attempt, kept out of the warehouse circuit breaker's accounting.
+                    result = await self.resilience.call_optional(
+                        "warehouse.detail", "warehouse", lambda timeout: self._in_executor(run, timeout)
+                    )
+                    await self._in_executor(cache.set, "rows", rows_key, result)
+                sp.set("rows", len(result["data"]))
+        except Exception as e:
+            print(f"Warning: Could not fetch detail rows. {e}")
+            return None
+        if result["meta"]["truncated"] or len(result["data"]) > self._detail_rows:
+            return None
+        return {"dimension": dimension, "data": result["data"], "columns": describe_columns(sql, result["digest"])}
+
+    async def _afollowup(self, user_message: str, previous: dict, followup: FollowUp,
+                         emit: Callable[[str, object], None], on_text: Optional[Callable[[str], None]]) -> dict:
+        """Answers a follow-up from the previous turn's rows: no plan call and no warehouse query."""
+        decision = RouteDecision(route="followup", source="local", confidence=1.0)
+        emit("routing", decision.as_metadata())
+        payload = {"type": "analytics", "raw_sql": followup.raw_sql, "visualization": followup.visualization}
+        emit("plan", dict(payload))
+        for start in range(0, len(followup.rows), self._page_size):
+            emit("data", followup.rows[start:start + self._page_size])
+        payload["data"] = followup.rows
+        payload["_result"] = {"total_rows": len(followup.rows), "returned_rows": len(followup.rows), "truncated": False}
+        payload["_followup"] = followup.as_metadata()
+        buffer = ResultBuffer(self._max_result_rows, self._max_result_bytes)
+        buffer.add_page(followup.rows)
+        digest = buffer.digest()
+        payload["_columns"] = describe_columns(followup.raw_sql, digest)
+
+        if not followup.reshaped:
+            # Same rows, another chart: the previous summary still describes them.
+            payload["content"] = previous.get("content", "")
+            emit("content", payload["content"])
+            return self._finish(payload, decision)
+
+        cache = self.cache
+        with span("cache.summary") as sp:
+            summary_key = cache.summary_key(user_message, digest)
+            cached_summary = cache.get("summary", summary_key)
+            sp.set("hit", cached_summary is not None)
+        if cached_summary is not None:
+            payload["content"] = cached_summary
+            emit("content", cached_summary)
+            return self._finish(payload, decision)
+        try:
+            payload["content"] = await self._asummary(user_message, digest, on_text, followup.rows)
+            if payload["content"]:
+                cache.set("summary", summary_key, payload["content"])
+        except UpstreamUnavailable as e:
+            payload["content"] = DEGRADED_MESSAGES["summary"]
+            payload["_degraded"] = e.as_metadata()
+            emit("content", payload["content"])
+        decision.model_calls = 1
+        return self._finish(payload, decision)
+
+    def _finish(self, payload: dict, decision: RouteDecision) -> dict:
+        payload = self._normalize_payload(payload)
+        payload["_routing"] = decision.as_metadata()
+        return payload
 
+    @staticmethod
+    def _normalize_payload(payload: dict) -> dict:
         # Normalize the final payload
         # Ensure type is text if no raw_sql or visualization is provided
         if not payload.get("raw_sql") and (not payload.get("visualization") or payload.get("visualization", {}).get("chart_type") == "none"):
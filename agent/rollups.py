@@ -0,0 +1,326 @@
+# rollups.py
+#
+# Pre-aggregated rollup tables over the retail table and a rewriter that
+# redirects generated SQL to the smallest rollup able to answer it.
+#
+# Every rollup stores SUM and non-null COUNT of sales_amount and quantity,
+# plus COUNT(*), for its dimensions. The finest one (day x category x region) is refreshed
+# incrementally from the base table; the coarser ones are rebuilt from it,
+# which only touches a few thousand rows.
+#
+#   python -m agent.rollups build            # full rebuild
+#   python -m agent.rollups refresh          # re-aggregate the last few days
+#   python -m agent.rollups refresh --since 2024-06-01
+
+import argparse
+import datetime
+import json
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Optional
+
+import sqlglot
+from sqlglot import exp
+
+Rollup = namedtuple("Rollup", ["name", "dimensions"])
+
+# Ordered smallest first; the rewriter picks the first one that covers a query.
+ROLLUPS = [
+    Rollup("region", ("region",)),
+    Rollup("category", ("product_category",)),
+    Rollup("category_region", ("product_category", "region")),
+    Rollup("daily", ("transaction_date",)),
+    Rollup("daily_category_region", ("transaction_date", "product_category", "region")),
+]
+FINEST = ROLLUPS[-1]
+DIMENSIONS = set(FINEST.dimensions)
+
+# base column -> rollup columns holding its sum and its non-null count
+MEASURES = {"sales_amount": "sales_amount_sum", "quantity": "quantity_sum"}
+MEASURE_COUNTS = {"sales_amount": "sales_amount_count", "quantity": "quantity_count"}
+COUNT_COLUMN = "row_count"
+
+DEFAULT_LOOKBACK_DAYS = 3
+DEFAULT_FRESHNESS_TTL_SECONDS = 300.0
+
+
+def rollup_table(dataset: str, rollup: Rollup) -> str:
+    return f"{dataset}_rollup_{rollup.name}"
+
+
+# -----------------------------
+# Materialization
+# -----------------------------
+class RollupManager:
+    """
+    Builds and refreshes rollup tables. run_sql executes one statement and
+    returns its rows as tuples, so the same code drives BigQuery and a local
+    engine (statements are transpiled when dialect is not "bigquery").
+    """
+
+    def __init__(self, dataset: str, run_sql: Callable[[str], list], dialect: str = "bigquery"):
+        self.dataset = dataset
+        self.run_sql = run_sql
+        self.dialect = dialect
+
+    def _run(self, sql: str) -> list:
+        if self.dialect != "bigquery":
+            sql = sqlglot.transpile(sql, read="bigquery", write=self.dialect)[0]
+        return self.run_sql(sql)
+
+    @staticmethod
+    def _select(dimensions, source: str, from_rollup: bool, where: str = "") -> str:
+        dims = ", ".join(dimensions)
+        if from_rollup:
+            columns = list(MEASURES.values()) + list(MEASURE_COUNTS.values()) + [COUNT_COLUMN]
+            measures = ", ".join(f"SUM({col}) AS {col}" for col in columns)
+        else:
+            measures = ", ".join(
+                [f"SUM({base}) AS {col}" for base, col in MEASURES.items()]
+                + [f"COUNT({base}) AS {col}" for base, col in MEASURE_COUNTS.items()]
+                + [f"COUNT(*) AS {COUNT_COLUMN}"]
+            )
+        return f"SELECT {dims}, {measures} FROM {source}{where} GROUP BY {dims}"
+
+    def _rebuild_coarse(self, source_modified=None):
+        finest = rollup_table(self.dataset, FINEST)
+        for rollup in ROLLUPS[:-1]:
+            target = rollup_table(self.dataset, rollup)
+            self._run(f"CREATE OR REPLACE TABLE {target} AS {self._select(rollup.dimensions, finest, True)}")
+            self._mark(target, source_modified)
+
+    def _mark(self, table: str, source_modified):
+        # BigQuery only: record which version of the base table the rollup reflects.
+        if self.dialect == "bigquery" and source_modified is not None:
+            description = json.dumps({"source_modified": str(source_modified)}).replace("'", "\\'")
+            self._run(f"ALTER TABLE {table} SET OPTIONS (description = '{description}')")
+
+    def build(self, source_modified=None):
+        finest = rollup_table(self.dataset, FINEST)
+        print(f"Building {finest} from {self.dataset}")
+        self._run(f"CREATE OR REPLACE TABLE {finest} AS {self._select(FINEST.dimensions, self.dataset, False)}")
+        self._mark(finest, source_modified)
+        self._rebuild_coarse(source_modified)
+        print(f"Built {len(ROLLUPS)} rollups.")
+
+    def refresh(self, since: Optional[datetime.date] = None, lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+                source_modified=None):
+        """Re-aggregates base rows from `since` (default: last rollup date minus lookback_days) onwards."""
+        finest = rollup_table(self.dataset, FINEST)
+        if since is None:
+            rows = self._run(f"SELECT MAX(transaction_date) FROM {finest}")
+            latest = rows[0][0] if rows else None
+            if latest is None:
+                return self.build(source_modified)
+            if isinstance(latest, str):
+                latest = datetime.date.fromisoformat(latest)
+            since = latest - datetime.timedelta(days=lookback_days)
+
+        where = f" WHERE transaction_date >= DATE '{since.isoformat()}'"
+        print(f"Refreshing {finest} from {since.isoformat()}")
+        self._run(f"DELETE FROM {finest}{where}")
+        self._run(f"INSERT INTO {finest} {self._select(FINEST.dimensions, self.dataset, False, where)}")
+        self._mark(finest, source_modified)
+        self._rebuild_coarse(source_modified)
+        print("Rollups refreshed.")
+
+
+# -----------------------------
+# Query rewriting
+# -----------------------------
+class RollupRewriter:
+    """
+    Rewrites single-table aggregate queries over the base table onto a rollup.
+    Anything it cannot prove equivalent (joins, subqueries, windows, row-level
+    filters on measures, MIN/MAX of measures, ...) is left untouched.
+
+    available() returns the names of rollups that are safe to read; by
+    default every rollup is assumed to exist and be current.
+    """
+
+    def __init__(self, dataset: str, available: Optional[Callable[[], set]] = None):
+        self.dataset = dataset
+        self.dataset_id, self.table_id = dataset.split(".")
+        self.available = available or (lambda: {r.name for r in ROLLUPS})
+
+    def _is_base_table(self, table: exp.Table) -> bool:
+        return table.name == self.table_id and table.db == self.dataset_id
+
+    def _rewrite_aggregate(self, agg: exp.Expression) -> Optional[exp.Expression]:
+        """Returns the rollup equivalent of an aggregate call, or None if there is none."""
+        arg = agg.this
+        if isinstance(agg, exp.Count):
+            if isinstance(arg, exp.Star) or (isinstance(arg, exp.Literal) and not arg.is_string):
+                return exp.func("COALESCE", exp.Sum(this=exp.column(COUNT_COLUMN)), exp.Literal.number(0))
+            if isinstance(arg, exp.Distinct):
+                columns = [c for e in arg.expressions for c in e.find_all(exp.Column)]
+                return agg.copy() if columns and all(c.name not in MEASURES for c in columns) else None
+            return None
+        if not isinstance(arg, exp.Column):
+            return None
+        if isinstance(agg, exp.Sum) and arg.name in MEASURES:
+            return exp.Sum(this=exp.column(MEASURES[arg.name]))
+        if isinstance(agg, exp.Avg) and arg.name in MEASURES:
+            return exp.Paren(this=exp.Div(
+                this=exp.Sum(this=exp.column(MEASURES[arg.name])),
+                expression=exp.Sum(this=exp.column(MEASURE_COUNTS[arg.name])),
+            ))
+        if isinstance(agg, (exp.Min, exp.Max)) and arg.name not in MEASURES:
+            return agg.copy()
+        return None
+
+    def choose(self, needed: set) -> Optional[Rollup]:
+        available = self.available()
+        for rollup in ROLLUPS:
+            if rollup.name in available and needed <= set(rollup.dimensions):
+                return rollup
+        return None
+
+    def rewrite(self, sql: str) -> Optional[tuple]:
+        """Returns (rewritten_sql, rollup_name), or None when the query must run on the base table."""
+        try:
+            tree = sqlglot.parse_one(sql, read="bigquery")
+        except sqlglot.errors.ParseError:
+            return None
+        if not isinstance(tree, exp.Select) or tree.args.get("distinct"):
+            return None
+        if any(tree.find(node) for node in (exp.Join, exp.CTE, exp.Window, exp.Subquery)):
+            return None
+        if len(list(tree.find_all(exp.Select))) > 1:
+            return None
+        tables = list(tree.find_all(exp.Table))
+        if len(tables) != 1 or not self._is_base_table(tables[0]):
+            return None
+        # SELECT * needs row-level data; only COUNT(*) is allowed.
+        if any(not isinstance(star.parent, exp.Count) for star in tree.find_all(exp.Star)):
+            return None
+
+        aggregates = [agg for agg in tree.find_all(exp.AggFunc)]
+        if not aggregates:
+            return None
+        replacements = {}
+        for agg in aggregates:
+            if agg.find_ancestor(exp.AggFunc):
+                return None
+            replacement = self._rewrite_aggregate(agg)
+            if replacement is None:
+                return None
+            replacements[id(agg)] = replacement
+
+        # Every column referenced outside an aggregate must be a rollup dimension (or a select alias).
+        aliases = {e.alias for e in tree.expressions if e.alias}
+        needed = set()
+        for column in tree.find_all(exp.Column):
+            if isinstance(column.find_ancestor(exp.AggFunc), (exp.Sum, exp.Avg)):
+                continue  # measure inside SUM/AVG, already validated above
+            if column.name in MEASURES:
+                return None
+            if not column.table and column.name in aliases and column.name not in DIMENSIONS:
+                continue
+            needed.add(column.name)
+
+        rollup = self.choose(needed)
+        if rollup is None:
+            return None
+
+        tree = tree.transform(lambda node: replacements.get(id(node), node) if isinstance(node, exp.AggFunc) else node,
+                              copy=False)
+        table = tables[0]
+        table.set("this", exp.to_identifier(f"{self.table_id}_rollup_{rollup.name}"))
+        return tree.sql(dialect="bigquery"), rollup.name
+
+
+class RollupFreshness:
+    """
+    available() callable for RollupRewriter: a rollup is usable only if its
+    description records the base table's current `modified` timestamp.
+    describe(table_name) returns a table's description (Warehouse.get_description).
+    Looked up at most once per ttl seconds.
+    """
+
+    def __init__(self, dataset: str, describe: Callable[[str], Optional[str]], base_modified_getter: Callable,
+                 ttl: float = DEFAULT_FRESHNESS_TTL_SECONDS):
+        self.dataset = dataset
+        self.describe = describe
+        self.base_modified_getter = base_modified_getter
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._available = set()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        state["_checked_at"] = 0.0
+        state["_available"] = set()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __call__(self) -> set:
+        if time.monotonic() - self._checked_at < self.ttl:
+            return self._available
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.ttl:
+                return self._available
+            available = set()
+            base_modified = str(self.base_modified_getter())
+            for rollup in ROLLUPS:
+                try:
+                    marker = json.loads(self.describe(rollup_table(self.dataset, rollup)) or "{}").get("source_modified")
+                except Exception:
+                    continue
+                if marker == base_modified:
+                    available.add(rollup.name)
+            self._available = available
+            self._checked_at = time.monotonic()
+            return available
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def _bigquery_manager():
+    import os
+    from dotenv import load_dotenv
+    from google.cloud import bigquery
+
+    load_dotenv()
+    project_id = os.getenv("PROJECT_ID")
+    dataset_id = os.getenv("DATASET_ID")
+    table_id = os.getenv("TABLE_ID")
+    if not all([project_id, dataset_id, table_id]):
+        print("Error: Ensure PROJECT_ID, DATASET_ID, and TABLE_ID are set in your .env file.")
+        exit()
+
+    client = bigquery.Client(project=project_id)
+    dataset = f"{dataset_id}.{table_id}"
+
+    def run_sql(sql: str) -> list:
+        return [tuple(row.values()) for row in client.query(sql).result()]
+
+    source_modified = client.get_table(dataset).modified
+    return RollupManager(dataset, run_sql), source_modified
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or refresh rollup tables for the retail dataset.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Rebuild every rollup from the base table.")
+    refresh = sub.add_parser("refresh", help="Incrementally refresh rollups from recent base rows.")
+    refresh.add_argument("--since", type=datetime.date.fromisoformat, help="First transaction_date to re-aggregate.")
+    refresh.add_argument("--lookback-days", type=int, default=DEFAULT_LOOKBACK_DAYS)
+    args = parser.parse_args(argv)
+
+    manager, source_modified = _bigquery_manager()
+    if args.command == "build":
+        manager.build(source_modified=source_modified)
+    else:
+        manager.refresh(since=args.since, lookback_days=args.lookback_days, source_modified=source_modified)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# routing.py
+#
+# Decides how a turn is answered before any model call is made:
+#   - "conversational" : a single text-only model call (no classification call)
+#   - "model"          : the classification prompt, which returns either SQL +
+#                        visualization or, for small talk, the reply itself in
+#                        'content' (still a single call)
+#
+# The local classifier is deliberately simple (word and bigram lookups) so it
+# costs microseconds; it only short-circuits when it is confident.
+
+import re
+from dataclasses import dataclass, asdict
+
+# Pronouns, question words and yes/no are left out: on their own they are as likely to be a
+# follow-up about the previous result ("what is it?", "how much is that") as small talk.
+# Greetings that need them ("how are you") are covered by the bigrams below.
+CONVERSATIONAL_PHRASES = {
+    "hello", "hi", "hey", "hiya", "yo", "greetings", "thanks", "thank", "thx", "ty", "cheers",
+    "bye", "goodbye", "ok", "okay", "cool", "great", "nice", "wonderful", "awesome", "perfect",
+    "amazing", "good", "morning", "afternoon", "evening", "night", "are", "doing",
+    "can", "do", "name", "help", "am", "is", "so", "very", "a", "lot", "please", "there", "again",
+    "well", "done", "see", "later", "sure", "got", "appreciate", "welcome", "fine",
+}
+
+CONVERSATIONAL_BIGRAMS = {
+    "how are", "are you", "thank you", "what can", "can you", "you do", "who are", "your name",
+    "help me", "good morning", "good afternoon", "good evening", "see you", "thanks a",
+    "so much", "very much", "i am", "i appreciate", "appreciate it", "that's great",
+}
+
+ANALYTICS_TERMS = {
+    "sales", "sale", "revenue", "sold", "sell", "quantity", "units", "orders", "transactions",
+    "region", "regions", "category", "categories", "product", "products", "customer", "customers",
+    "chart", "bar", "line", "pie", "table", "tabular", "graph", "plot", "show", "list", "compare",
+    "total", "sum", "average", "avg", "mean", "count", "top", "highest", "lowest", "most", "least",
+    "trend", "monthly", "daily", "weekly", "month", "year", "quarter", "date", "by", "per",
+    "north", "south", "east", "west", "electronics", "apparel", "books", "outdoor", "goods",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+@dataclass
+class RouteDecision:
+    route: str              # "conversational", "model" or "followup" (answered from the session)
+    source: str             # "local" or "model"
+    confidence: float
+    model_calls: int = 0
+
+    def as_metadata(self) -> dict:
+        return asdict(self)
+
+
+class IntentClassifier:
+    """Keyword/bigram classifier returning (intent, confidence) without calling a model."""
+
+    def __init__(self, extra_analytics_terms=()):
+        self.analytics_terms = set(ANALYTICS_TERMS) | {t.lower() for t in extra_analytics_terms}
+
+    def classify(self, message: str):
+        tokens = TOKEN_RE.findall((message or "").lower())
+        if not tokens:
+            return "conversational", 0.0
+        if any(token in self.analytics_terms for token in tokens):
+            return "analytics", 1.0
+
+        # A token counts as small talk if it is a conversational word or part of a conversational bigram.
+        pairs = [f"{a} {b}" in CONVERSATIONAL_BIGRAMS for a, b in zip(tokens, tokens[1:])]
+        covered = sum(1 for i, token in enumerate(tokens)
+                      if token in CONVERSATIONAL_PHRASES or (i > 0 and pairs[i - 1]) or (i < len(pairs) and pairs[i]))
+        confidence = covered / len(tokens)
+        if any(pairs):
+            confidence = min(1.0, confidence + 0.1)
+        # Long messages are rarely pure small talk even when the words are generic.
+        if len(tokens) > 8:
+            confidence *= 0.5
+        return "conversational", confidence
+
+
+class IntentRouter:
+    """Routes a turn locally when the classifier is confident, otherwise defers to the model."""
+
+    def __init__(self, classifier: IntentClassifier = None, threshold: float = 0.8, enabled: bool = True):
+        self.classifier = classifier or IntentClassifier()
+        self.threshold = threshold
+        self.enabled = enabled
+
+    def route(self, message: str) -> RouteDecision:
+        if self.enabled:
+            intent, confidence = self.classifier.classify(message)
+            if intent == "conversational" and confidence >= self.threshold:
+                return RouteDecision(route="conversational", source="local", confidence=confidence)
+        return RouteDecision(route="model", source="model", confidence=0.0)
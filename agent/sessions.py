@@ -0,0 +1,107 @@
+# sessions.py
+#
+# Multi-turn context for RetailAgent, keyed by the caller's session_id.
+# A session holds the last few turns verbatim (question, SQL, chart spec,
+# result shape and, when the result is small and complete, the rows
+# themselves) plus one summary line per older turn. The summary is capped
+# at max_summary_chars by dropping its oldest lines, so the context sent to
+# the model stays bounded however long the session runs.
+# Sessions are JSON over the result cache's backends: in memory by default,
+# SQLite (AGENT_SESSION_DB) to share them across workers and restarts; both
+# evict least recently used sessions by total size and expire idle ones.
+
+import json
+import os
+import time
+from typing import Optional
+
+from agent.cache import MemoryBackend, SQLiteBackend, stable_hash
+
+DEFAULT_SESSION_TTL_SECONDS = 6 * 3600.0
+DEFAULT_SESSION_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_TURNS = 3
+DEFAULT_MAX_SUMMARY_CHARS = 1500
+# Results up to this size are kept with the turn so follow-ups can be answered locally.
+DEFAULT_SESSION_ROWS = 1000
+
+
+def new_session() -> dict:
+    return {"turns": [], "summary": []}
+
+
+def summarize_turn(turn: dict) -> str:
+    """One line standing in for a turn that no longer fits the context window."""
+    if turn.get("raw_sql"):
+        chart = (turn.get("visualization") or {}).get("chart_type", "none")
+        return f"Q: {turn['message']} -> {chart} from SQL: {' '.join(turn['raw_sql'].split())[:200]}"
+    return f"Q: {turn['message']} -> {(turn.get('content') or '')[:120]}"
+
+
+class SessionStore:
+    def __init__(self, backend=None, max_turns: int = DEFAULT_MAX_TURNS,
+                 max_summary_chars: int = DEFAULT_MAX_SUMMARY_CHARS, max_rows: int = DEFAULT_SESSION_ROWS):
+        self.backend = backend or MemoryBackend(DEFAULT_SESSION_MAX_BYTES, DEFAULT_SESSION_TTL_SECONDS)
+        self.max_turns = max_turns
+        self.max_summary_chars = max_summary_chars
+        self.max_rows = max_rows
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """AGENT_SESSION_DB: path of a SQLite file holding sessions; in memory if unset."""
+        path = os.getenv("AGENT_SESSION_DB")
+        if path:
+            return cls(SQLiteBackend(path, "sessions", DEFAULT_SESSION_MAX_BYTES, DEFAULT_SESSION_TTL_SECONDS))
+        return cls()
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return stable_hash(["session", session_id])
+
+    def get(self, session_id: str) -> dict:
+        text = self.backend.get(self._key(session_id))
+        return json.loads(text) if text is not None else new_session()
+
+    def record(self, session_id: str, session: dict, message: str, payload: dict):
+        """Appends the turn answered by payload and folds the oldest turns into the summary."""
+        data = payload.get("data") or []
+        result = payload.get("_result") or {}
+        complete = not result.get("truncated")
+        turn = {
+            "message": message,
+            "type": payload.get("type"),
+            "content": payload.get("content", ""),
+            "raw_sql": payload.get("raw_sql", ""),
+            "visualization": payload.get("visualization"),
+            "columns": list(data[0].keys()) if data else [],
+            "row_count": result.get("total_rows", len(data)),
+            "rows": data if data and complete and len(data) <= self.max_rows else None,
+            "at": time.time(),
+        }
+        # Only the latest result can be re-shaped by a follow-up; older rows are not worth their bytes.
+        for older in session["turns"]:
+            older["rows"] = None
+        session["turns"].append(turn)
+        while len(session["turns"]) > self.max_turns:
+            session["summary"].append(summarize_turn(session["turns"].pop(0)))
+        while session["summary"] and sum(len(line) for line in session["summary"]) > self.max_summary_chars:
+            session["summary"].pop(0)
+        self.backend.set(self._key(session_id), json.dumps(session, default=str))
+
+    def clear(self, session_id: Optional[str] = None):
+        if session_id is None:
+            self.backend.clear()
+        else:
+            self.backend.set(self._key(session_id), json.dumps(new_session()))
+
+
+def last_analytics_turn(session: dict) -> Optional[dict]:
+    for turn in reversed(session["turns"]):
+        if turn.get("raw_sql"):
+            return turn
+    return None
+
+
+def session_context_key(session: dict) -> str:
+    """What the plan cache must distinguish for a follow-up: the SQL it would build on."""
+    turn = last_analytics_turn(session)
+    return turn["raw_sql"] if turn else ""
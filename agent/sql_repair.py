@@ -0,0 +1,133 @@
+# sql_repair.py
+#
+# Self-correction for generated SQL that fails pre-flight (parse, scope) or
+# the dry run (BigQuery invalidQuery, DuckDB binder/conversion errors).
+# RetailAgent sends the error back to the model for a bounded number of
+# repair attempts. Every repair that works is recorded here:
+#   SqlFixCache : failing SQL -> fixed SQL, so a mistake repaired once is
+#                 rewritten locally next time without another model call
+# Entries are keyed on the query's pattern: the SQL with its string and
+# numeric literals replaced by placeholders. Take a repair that kept the
+# literals unchanged, e.g.
+#     EXTRACT(transaction_date FROM transaction_date) = 6
+#  -> EXTRACT(MONTH FROM transaction_date) = 6
+# It is stored as a template and also fixes the same mistake with other
+# literals (= 7). A repair that changed literals only fixes that exact query.
+# Exact keys are the SQL as written (whitespace collapsed), so queries that
+# differ only in the case of a literal never share a fix; pattern keys have
+# their keywords and function names upper-cased, identifiers left as they are.
+
+import json
+import os
+import re
+from typing import List, Optional, Tuple
+
+from sqlglot.parser import Parser
+from sqlglot.tokens import Tokenizer
+
+from agent.cache import MemoryBackend, SQLiteBackend, stable_hash
+from agent.guardrails import SqlRejected
+
+DEFAULT_FIX_TTL_SECONDS = 30 * 24 * 3600.0
+DEFAULT_FIX_MAX_BYTES = 4 * 1024 * 1024
+
+# DuckDB (local backend) errors that mean the query text is wrong, not the database.
+DUCKDB_QUERY_ERRORS = {
+    "ParserException", "BinderException", "CatalogException", "ConversionException", "InvalidInputException",
+}
+
+_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+_SLOT = "?"
+# Backquoted identifiers are matched whole so that their contents are never treated as keywords.
+_WORD = re.compile(r"`[^`]*`|\b[A-Za-z_][A-Za-z0-9_]*\b")
+_KEYWORDS = {word for keyword in Tokenizer.KEYWORDS for word in keyword.split()} | set(Parser.FUNCTIONS)
+
+
+def is_repairable(exc: BaseException) -> bool:
+    """True for errors the model can fix by rewriting the query."""
+    if isinstance(exc, SqlRejected):
+        return exc.repairable
+    if getattr(exc, "code", None) == 400:  # BigQuery invalidQuery and friends (google.api_core BadRequest)
+        return True
+    module = type(exc).__module__.split(".")[0]
+    if module in ("duckdb", "_duckdb"):
+        return type(exc).__name__ in DUCKDB_QUERY_ERRORS
+    return module == "sqlglot"
+
+
+def error_text(exc: BaseException) -> str:
+    """The error as the model should see it: the API's message without the request URL noise."""
+    return getattr(exc, "message", None) or str(exc)
+
+
+def parameterize(sql: str) -> Tuple[str, List[str]]:
+    """Returns (template, literals): whitespace collapsed and every literal replaced by a placeholder."""
+    literals = []
+
+    def slot(match):
+        literals.append(match.group(0))
+        return _SLOT
+
+    template = _LITERAL.sub(slot, " ".join((sql or "").split()))
+    return template, literals
+
+
+def normalize_keywords(template: str) -> str:
+    """template with SQL keywords and function names upper-cased; identifiers keep their case."""
+    return _WORD.sub(lambda m: m.group(0).upper() if m.group(0).upper() in _KEYWORDS else m.group(0), template)
+
+
+def fill(template: str, literals: List[str]) -> Optional[str]:
+    pieces = template.split(_SLOT)
+    if len(pieces) != len(literals) + 1:
+        return None
+    return "".join(piece + literal for piece, literal in zip(pieces, literals + [""]))
+
+
+class SqlFixCache:
+    """Learned (failing SQL pattern -> fixed SQL) pairs over a cache backend (memory, or SQLite to persist)."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend(DEFAULT_FIX_MAX_BYTES, DEFAULT_FIX_TTL_SECONDS)
+        self.stats = {"hits": 0, "misses": 0, "learned": 0}
+
+    @classmethod
+    def from_env(cls) -> "SqlFixCache":
+        """AGENT_SQL_FIX_CACHE: path of a SQLite file that keeps learned fixes across restarts; memory if unset."""
+        path = os.getenv("AGENT_SQL_FIX_CACHE")
+        if path:
+            return cls(SQLiteBackend(path, "sql_fixes", DEFAULT_FIX_MAX_BYTES, DEFAULT_FIX_TTL_SECONDS))
+        return cls()
+
+    @staticmethod
+    def _key(kind: str, text: str) -> str:
+        return stable_hash([kind, text])
+
+    def lookup(self, sql: str) -> Optional[str]:
+        """The known fix for sql, or None."""
+        template, literals = parameterize(sql)
+        text = self.backend.get(self._key("exact", " ".join(sql.split())))
+        if text is not None:
+            fixed = json.loads(text)
+        else:
+            text = self.backend.get(self._key("pattern", normalize_keywords(template)))
+            fixed = fill(json.loads(text), literals) if text is not None else None
+        self.stats["hits" if fixed else "misses"] += 1
+        return fixed
+
+    def learn(self, failing_sql: str, fixed_sql: str):
+        failing_template, failing_literals = parameterize(failing_sql)
+        fixed_template, fixed_literals = parameterize(fixed_sql)
+        if failing_template == fixed_template:
+            return
+        if failing_literals == fixed_literals:
+            self.backend.set(self._key("pattern", normalize_keywords(failing_template)), json.dumps(fixed_template))
+        else:
+            self.backend.set(self._key("exact", " ".join(failing_sql.split())), json.dumps(fixed_sql))
+        self.stats["learned"] += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def __len__(self):
+        return len(self.backend)
@@ -0,0 +1,224 @@
+# tracing.py
+#
+# Per-turn tracing for the agent pipeline. A Trace collects spans (name,
+# start, duration, attributes) for one turn, and pipeline code marks stages with
+#     with span("warehouse.execute") as s:
+#         s.set("rows", n)
+# Spans nest under whichever span is current. The current span lives in
+# contextvars, so nesting follows asyncio tasks, and RetailAgent._in_executor
+# carries it into executor threads. Outside a trace, span() is a no-op.
+# Finished traces are handed to the Tracer's exporters:
+#   OpenTelemetryExporter : replays the spans into the OpenTelemetry API (itself
+#                           a no-op unless an SDK/exporter is configured, e.g.
+#                           Agent Engine's Cloud Trace integration)
+#   JsonlExporter         : one JSON line per turn, for offline profiling
+# A trace can also be returned to the caller as the payload's _timings field.
+# With no exporters and no _timings requested, no trace is created at all.
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+_current_trace = contextvars.ContextVar("agent_trace", default=None)
+_current_span = contextvars.ContextVar("agent_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes")
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], start: float, attributes: dict):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = start
+        self.end = None
+        self.attributes = attributes
+
+    def set(self, key: str, value) -> "Span":
+        self.attributes[key] = value
+        return self
+
+    def add(self, key: str, amount=1) -> "Span":
+        """Accumulates a counter attribute (tokens, retries, ...)."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+        return self
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class _NoopSpan:
+    def set(self, key, value):
+        return self
+
+    def add(self, key, amount=1):
+        return self
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name: str, attributes: Optional[dict] = None):
+        self.trace_id = os.urandom(16).hex()
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+        self.root = self.open(name, None, attributes)
+
+    def open(self, name: str, parent: Optional[Span], attributes: Optional[dict] = None,
+             start: Optional[float] = None) -> Span:
+        with self._lock:
+            span = Span(name, len(self.spans) + 1, parent.span_id if parent is not None else None,
+                        time.perf_counter() if start is None else start, dict(attributes or {}))
+            self.spans.append(span)
+        return span
+
+    def finish(self):
+        self.root.end = time.perf_counter()
+
+    def epoch_ns(self, t: float) -> int:
+        return int((self.started_at + (t - self._t0)) * 1e9)
+
+    def as_timings(self) -> dict:
+        """The _timings payload: per-span offsets and durations in milliseconds."""
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(self.root.duration * 1000, 2),
+            "spans": [
+                {
+                    "name": s.name, "id": s.span_id, "parent": s.parent_id,
+                    "start_ms": round((s.start - self._t0) * 1000, 2),
+                    "duration_ms": round(s.duration * 1000, 2),
+                    "attributes": s.attributes,
+                }
+                for s in self.spans
+            ],
+        }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+    current = trace.open(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set("error", type(e).__name__)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def current_span():
+    """The innermost open span, for code that annotates a span it did not open (e.g. token counts)."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def record_span(name: str, seconds: float, **attributes):
+    """Adds an already-measured child span ending now (e.g. cumulative row-formatting time)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    end = time.perf_counter()
+    recorded = trace.open(name, _current_span.get(), attributes, start=end - seconds)
+    recorded.end = end
+
+
+# -----------------------------
+# Exporters
+# -----------------------------
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        line = json.dumps(dict(trace.as_timings(), started_at=trace.started_at), default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class OpenTelemetryExporter:
+    def __init__(self, instrumentation_name: str = "retail_agent"):
+        self.instrumentation_name = instrumentation_name
+
+    @staticmethod
+    def _attributes(attributes: dict) -> dict:
+        return {k: v if isinstance(v, (str, bool, int, float)) else str(v)
+                for k, v in attributes.items() if v is not None}
+
+    def export(self, trace: Trace):
+        from opentelemetry import trace as otel
+
+        tracer = otel.get_tracer(self.instrumentation_name)
+        opened = {}
+        # Parents are always opened before their children, so list order is a valid replay order.
+        for s in trace.spans:
+            parent = opened.get(s.parent_id)
+            context = otel.set_span_in_context(parent) if parent is not None else None
+            opened[s.span_id] = tracer.start_span(
+                s.name, context=context, start_time=trace.epoch_ns(s.start), attributes=self._attributes(s.attributes)
+            )
+        for s in reversed(trace.spans):
+            opened[s.span_id].end(end_time=trace.epoch_ns(s.end if s.end is not None else s.start))
+
+
+class Tracer:
+    def __init__(self, exporters: Optional[List] = None):
+        self.exporters = list(exporters or [])
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """AGENT_TRACE_EXPORTER: comma-separated 'otel' and/or 'jsonl' (file: AGENT_TRACE_FILE); unset means no-op."""
+        exporters = []
+        for name in filter(None, (n.strip().lower() for n in os.getenv("AGENT_TRACE_EXPORTER", "").split(","))):
+            if name in ("otel", "opentelemetry"):
+                exporters.append(OpenTelemetryExporter())
+            elif name == "jsonl":
+                exporters.append(JsonlExporter(os.getenv("AGENT_TRACE_FILE", "agent_traces.jsonl")))
+            else:
+                print(f"Warning: unknown trace exporter '{name}' ignored.")
+        return cls(exporters)
+
+    @contextmanager
+    def trace(self, name: str, record: bool = False, **attributes):
+        """Opens a trace for one turn; yields None when nothing would consume it."""
+        if not self.exporters and not record:
+            yield None
+            return
+        trace = Trace(name, attributes)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        try:
+            yield trace
+        finally:
+            trace.finish()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(trace)
+                except Exception as e:
+                    print(f"Warning: trace export failed ({type(exporter).__name__}). {e}")
@@ -0,0 +1,225 @@
+# warehouse.py
+#
+# The agent talks to its data through a Warehouse: schema lookup, a dry run
+# for cost/validity, and execution returning Arrow data. Two backends:
+#   BigQueryWarehouse : the production path (google.cloud.bigquery)
+#   DuckDBWarehouse   : embedded DuckDB over local Parquet files, for offline
+#                       development, demos and benchmarks
+# Generated SQL is always written in BigQuery dialect; DuckDBWarehouse runs it
+# through to_duckdb_sql() first.
+
+import glob
+import os
+import threading
+from collections import namedtuple
+from typing import Callable, Iterator, List, Optional
+
+import pyarrow as pa
+import sqlglot
+from sqlglot import exp
+
+DEFAULT_BATCH_SIZE = 5000
+
+TableInfo = namedtuple("TableInfo", ["columns", "modified"])  # columns: [(name, BigQuery type), ...]
+
+
+class Warehouse:
+    """Interface implemented by every execution backend."""
+
+    dialect = "bigquery"
+
+    def get_schema(self) -> TableInfo:
+        raise NotImplementedError
+
+    def dry_run(self, sql: str) -> int:
+        """Validates sql without running it and returns the estimated bytes it would process."""
+        raise NotImplementedError
+
+    def execute_batches(self, sql: str, batch_size: int = DEFAULT_BATCH_SIZE, timeout: Optional[float] = None,
+                        max_bytes_billed: Optional[int] = None) -> Iterator[pa.RecordBatch]:
+        """Runs sql and yields the result as Arrow record batches, one page at a time."""
+        raise NotImplementedError
+
+    def execute_arrow(self, sql: str, timeout: Optional[float] = None,
+                      max_bytes_billed: Optional[int] = None) -> pa.Table:
+        batches = list(self.execute_batches(sql, timeout=timeout, max_bytes_billed=max_bytes_billed))
+        if not batches:
+            return pa.table({})
+        return pa.Table.from_batches(batches)
+
+    def get_description(self, table_name: str) -> Optional[str]:
+        """Free-form table description (used for rollup freshness markers); None if unsupported."""
+        return None
+
+
+# -----------------------------
+# BigQuery
+# -----------------------------
+class BigQueryWarehouse(Warehouse):
+    dialect = "bigquery"
+
+    def __init__(self, dataset: str, client_factory: Callable):
+        self.dataset = dataset
+        self._client_factory = client_factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_client"] = None
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    def get_schema(self) -> TableInfo:
+        dataset_id, table_id = self.dataset.split('.')
+        table_ref = self.client.dataset(dataset_id).table(table_id)
+        table = self.client.get_table(table_ref)
+        columns = [(col.name, col.field_type) for col in table.schema]
+        return TableInfo(columns, getattr(table, "modified", None))
+
+    def dry_run(self, sql: str) -> int:
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        return self.client.query(sql, job_config=job_config).total_bytes_processed
+
+    def execute_batches(self, sql: str, batch_size: int = DEFAULT_BATCH_SIZE, timeout: Optional[float] = None,
+                        max_bytes_billed: Optional[int] = None) -> Iterator[pa.RecordBatch]:
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(
+            maximum_bytes_billed=max_bytes_billed or None,
+            job_timeout_ms=int(timeout * 1000) if timeout else None,
+        )
+        query_job = self.client.query(sql, job_config=job_config)
+        rows = query_job.result(page_size=batch_size, timeout=timeout)
+        yield from rows.to_arrow_iterable()
+
+    def get_description(self, table_name: str) -> Optional[str]:
+        return self.client.get_table(table_name).description
+
+
+# -----------------------------
+# DuckDB / Parquet
+# -----------------------------
+DUCKDB_TO_BIGQUERY_TYPES = {
+    "VARCHAR": "STRING", "DOUBLE": "FLOAT", "FLOAT": "FLOAT", "REAL": "FLOAT",
+    "BIGINT": "INTEGER", "INTEGER": "INTEGER", "SMALLINT": "INTEGER", "TINYINT": "INTEGER", "HUGEINT": "INTEGER",
+    "DATE": "DATE", "TIMESTAMP": "DATETIME", "TIMESTAMP WITH TIME ZONE": "TIMESTAMP", "BOOLEAN": "BOOLEAN",
+}
+
+
+def to_duckdb_sql(sql: str) -> str:
+    """
+    BigQuery -> DuckDB shim for the SQL the agent generates: EXTRACT, DATE
+    literals and functions are handled by sqlglot; fully qualified
+    `project.dataset.table` names lose the project so they resolve to the
+    local schema.
+    """
+    tree = sqlglot.parse_one(sql, read="bigquery")
+    for table in tree.find_all(exp.Table):
+        if table.args.get("catalog"):
+            table.set("catalog", None)
+    return tree.sql(dialect="duckdb")
+
+
+def local_table_dir(data_dir: str, dataset: str) -> str:
+    dataset_id, table_id = dataset.split(".")
+    return os.path.join(data_dir, dataset_id, table_id)
+
+
+class DuckDBWarehouse(Warehouse):
+    """
+    Exposes <data_dir>/<dataset_id>/<table_id>/*.parquet as the view
+    dataset_id.table_id in an embedded DuckDB database. Each thread gets its
+    own cursor on the shared connection.
+    """
+
+    dialect = "duckdb"
+
+    def __init__(self, dataset: str, data_dir: str, database: str = ":memory:"):
+        self.dataset = dataset
+        self.data_dir = data_dir
+        self.database = database
+        self._reset_runtime_state()
+
+    def _reset_runtime_state(self):
+        self._lock = threading.Lock()
+        self._con = None
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_lock", "_con", "_local"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_runtime_state()
+
+    @property
+    def table_dir(self) -> str:
+        return local_table_dir(self.data_dir, self.dataset)
+
+    def _files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.table_dir, "*.parquet")))
+
+    def _connection(self):
+        if self._con is None:
+            with self._lock:
+                if self._con is None:
+                    import duckdb
+
+                    con = duckdb.connect(self.database)
+                    dataset_id, table_id = self.dataset.split(".")
+                    pattern = os.path.join(self.table_dir, "*.parquet").replace("'", "''")
+                    con.execute(f"CREATE SCHEMA IF NOT EXISTS {dataset_id}")
+                    con.execute(f"CREATE OR REPLACE VIEW {dataset_id}.{table_id} AS SELECT * FROM read_parquet('{pattern}')")
+                    self._con = con
+        return self._con
+
+    def _cursor(self):
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._connection().cursor()
+            self._local.cursor = cursor
+        return cursor
+
+    def get_schema(self) -> TableInfo:
+        rows = self._cursor().execute(f"DESCRIBE {self.dataset}").fetchall()
+        columns = [(name, DUCKDB_TO_BIGQUERY_TYPES.get(str(col_type).upper(), str(col_type).upper()))
+                   for name, col_type, *_ in rows]
+        files = self._files()
+        modified = max(os.path.getmtime(path) for path in files) if files else None
+        return TableInfo(columns, modified)
+
+    def dry_run(self, sql: str) -> int:
+        # EXPLAIN binds the query (catching bad columns/functions) without running it. DuckDB has
+        # no bytes estimate, so report the Parquet size as an upper bound.
+        self._cursor().execute("EXPLAIN " + to_duckdb_sql(sql))
+        return sum(os.path.getsize(path) for path in self._files())
+
+    def execute_batches(self, sql: str, batch_size: int = DEFAULT_BATCH_SIZE, timeout: Optional[float] = None,
+                        max_bytes_billed: Optional[int] = None) -> Iterator[pa.RecordBatch]:
+        reader = self._cursor().execute(to_duckdb_sql(sql)).fetch_record_batch(batch_size)
+        yield from reader
+
+
+def warehouse_from_env(dataset: str, bq_client_factory: Callable) -> Warehouse:
+    """WAREHOUSE_BACKEND=duckdb selects the local backend (reading LOCAL_DATA_DIR); BigQuery otherwise."""
+    if os.getenv("WAREHOUSE_BACKEND", "bigquery").lower() == "duckdb":
+        return DuckDBWarehouse(dataset, os.getenv("LOCAL_DATA_DIR", "local_data"))
+    return BigQueryWarehouse(dataset, bq_client_factory)
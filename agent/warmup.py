@@ -0,0 +1,138 @@
+# warmup.py
+#
+# Cold-start reduction for a new serving instance of the deployed agent.
+# RetailAgent is pickled with no live clients, so without a warm-up the first
+# request on every new instance pays for creating the model and warehouse
+# clients (authentication, first TLS connections), fetching the table schema,
+# building the planning prompt, loading SQL tooling and starting with an empty
+# result cache. warm_up() does all of that once, from RetailAgent.set_up(),
+# which Agent Engine calls before the instance takes traffic:
+#   clients     : executor, event loop, warehouse and model clients
+#   schema      : table schema, table version and system_instruction_1
+#   sql         : guardrails, rollup freshness and the SQL dialects (sqlglot)
+#   connections : a token count on the model, opening its connection
+#   cache       : the result cache from a snapshot file (plans, summaries and,
+#                 for an unchanged table, rows) built ahead of time
+# Each step is best effort: a failure is logged and the request path creates
+# what is missing, as it would without a warm-up.
+#
+#   python -m agent.warmup snapshot questions.txt --out cache_snapshot.jsonl
+#   python -m agent.warmup imports               # import-time audit of the agent
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# The question set answered to fill a snapshot when none is given.
+DEFAULT_SNAPSHOT_QUESTIONS = (
+    "Total sales by region",
+    "Total sales by product category",
+    "Monthly sales trend",
+    "Top 5 product categories by sales",
+    "Units sold by region",
+)
+
+
+@contextmanager
+def _step(timings: dict, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        print(f"Warning: Warm-up step '{name}' failed. {e}")
+    finally:
+        timings[name] = round(1000 * (time.perf_counter() - started), 1)
+
+
+def warm_up(agent, snapshot: Optional[str] = None) -> dict:
+    """Creates everything the first request would otherwise create; returns {step: ms}."""
+    timings = {}
+    resources = agent.resources
+    with _step(timings, "clients"):
+        resources.executor
+        resources.event_loop
+        resources.warehouse
+        resources.model
+        for component in ("cache", "router", "guard", "tracer", "resilience", "sql_fixes", "sessions"):
+            getattr(agent, component)
+    with _step(timings, "schema"):
+        resources.system_instruction_1()
+        agent.cache.note_table_version(resources.table_modified)
+    with _step(timings, "sql"):
+        agent.guard.check(f"SELECT region, SUM(sales_amount) AS total_sales FROM {resources.dataset} GROUP BY region")
+        if agent.rollups:
+            agent.rollups.available()
+    with _step(timings, "connections"):
+        count_tokens = getattr(resources.model, "count_tokens", None)
+        if count_tokens is not None:
+            count_tokens("warm-up")
+    if snapshot:
+        with _step(timings, "cache"):
+            if os.path.exists(snapshot):
+                timings["cache_entries"] = agent.cache.load_snapshot(snapshot)
+            else:
+                print(f"Warning: Cache snapshot {snapshot} not found; starting with an empty cache.")
+    print(f"Warm-up done: {timings}")
+    return timings
+
+
+def audit_imports(module: str = "agent.retail_agent", top: int = 15) -> list:
+    """[(module, cumulative ms)] for the slowest imports of module, measured in a fresh interpreter."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, check=True).stderr
+    costs = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            costs[name.strip()] = int(cumulative) / 1000
+    return sorted(costs.items(), key=lambda item: -item[1])[:top]
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cache snapshots and import-time audit for cold starts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot = commands.add_parser("snapshot", help="Answer common questions and save the filled result cache.")
+    snapshot.add_argument("questions", nargs="?", help="Text file with one question per line (default: a built-in set).")
+    snapshot.add_argument("--out", default="cache_snapshot.jsonl")
+    imports = commands.add_parser("imports", help="List the slowest imports of the agent module.")
+    imports.add_argument("--module", default="agent.retail_agent")
+    imports.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    if args.command == "imports":
+        for name, ms in audit_imports(args.module, args.top):
+            print(f"{ms:9.1f} ms  {name}")
+        return
+
+    import vertexai
+    from dotenv import load_dotenv
+    from agent.retail_agent import RetailAgent
+
+    load_dotenv()
+    project_id, region = os.getenv("PROJECT_ID"), os.getenv("REGION")
+    dataset_id, table_id = os.getenv("DATASET_ID"), os.getenv("TABLE_ID")
+    if not all([project_id, region, dataset_id, table_id]):
+        print("Error: Ensure PROJECT_ID, REGION, DATASET_ID, and TABLE_ID are set in your .env file.")
+        exit()
+    vertexai.init(project=project_id, location=region)
+
+    questions = list(DEFAULT_SNAPSHOT_QUESTIONS)
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+    agent = RetailAgent(model="gemini-2.5-flash", name="retail_analytics_agent", dataset=f"{dataset_id}.{table_id}")
+    agent.query_batch({"questions": questions})
+    print(f"Wrote {agent.cache.export_snapshot(args.out)} cache entries for {len(questions)} questions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# bench_batch.py
+#
+# A nightly report's questions answered two ways, on a stub model and the
+# DuckDB backend with a simulated per-job warehouse latency:
+#   sequential : one aquery per question, as replaying them through /chat
+#   batch      : one aquery_batch (batched planning, shared SQL, GROUPING
+#                SETS merges, bounded workers)
+# Reports wall time, questions per second, model calls and warehouse jobs
+# for both, how the batch planned and fetched each question, and checks
+# that every batch answer has the same rows as its sequential answer.
+#
+#   python -m benchmarks.bench_batch --model-latency 0.3 --warehouse-latency 0.5
+
+import argparse
+import asyncio
+import collections
+import os
+import tempfile
+import time
+
+import create_bq_data
+from agent.cache import ResultCache, memory_backends
+from agent.resources import AgentResources
+from agent.retail_agent import RetailAgent
+from agent.warehouse import DuckDBWarehouse
+from benchmarks.bench_sessions import same_rows
+from benchmarks.stubs import StubModel
+
+DATASET = "bench.retail_data"
+T = DATASET
+
+
+def plan(sql, chart, x_axis, y_axis):
+    return {"type": "analytics", "raw_sql": sql,
+            "visualization": {"chart_type": chart, "x_axis": x_axis, "y_axis": y_axis}}
+
+
+PLANS = {
+    "Total sales by region": plan(f"SELECT region, SUM(sales_amount) AS total_sales FROM {T} GROUP BY region",
+                                  "bar_chart", "region", "total_sales"),
+    "Sales per region": plan(f"SELECT region, SUM(sales_amount) AS total_sales FROM {T} GROUP BY region",
+                             "bar_chart", "region", "total_sales"),
+    "Total sales by category": plan(f"SELECT product_category, SUM(sales_amount) AS total_sales FROM {T} "
+                                    f"GROUP BY product_category", "bar_chart", "product_category", "total_sales"),
+    "Units sold by region": plan(f"SELECT region, SUM(quantity) AS units FROM {T} GROUP BY region",
+                                 "bar_chart", "region", "units"),
+    "Units sold by category": plan(f"SELECT product_category, SUM(quantity) AS units FROM {T} "
+                                   f"GROUP BY product_category", "pie_chart", "product_category", "units"),
+    "Transactions by region": plan(f"SELECT region, COUNT(*) AS transactions FROM {T} GROUP BY region",
+                                   "bar_chart", "region", "transactions"),
+    "Average sale by category": plan(f"SELECT product_category, AVG(sales_amount) AS avg_sale FROM {T} "
+                                     f"GROUP BY product_category", "bar_chart", "product_category", "avg_sale"),
+    "Top 3 categories by sales": plan(f"SELECT product_category, SUM(sales_amount) AS total_sales FROM {T} "
+                                      f"GROUP BY product_category ORDER BY total_sales DESC LIMIT 3",
+                                      "bar_chart", "product_category", "total_sales"),
+    "Regions by units, smallest first": plan(f"SELECT region, SUM(quantity) AS units FROM {T} GROUP BY region "
+                                             f"ORDER BY units ASC", "bar_chart", "region", "units"),
+    "Total sales": plan(f"SELECT SUM(sales_amount) AS total_sales FROM {T}", "table", "total_sales", "total_sales"),
+    "Total units sold": plan(f"SELECT SUM(quantity) AS units FROM {T}", "table", "units", "units"),
+    "Sales by region and category": plan(f"SELECT region, product_category, SUM(sales_amount) AS total_sales "
+                                         f"FROM {T} GROUP BY region, product_category", "table", "region",
+                                         "total_sales"),
+    "Customers by region": plan(f"SELECT region, COUNT(DISTINCT customer_id) AS customers FROM {T} GROUP BY region",
+                                "bar_chart", "region", "customers"),
+    "Largest sale by region": plan(f"SELECT region, MAX(sales_amount) AS largest_sale FROM {T} GROUP BY region",
+                                   "bar_chart", "region", "largest_sale"),
+    "Smallest sale by category": plan(f"SELECT product_category, MIN(sales_amount) AS smallest_sale FROM {T} "
+                                      f"GROUP BY product_category", "bar_chart", "product_category", "smallest_sale"),
+    "Monthly sales": plan(f"SELECT DATE_TRUNC(transaction_date, MONTH) AS month, SUM(sales_amount) AS total_sales "
+                          f"FROM {T} GROUP BY month ORDER BY month", "line_chart", "month", "total_sales"),
+    "Sales by category in the North": plan(f"SELECT product_category, SUM(sales_amount) AS total_sales FROM {T} "
+                                           f"WHERE region = 'North' GROUP BY product_category",
+                                           "pie_chart", "product_category", "total_sales"),
+    "Units by category in the North": plan(f"SELECT product_category, SUM(quantity) AS units FROM {T} "
+                                           f"WHERE region = 'North' GROUP BY product_category",
+                                           "bar_chart", "product_category", "units"),
+    "Transactions in the North": plan(f"SELECT COUNT(*) AS transactions FROM {T} WHERE region = 'North'",
+                                      "table", "transactions", "transactions"),
+    "Sales by region in 2024": plan(f"SELECT region, SUM(sales_amount) AS total_sales FROM {T} "
+                                    f"WHERE EXTRACT(YEAR FROM transaction_date) = 2024 GROUP BY region",
+                                    "bar_chart", "region", "total_sales"),
+}
+# The report: every planned question, a few asked twice, and some small talk.
+QUESTIONS = list(PLANS) + ["Total sales by region", "Total sales by category", "hello", "thanks"]
+
+
+class ReportModel(StubModel):
+    def _plan(self, question):
+        return PLANS.get(question) or super()._plan(question)
+
+
+class SlowWarehouse(DuckDBWarehouse):
+    """DuckDB with a fixed latency per query job, standing in for BigQuery's job round trip."""
+
+    def __init__(self, *args, latency=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = latency
+        self.queries = 0
+
+    def execute_batches(self, sql, *args, **kwargs):
+        self.queries += 1
+        time.sleep(self.latency)
+        return super().execute_batches(sql, *args, **kwargs)
+
+
+def build_agent(args, data_dir) -> RetailAgent:
+    model = ReportModel(init_latency=0, call_latency=args.model_latency, dataset=DATASET)
+    warehouse = SlowWarehouse(DATASET, data_dir, latency=args.warehouse_latency)
+    resources = AgentResources(DATASET, model_factory=lambda name: model, warehouse_factory=lambda: warehouse)
+    cache = ResultCache(memory_backends())
+    return RetailAgent(model="stub", name="bench_batch_agent", dataset=DATASET, resources=resources, cache=cache,
+                       use_rollups=False, detail_rows=0)
+
+
+async def sequential(agent):
+    return [await agent.aquery({"message": question}) for question in QUESTIONS]
+
+
+async def batch(agent, args):
+    return await agent.aquery_batch({"questions": QUESTIONS, "workers": args.workers,
+                                     "plan_batch_size": args.plan_batch_size})
+
+
+def timed(agent, coro):
+    model, warehouse = agent.resources.model, agent.resources.warehouse
+    started = time.perf_counter()
+    payloads = asyncio.run(coro)
+    return payloads, time.perf_counter() - started, model.calls, warehouse.queries
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as data_dir:
+        table_dir = os.path.join(data_dir, *DATASET.split("."))
+        for _ in create_bq_data.iter_parquet_chunks(table_dir, args.rows, args.rows, 42, 1):
+            pass
+        agent = build_agent(args, data_dir)
+        one_by_one, seq_s, seq_model, seq_queries = timed(agent, sequential(agent))
+        agent = build_agent(args, data_dir)
+        batched, batch_s, batch_model, batch_queries = timed(agent, batch(agent, args))
+
+    n = len(QUESTIONS)
+    print(f"{n} questions, {args.workers} workers")
+    print(f"{'':<11} {'wall':>8} {'q/s':>7} {'model calls':>12} {'warehouse jobs':>15}")
+    for label, seconds, calls, queries in (("sequential", seq_s, seq_model, seq_queries),
+                                           ("batch", batch_s, batch_model, batch_queries)):
+        print(f"{label:<11} {seconds:7.2f}s {n / seconds:7.2f} {calls:12d} {queries:15d}")
+    print(f"speed-up: {seq_s / batch_s:.1f}x")
+    plans = collections.Counter(p["_batch"]["plan"] for p in batched)
+    rows = collections.Counter(p["_batch"]["rows"] for p in batched if p["_batch"]["rows"])
+    print("batch plans:", dict(plans), " rows:", dict(rows))
+    differ = [q for q, a, b in zip(QUESTIONS, one_by_one, batched)
+              if a.get("type") != b.get("type") or not same_rows(a.get("data") or [], b.get("data") or [])]
+    print("rows differ for: " + ", ".join(differ) if differ else f"all {n} answers have the same rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch report questions vs answering them one by one.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--warehouse-latency", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--plan-batch-size", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,124 @@
+# bench_cold_start.py
+#
+# Time to the first answer on a new serving instance, measured the way Agent
+# Engine starts one: a fresh interpreter imports the agent package, unpickles
+# the deployed RetailAgent and (if it has one) calls set_up() before taking
+# traffic. Three instances are compared:
+#   cold             : no warm-up; the first request creates the clients,
+#                      opens connections, fetches the schema and plans from
+#                      an empty cache
+#   set_up           : agent.warmup.warm_up() at startup
+#   set_up+snapshot  : warm_up() also loads a cache snapshot of common
+#                      questions, so the first of them is a cache hit
+# The model and BigQuery clients are stubs with a creation latency and a
+# one-off connection latency (credentials and the first TLS handshake) on
+# top of their per-call latency. "startup" is spent before the instance
+# takes traffic (hidden behind min_instances); "first" and "second" are
+# what the first two users wait for. The slowest imports are listed last.
+#
+#   python -m benchmarks.bench_cold_start --connect-latency 0.4 --model-latency 0.3
+
+import argparse
+import functools
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+QUESTION = "Total sales by region"
+DATASET = "stub_dataset.retail_data"
+SCENARIOS = ("cold", "set_up", "set_up+snapshot")
+
+
+def build_agent(args, snapshot=None):
+    from agent.resources import AgentResources
+    from agent.retail_agent import RetailAgent
+    from benchmarks.stubs import StubBigQueryClient, StubModel
+
+    model = functools.partial(StubModel, init_latency=args.init_latency, connect_latency=args.connect_latency,
+                              call_latency=args.model_latency, dataset=DATASET)
+    client = functools.partial(StubBigQueryClient, init_latency=args.init_latency,
+                               connect_latency=args.connect_latency, metadata_latency=args.metadata_latency,
+                               query_latency=args.warehouse_latency)
+    resources = AgentResources(DATASET, bq_client_factory=client, model_factory=model)
+    return RetailAgent(model="stub", name="bench_cold_start_agent", dataset=DATASET, resources=resources,
+                       use_rollups=False, cache_snapshot=snapshot)
+
+
+def write_snapshot(args, path):
+    """Answers QUESTION on a zero-latency agent and saves its cache, as `python -m agent.warmup snapshot` does."""
+    agent = build_agent(argparse.Namespace(**dict(vars(args), init_latency=0, connect_latency=0, model_latency=0,
+                                                  metadata_latency=0, warehouse_latency=0)))
+    agent.query({"message": QUESTION})
+    return agent.cache.export_snapshot(path)
+
+
+def child(scenario, pickled):
+    """Runs in a fresh interpreter: import, unpickle, optional set_up, then two requests; prints the timings."""
+    timings = {}
+    started = time.perf_counter()
+    import cloudpickle
+    importlib.import_module("agent.retail_agent")
+    timings["import"] = time.perf_counter() - started
+    mark = time.perf_counter()
+    with open(pickled, "rb") as f:
+        agent = cloudpickle.load(f)
+    timings["unpickle"] = time.perf_counter() - mark
+    mark = time.perf_counter()
+    if scenario != "cold":
+        agent.set_up()
+    timings["set_up"] = time.perf_counter() - mark
+    timings["startup"] = time.perf_counter() - started
+    for label in ("first", "second"):
+        mark = time.perf_counter()
+        result = agent.query({"message": QUESTION})
+        timings[label] = time.perf_counter() - mark
+    timings["rows"] = len(result.get("data") or [])
+    print(json.dumps(timings))
+
+
+def run_child(scenario, pickled):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_cold_start", "--child", scenario, pickled],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(args):
+    import cloudpickle
+    from agent.warmup import audit_imports
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, "cache_snapshot.jsonl")
+        entries = write_snapshot(args, snapshot)
+        print(f"snapshot: {entries} cache entries for '{QUESTION}'")
+        print(f"{'':<17} {'import':>8} {'unpickle':>9} {'set_up':>8} {'startup':>8} {'first':>8} {'second':>8} {'rows':>5}")
+        for scenario in SCENARIOS:
+            pickled = os.path.join(tmp, f"{scenario}.pkl")
+            with open(pickled, "wb") as f:
+                cloudpickle.dump(build_agent(args, snapshot if scenario.endswith("snapshot") else None), f)
+            t = run_child(scenario, pickled)
+            print(f"{scenario:<17} " + " ".join(f"{1000 * t[k]:6.0f}ms" for k in ("import", "unpickle")) +
+                  f" {1000 * t['set_up']:6.0f}ms " + " ".join(f"{1000 * t[k]:6.0f}ms" for k in ("startup", "first", "second")) +
+                  f" {t['rows']:5d}")
+    print("\nslowest imports of agent.retail_agent:")
+    for name, ms in audit_imports("agent.retail_agent", args.top):
+        print(f"{ms:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to the first answer on a new instance, with and without warm-up.")
+    parser.add_argument("--child", nargs=2, metavar=("SCENARIO", "PICKLE"), help=argparse.SUPPRESS)
+    parser.add_argument("--init-latency", type=float, default=0.2, help="Seconds to create each client.")
+    parser.add_argument("--connect-latency", type=float, default=0.4, help="Seconds for each client's first request.")
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--metadata-latency", type=float, default=0.1)
+    parser.add_argument("--warehouse-latency", type=float, default=0.3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+    else:
+        main(args)
@@ -0,0 +1,164 @@
+# bench_pivots.py
+#
+# Re-shaping a chart in the browser vs asking the agent again. A base question
+# is answered once, then four view changes (pie chart, top 3, re-group by
+# category, smallest first) are made two ways:
+#   round trip : a new chat turn per change (plan call, warehouse query,
+#                summary call), on a stub model and the DuckDB backend
+#   local      : ui/src/utils/pivot.js applied to the first payload's rows,
+#                _columns and _detail, timed under node
+# Reports the size the typed metadata and detail rows add to the first
+# payload, and the latency and bytes of every change on both paths.
+#
+#   python -m benchmarks.bench_pivots --model-latency 0.3
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import create_bq_data
+from agent.cache import ResultCache, memory_backends
+from agent.columns import DEFAULT_DETAIL_ROWS
+from agent.resources import AgentResources
+from agent.retail_agent import RetailAgent
+from agent.warehouse import DuckDBWarehouse
+from benchmarks.stubs import StubModel
+
+DATASET = "bench.retail_data"
+T = DATASET
+PIVOT_JS = os.path.join(os.path.dirname(__file__), "..", "ui", "src", "utils", "pivot.js")
+
+BASE = ("Total sales by region", f"SELECT region, SUM(sales_amount) AS total_sales FROM {T} GROUP BY region",
+        {"chart_type": "bar_chart", "x_axis": "region", "y_axis": "total_sales"})
+# (label, question asked on the round trip, its SQL and chart, the equivalent local view)
+CHANGES = [
+    ("pie chart", "Total sales by region as a pie chart",
+     f"SELECT region, SUM(sales_amount) AS total_sales FROM {T} GROUP BY region",
+     {"chart_type": "pie_chart", "x_axis": "region", "y_axis": "total_sales"},
+     {"chartType": "pie_chart"}),
+    ("top 3", "Top 3 regions by sales",
+     f"SELECT region, SUM(sales_amount) AS total_sales FROM {T} GROUP BY region ORDER BY total_sales DESC LIMIT 3",
+     {"chart_type": "bar_chart", "x_axis": "region", "y_axis": "total_sales"},
+     {"limit": 3}),
+    ("by category", "Total sales by category",
+     f"SELECT product_category, SUM(sales_amount) AS total_sales FROM {T} GROUP BY product_category",
+     {"chart_type": "bar_chart", "x_axis": "product_category", "y_axis": "total_sales"},
+     {"xAxis": "product_category", "regroup": True}),
+    ("smallest first", "Total sales by region, smallest first",
+     f"SELECT region, SUM(sales_amount) AS total_sales FROM {T} GROUP BY region ORDER BY total_sales ASC",
+     {"chart_type": "bar_chart", "x_axis": "region", "y_axis": "total_sales"},
+     {"sort": "asc"}),
+]
+PLANS = {question: (sql, viz) for _, question, sql, viz, _ in CHANGES}
+PLANS[BASE[0]] = BASE[1:]
+
+NODE_SCRIPT = """
+import { buildView } from "./pivot.mjs";
+import { readFileSync } from "fs";
+const { payload, views, iterations } = JSON.parse(readFileSync(0, "utf8"));
+const result = { data: payload.data, columns: payload._columns, detail: payload._detail };
+const base = { chartType: payload.visualization.chart_type, xAxis: payload.visualization.x_axis,
+               yAxis: payload.visualization.y_axis, sort: "none", limit: 0, regroup: false };
+const out = views.map((change) => {
+  const view = { ...base, ...change };
+  let shown;
+  const started = process.hrtime.bigint();
+  for (let i = 0; i < iterations; i++) shown = buildView(result, view);
+  const ms = Number(process.hrtime.bigint() - started) / 1e6 / iterations;
+  return { ms, rows: shown.rows };
+});
+console.log(JSON.stringify(out));
+"""
+
+
+class PlannedModel(StubModel):
+    def _answer(self, contents):
+        parts = [part.get("text", "") for msg in contents for part in msg.get("parts", [])]
+        if "Your first task" not in " ".join(parts):
+            return super()._answer(contents)
+        sql, viz = PLANS[parts[-1]]
+        return json.dumps({"type": "analytics", "raw_sql": sql, "visualization": viz})
+
+
+def build_agent(args, data_dir, detail_rows) -> RetailAgent:
+    model = PlannedModel(init_latency=0, call_latency=args.model_latency, dataset=DATASET)
+    resources = AgentResources(DATASET, model_factory=lambda name: model,
+                               warehouse_factory=lambda: DuckDBWarehouse(DATASET, data_dir))
+    cache = ResultCache(memory_backends(max_bytes={"rows": 0, "summary": 0}))
+    return RetailAgent(model="stub", name="bench_pivots_agent", dataset=DATASET, resources=resources, cache=cache,
+                       use_rollups=False, detail_rows=detail_rows)
+
+
+def size(payload) -> int:
+    return len(json.dumps(payload, default=str).encode())
+
+
+async def ask(agent, question):
+    started = time.perf_counter()
+    payload = await agent.aquery({"message": question})
+    return payload, 1000 * (time.perf_counter() - started)
+
+
+def same_rows(rows: list, other: list) -> bool:
+    """Row sets compared by value: JSON.stringify writes 203818.0 as 203818."""
+    def canonical(rs):
+        return sorted(json.dumps({k: float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+                                  for k, v in r.items()}, default=str, sort_keys=True) for r in rs)
+    return canonical(rows) == canonical(other)
+
+
+def run_local(payload, iterations):
+    """Times pivot.js under node; None if node is not installed."""
+    node = shutil.which("node")
+    if node is None:
+        return None
+    with tempfile.TemporaryDirectory() as work:
+        shutil.copy(PIVOT_JS, os.path.join(work, "pivot.mjs"))
+        script = os.path.join(work, "bench.mjs")
+        with open(script, "w") as f:
+            f.write(NODE_SCRIPT)
+        views = [change for *_, change in CHANGES]
+        stdin = json.dumps({"payload": payload, "views": views, "iterations": iterations}, default=str)
+        out = subprocess.run([node, script], input=stdin, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as data_dir:
+        table_dir = os.path.join(data_dir, *DATASET.split("."))
+        for _ in create_bq_data.iter_parquet_chunks(table_dir, args.rows, args.rows, 42, 1):
+            pass
+        plain, plain_ms = asyncio.run(ask(build_agent(args, data_dir, 0), BASE[0]))
+        plain = {k: v for k, v in plain.items() if k != "_columns"}
+        agent = build_agent(args, data_dir, args.detail_rows)
+        base, base_ms = asyncio.run(ask(agent, BASE[0]))
+        round_trips = [asyncio.run(ask(agent, question)) for _, question, *_ in CHANGES]
+        local = run_local(base, args.iterations)
+
+    detail = base.get("_detail") or {}
+    print(f"first answer: {base_ms:.0f} ms, {size(base)} bytes "
+          f"({plain_ms:.0f} ms, {size(plain)} bytes without metadata; _columns {size(base['_columns'])} B, "
+          f"_detail {size(detail)} B with {len(detail.get('data', []))} rows by {detail.get('dimension')})")
+    print(f"{'change':<16} {'round trip':>22} {'local':>22}")
+    for i, ((label, *_), (payload, ms)) in enumerate(zip(CHANGES, round_trips)):
+        if local is None:
+            here = "n/a (node not found)"
+        else:
+            here = f"{local[i]['ms']:8.3f} ms {0:6d} B"
+            if not same_rows(local[i]["rows"], payload["data"]):
+                here += "  (rows differ)"
+        print(f"{label:<16} {ms:8.0f} ms {size(payload):6d} B {here}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local chart pivots vs a new agent round trip.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--detail-rows", type=int, default=DEFAULT_DETAIL_ROWS)
+    parser.add_argument("--iterations", type=int, default=200, help="Repetitions per local view when timing it.")
+    main(parser.parse_args())
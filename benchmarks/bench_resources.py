@@ -0,0 +1,54 @@
+# bench_resources.py
+#
+# Measures the per-request setup overhead of RetailAgent.query before and
+# after the shared AgentResources layer, using stub clients so the numbers
+# are reproducible offline.
+#
+#   python -m benchmarks.bench_resources --requests 50
+
+import argparse
+import statistics
+import time
+
+from agent.resources import AgentResources
+from benchmarks.stubs import StubBigQueryClient, StubModel
+
+DATASET = "stub_dataset.retail_data"
+
+
+def per_request_setup(n):
+    """The original behaviour: new clients and a get_table round trip on every request."""
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        resources = AgentResources(DATASET, bq_client_factory=StubBigQueryClient, model_factory=StubModel)
+        resources.model
+        resources.system_instruction_1()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def shared_setup(n):
+    """One AgentResources per agent: clients, schema and the compiled prompt are reused."""
+    resources = AgentResources(DATASET, bq_client_factory=StubBigQueryClient, model_factory=StubModel)
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        resources.model
+        resources.system_instruction_1()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label, timings):
+    ms = [t * 1000 for t in timings]
+    print(f"{label:<22} mean={statistics.mean(ms):8.3f} ms  p50={statistics.median(ms):8.3f} ms  max={max(ms):8.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-request overhead of client/schema setup.")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    report("before (per request)", per_request_setup(args.requests))
+    report("after (shared)", shared_setup(args.requests))
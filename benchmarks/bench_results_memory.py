@@ -0,0 +1,83 @@
+# bench_results_memory.py
+#
+# Peak memory and time of result handling at 10k/100k/1M rows:
+#   legacy   : [dict(row) ...] -> formatted list-of-dicts -> json.dumps for the summary prompt
+#   columnar : ResultBuffer streaming pages of rows, capped UI rows + digest for the summary prompt
+#   arrow    : ResultBuffer streaming Arrow record batches, as the warehouse delivers them
+# Time is measured in a separate run without tracemalloc, which slows Python-level
+# allocation far more than Arrow's, and includes generating the stub rows (the
+# "generate" line) that every path pays.
+#
+#   python -m benchmarks.bench_results_memory --sizes 10000 100000 1000000
+
+import argparse
+import datetime
+import json
+import time
+import tracemalloc
+
+from agent.results import DEFAULT_MAX_BYTES, DEFAULT_MAX_ROWS, ResultBuffer
+from benchmarks.stubs import StubRowIterator, iter_detail_rows
+
+
+def legacy(n, page_size):
+    results = [dict(row) for row in StubRowIterator(iter_detail_rows(n), page_size)]
+    formatted_results = []
+    for row in results:
+        formatted_row = {}
+        for key, value in row.items():
+            if isinstance(value, float):
+                formatted_row[key] = round(value, 2)
+            elif isinstance(value, (datetime.date, datetime.datetime)):
+                formatted_row[key] = value.isoformat()
+            else:
+                formatted_row[key] = value
+        formatted_results.append(formatted_row)
+    prompt_data = json.dumps(formatted_results)
+    return len(formatted_results), len(prompt_data)
+
+
+def columnar(n, page_size):
+    buffer = ResultBuffer(max_rows=DEFAULT_MAX_ROWS, max_bytes=DEFAULT_MAX_BYTES)
+    buffer.consume(StubRowIterator(iter_detail_rows(n), page_size))
+    rows = buffer.to_rows()
+    prompt_data = json.dumps(buffer.digest())
+    return len(rows), len(prompt_data)
+
+
+def arrow(n, page_size):
+    buffer = ResultBuffer(max_rows=DEFAULT_MAX_ROWS, max_bytes=DEFAULT_MAX_BYTES)
+    buffer.consume_batches(StubRowIterator(iter_detail_rows(n), page_size).to_arrow_iterable())
+    rows = buffer.to_rows()
+    prompt_data = json.dumps(buffer.digest())
+    return len(rows), len(prompt_data)
+
+
+def generate(n, page_size):
+    for _ in StubRowIterator(iter_detail_rows(n), page_size).pages:
+        pass
+    return 0, 0
+
+
+def measure(fn, n, page_size):
+    start = time.perf_counter()
+    fn(n, page_size)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    returned_rows, prompt_bytes = fn(n, page_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, returned_rows, prompt_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory benchmark for result handling.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--page-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'path':<9} {'time':>9} {'peak MB':>9} {'UI rows':>9} {'prompt KB':>10}")
+    for n in args.sizes:
+        for label, fn in (("generate", generate), ("legacy", legacy), ("columnar", columnar), ("arrow", arrow)):
+            elapsed, peak, returned_rows, prompt_bytes = measure(fn, n, args.page_size)
+            print(f"{n:>9} {label:<9} {elapsed:>8.2f}s {peak / 2**20:>9.1f} {returned_rows:>9} {prompt_bytes / 1024:>10.1f}")
@@ -0,0 +1,165 @@
+# bench_sessions.py
+#
+# A scripted multi-turn conversation, answered two ways:
+#   stateless : every follow-up is re-asked as a complete question, so each
+#               turn is a plan call, a warehouse query and a summary call
+#   session   : the same conversation under one session_id; follow-ups that
+#               only re-shape the last result (chart, filter, top N, regroup)
+#               are answered from the session's rows, the rest is planned by
+#               the model with the earlier turns as context
+# Reports per-turn latency, model calls and warehouse queries for both. For
+# every locally answered turn it also runs the SQL that the follow-up carries
+# and checks that the warehouse returns the same rows.
+#
+#   python -m benchmarks.bench_sessions --model-latency 0.3
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+
+import create_bq_data
+from agent.resources import AgentResources
+from agent.retail_agent import RetailAgent
+from agent.sessions import SessionStore
+from agent.warehouse import DuckDBWarehouse
+from benchmarks.stubs import StubModel
+
+DATASET = "bench.retail_data"
+T = DATASET
+
+# (what the user types in a session, the same question asked on its own, the SQL the model plans for it)
+CONVERSATION = [
+    ("Sales by region and category", "Sales by region and category",
+     f"SELECT region, product_category, SUM(sales_amount) AS total_sales FROM {T} "
+     f"GROUP BY region, product_category", "bar_chart", "region"),
+    ("as a pie chart", "Sales by region and category as a pie chart",
+     f"SELECT region, product_category, SUM(sales_amount) AS total_sales FROM {T} "
+     f"GROUP BY region, product_category", "pie_chart", "region"),
+    ("only North", "Sales by category in the North region as a pie chart",
+     f"SELECT region, product_category, SUM(sales_amount) AS total_sales FROM {T} WHERE region = 'North' "
+     f"GROUP BY region, product_category", "pie_chart", "region"),
+    ("top 3", "Top 3 categories by sales in the North region as a pie chart",
+     f"SELECT region, product_category, SUM(sales_amount) AS total_sales FROM {T} WHERE region = 'North' "
+     f"GROUP BY region, product_category ORDER BY total_sales DESC LIMIT 3", "pie_chart", "region"),
+    ("what about units sold by region", "Units sold by region",
+     f"SELECT region, SUM(quantity) AS units FROM {T} GROUP BY region", "bar_chart", "region"),
+    ("sort ascending", "Units sold by region, smallest first",
+     f"SELECT region, SUM(quantity) AS units FROM {T} GROUP BY region ORDER BY units ASC", "bar_chart", "region"),
+    ("exclude South", "Units sold by region except the South, smallest first",
+     f"SELECT region, SUM(quantity) AS units FROM {T} WHERE region != 'South' GROUP BY region "
+     f"ORDER BY units ASC", "bar_chart", "region"),
+    ("now sales by category and region", "Sales by category and region",
+     f"SELECT product_category, region, SUM(sales_amount) AS total_sales FROM {T} "
+     f"GROUP BY product_category, region", "bar_chart", "product_category"),
+    ("by region", "Total sales by region",
+     f"SELECT region, SUM(sales_amount) AS total_sales FROM {T} GROUP BY region", "bar_chart", "region"),
+]
+
+
+class ScriptedModel(StubModel):
+    """Plans each question (on its own or in a session) with its scripted SQL."""
+
+    def _answer(self, contents):
+        parts = [part.get("text", "") for msg in contents for part in msg.get("parts", [])]
+        if "Your first task" not in " ".join(parts):
+            return super()._answer(contents)
+        for message, question, sql, chart, x_axis in CONVERSATION:
+            if parts[-1] in (message, question):
+                y_axis = "units" if "units" in sql else "total_sales"
+                return json.dumps({"type": "analytics", "raw_sql": sql,
+                                   "visualization": {"chart_type": chart, "x_axis": x_axis, "y_axis": y_axis}})
+        raise ValueError(f"unscripted question: {parts[-1]}")
+
+
+class CountingWarehouse(DuckDBWarehouse):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = 0
+
+    def execute_batches(self, sql, *args, **kwargs):
+        self.queries += 1
+        return super().execute_batches(sql, *args, **kwargs)
+
+
+def build_agent(args, data_dir) -> RetailAgent:
+    model = ScriptedModel(init_latency=0, call_latency=args.model_latency, dataset=DATASET)
+    warehouse = CountingWarehouse(DATASET, data_dir)
+    resources = AgentResources(DATASET, model_factory=lambda name: model, warehouse_factory=lambda: warehouse)
+    return RetailAgent(model="stub", name="bench_sessions_agent", dataset=DATASET, resources=resources,
+                       use_rollups=False, sessions=SessionStore())
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def same_rows(a, b) -> bool:
+    """Equal as sets of rows (text columns identify a row), numbers to the cent (the agent rounds to 2 dp)."""
+    def key(row):
+        return sorted((k, str(v)) for k, v in row.items() if number(v) is None)
+
+    if len(a) != len(b):
+        return False
+    for x, y in zip(sorted(a, key=key), sorted(b, key=key)):
+        if key(x) != key(y) or any(abs(number(x[k]) - number(y.get(k))) > 0.011
+                                   for k in x if number(x[k]) is not None):
+            return False
+    return True
+
+
+async def run(agent, session_id=None):
+    turns = []
+    model, warehouse = agent.resources.model, agent.resources.warehouse
+    for message, question, *_ in CONVERSATION:
+        calls, queries = model.calls, warehouse.queries
+        started = time.perf_counter()
+        payload = await agent.aquery({"message": message, "session_id": session_id} if session_id
+                                     else {"message": question})
+        elapsed = time.perf_counter() - started
+        turns.append({"message": message, "ms": 1000 * elapsed, "model": model.calls - calls,
+                      "warehouse": warehouse.queries - queries, "route": payload["_routing"]["route"],
+                      "payload": payload})
+    return turns
+
+
+def check(agent, turn) -> str:
+    """Runs the SQL a local follow-up reports and compares the warehouse rows with the ones it returned."""
+    if turn["route"] != "followup":
+        return ""
+    table = agent.resources.warehouse.execute_arrow(turn["payload"]["raw_sql"])
+    return "same rows" if same_rows(table.to_pylist(), turn["payload"]["data"]) else "ROWS DIFFER"
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as data_dir:
+        table_dir = os.path.join(data_dir, *DATASET.split("."))
+        for _ in create_bq_data.iter_parquet_chunks(table_dir, args.rows, args.rows, 42, 1):
+            pass
+        stateless = asyncio.run(run(build_agent(args, data_dir)))
+        agent = build_agent(args, data_dir)
+        session = asyncio.run(run(agent, str(uuid.uuid4())))
+
+        print(f"{'turn':<36} {'stateless':>22} {'session':>22}  route / check")
+        for a, b in zip(stateless, session):
+            print(f"{a['message']:<36} {a['ms']:7.0f} ms {a['model']}m {a['warehouse']}w   "
+                  f"{b['ms']:7.0f} ms {b['model']}m {b['warehouse']}w  {b['route']:<8} {check(agent, b)}")
+        followups = session[1:]
+        for label, turns in (("stateless", stateless[1:]), ("session", followups)):
+            print(f"{label:<10} follow-ups: {sum(t['ms'] for t in turns) / len(turns):7.0f} ms mean, "
+                  f"{sum(t['model'] for t in turns)} model calls, {sum(t['warehouse'] for t in turns)} warehouse queries")
+        local = sum(t["route"] == "followup" for t in followups)
+        print(f"answered locally: {local}/{len(followups)} follow-ups")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow-up latency and cost with and without sessions.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    main(parser.parse_args())
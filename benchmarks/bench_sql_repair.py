@@ -0,0 +1,160 @@
+# bench_sql_repair.py
+#
+# First-try vs after-repair success rate of generated SQL over a fixed
+# question set. A scripted stub model answers each question with a known
+# (sometimes wrong) query and, when sent the error, with its next attempt.
+# The queries run on the embedded DuckDB backend over a small generated
+# dataset, so the errors are real binder/parser errors.
+# Three passes:
+#   no repair     : max_sql_repairs=0 (the old behaviour: the error goes to the user)
+#   repair (cold) : model repairs, fix cache empty
+#   repair (warm) : same questions reworded (no plan-cache hits), fix cache warm;
+#                   known mistakes are rewritten locally
+#
+#   python -m benchmarks.bench_sql_repair --model-latency 0.3
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import create_bq_data
+from agent.cache import ResultCache, memory_backends
+from agent.resources import AgentResources
+from agent.retail_agent import RetailAgent
+from agent.sql_repair import SqlFixCache
+from agent.warehouse import DuckDBWarehouse
+from benchmarks.stubs import StubModel
+
+DATASET = "bench.retail_data"
+T = DATASET
+VIZ = {"chart_type": "bar_chart", "x_axis": "label", "y_axis": "value"}
+
+# question -> successive raw_sql attempts (first answer, then one per repair request)
+SCRIPT = {
+    "Total sales by region": [
+        f"SELECT region AS label, SUM(sales_amount) AS value FROM {T} GROUP BY region",
+    ],
+    "Sales in June by category": [
+        f"SELECT product_category AS label, SUM(sales_amount) AS value FROM {T} "
+        f"WHERE EXTRACT(transaction_date FROM transaction_date) = 6 GROUP BY product_category",
+        f"SELECT product_category AS label, SUM(sales_amount) AS value FROM {T} "
+        f"WHERE EXTRACT(MONTH FROM transaction_date) = 6 GROUP BY product_category",
+    ],
+    "Sales in July by category": [
+        f"SELECT product_category AS label, SUM(sales_amount) AS value FROM {T} "
+        f"WHERE EXTRACT(transaction_date FROM transaction_date) = 7 GROUP BY product_category",
+        f"SELECT product_category AS label, SUM(sales_amount) AS value FROM {T} "
+        f"WHERE EXTRACT(MONTH FROM transaction_date) = 7 GROUP BY product_category",
+    ],
+    "Revenue per category": [
+        f"SELECT product_category AS label, SUM(sales) AS value FROM {T} GROUP BY product_category",
+        f"SELECT product_category AS label, SUM(sales_amount) AS value FROM {T} GROUP BY product_category",
+    ],
+    "Units sold per region and category": [
+        f"SELECT region AS label, product_category, SUM(quantity) AS value FROM {T} GROUP BY region",
+        f"SELECT region AS label, product_category, SUM(quantity) AS value FROM {T} GROUP BY region, product_category",
+    ],
+    "Average quantity by region": [
+        f"SELECT region AS label AVG(quantity) AS value FROM {T} GROUP BY region",
+        f"SELECT region AS label, AVG(quantity) AS value FROM {T} GROUP BY region",
+    ],
+    "Orders per region from the orders table": [
+        "SELECT region AS label, COUNT(*) AS value FROM bench.orders GROUP BY region",
+        f"SELECT region AS label, COUNT(*) AS value FROM {T} GROUP BY region",
+    ],
+    "Sales by region in the analytics project": [  # another project's copy of the table
+        "SELECT region AS label, SUM(sales_amount) AS value FROM `analytics-prod.bench.retail_data` GROUP BY region",
+        f"SELECT region AS label, SUM(sales_amount) AS value FROM {T} GROUP BY region",
+    ],
+    "Top 5 products by sales": [
+        f"SELECT product_id AS label, SUM(sales_amount) AS value FROM {T} GROUP BY product_id "
+        f"ORDER BY value DESC LIMIT 5",
+    ],
+    "Monthly sales trend": [
+        f"SELECT EXTRACT(transaction_date FROM transaction_date) AS label, SUM(sales_amount) AS value FROM {T} "
+        f"GROUP BY label ORDER BY label",
+        f"SELECT EXTRACT(MONTH FROM transaction_date) AS label, SUM(sales_amount) AS value FROM {T} "
+        f"GROUP BY label ORDER BY label",
+    ],
+    "Profit by region": [  # no such column; the model never gets it right
+        f"SELECT region AS label, SUM(profit) AS value FROM {T} GROUP BY region",
+        f"SELECT region AS label, SUM(margin) AS value FROM {T} GROUP BY region",
+        f"SELECT region AS label, SUM(net_profit) AS value FROM {T} GROUP BY region",
+    ],
+}
+
+
+class ScriptedSqlModel(StubModel):
+    """Plans from SCRIPT; each repair request in the conversation advances to the question's next attempt."""
+
+    def _answer(self, contents):
+        prompt = " ".join(part.get("text", "") for msg in contents for part in msg.get("parts", []))
+        if "Your first task" not in prompt:
+            return super()._answer(contents)
+        question = contents[0]["parts"][-1]["text"].split(" (asked again)")[0]
+        attempts = SCRIPT[question]
+        repairs = sum(1 for msg in contents if "failed with this error" in msg["parts"][0].get("text", ""))
+        return json.dumps({"type": "analytics", "raw_sql": attempts[min(repairs, len(attempts) - 1)],
+                           "visualization": VIZ})
+
+
+def build_agent(args, data_dir, max_sql_repairs, fixes) -> RetailAgent:
+    model = ScriptedSqlModel(init_latency=0, call_latency=args.model_latency, dataset=DATASET)
+    resources = AgentResources(DATASET, model_factory=lambda name: model,
+                               warehouse_factory=lambda: DuckDBWarehouse(DATASET, data_dir))
+    cache = ResultCache(memory_backends(max_bytes={"rows": 0, "summary": 0}))
+    return RetailAgent(model="stub", name="bench_sql_repair_agent", dataset=DATASET, resources=resources,
+                       cache=cache, use_rollups=False, sql_fixes=fixes, max_sql_repairs=max_sql_repairs)
+
+
+async def run_pass(agent, suffix=""):
+    counts = {"first try": 0, "after repair": 0, "fixed locally": 0, "failed": 0}
+    model = agent.resources.model
+    calls_before = model.calls
+    started = time.perf_counter()
+    for question in SCRIPT:
+        payload = await agent.aquery({"message": question + suffix})
+        repair = payload.get("_sql_repair")
+        if payload["type"] != "analytics":
+            counts["failed"] += 1
+        elif repair is None:
+            counts["first try"] += 1
+        elif repair["local_fix"]:
+            counts["fixed locally"] += 1
+        else:
+            counts["after repair"] += 1
+    return counts, model.calls - calls_before, time.perf_counter() - started
+
+
+def report(label, counts, model_calls, elapsed):
+    n = len(SCRIPT)
+    ok = n - counts["failed"]
+    print(label)
+    print(f"  first-try success   {100.0 * counts['first try'] / n:5.1f}%")
+    print(f"  success with repair {100.0 * ok / n:5.1f}%  (model repairs: {counts['after repair']}, "
+          f"fix cache: {counts['fixed locally']}, failed: {counts['failed']})")
+    print(f"  model calls {model_calls}, {1000 * elapsed / n:.0f} ms per question")
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as data_dir:
+        table_dir = os.path.join(data_dir, *DATASET.split("."))
+        for _ in create_bq_data.iter_parquet_chunks(table_dir, args.rows, args.rows, 42, 1):
+            pass
+        report("no repair", *asyncio.run(run_pass(build_agent(args, data_dir, 0, SqlFixCache()))))
+        fixes = SqlFixCache()
+        report("repair (cold fix cache)", *asyncio.run(run_pass(build_agent(args, data_dir, args.max_repairs, fixes))))
+        report("repair (warm fix cache)",
+               *asyncio.run(run_pass(build_agent(args, data_dir, args.max_repairs, fixes), " (asked again)")))
+        print(f"fix cache: {len(fixes)} entries, {fixes.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQL first-try vs after-repair success rates.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--max-repairs", type=int, default=2)
+    main(parser.parse_args())
@@ -0,0 +1,147 @@
+# bench_static.py
+#
+# Bytes on the wire and server CPU per request for the Flask proxy's static
+# and /chat responses, before and after ui/static_assets.py:
+#   before : send_from_directory after an os.path.exists check per request, no
+#            cache headers beyond Flask's defaults, /chat JSON uncompressed
+#   after  : in-memory asset manifest, immutable caching of hashed bundles,
+#            precompressed gzip/brotli, /chat compressed above a threshold
+# Runs against a synthetic Vite build (index.html, a hashed JS bundle and
+# stylesheet of realistic size) through Flask's test client, so CPU is the
+# proxy's own work. A first visit fetches every file; a repeat visit is what
+# the browser still requests with a warm cache.
+#
+#   python -m benchmarks.bench_static --rows 10 500 5000
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from flask import Flask, jsonify, request, send_from_directory
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ui"))
+from engine_pool import StubEngine  # noqa: E402
+from static_assets import AssetManifest, asset_response, available_encodings, compress_response  # noqa: E402
+
+FILES = ["index.html", "assets/index-4f3a9c1b.js", "assets/index-9be21d07.css"]
+ACCEPT = {"Accept-Encoding": "gzip, deflate, br"}
+
+
+def write_build(root: str, seed: int = 7):
+    """A stand-in for dist_frontend: minified-looking JS (~550 KB) and CSS (~25 KB)."""
+    rng = random.Random(seed)
+    words = ["function", "return", "const", "props", "children", "useState", "useMemo", "createElement",
+             "className", "recharts", "dataKey", "onClick", "null", "undefined", "length", "map", "filter"]
+    os.makedirs(os.path.join(root, "assets"))
+    js = ";".join(f"var {rng.choice(words)}{i}=function(e,t){{return {rng.choice(words)}(e,t.{rng.choice(words)})}}"
+                  for i in range(9000))
+    css = "".join(f".c{i}{{margin:{i % 16}px;color:#{rng.randrange(16 ** 6):06x}}}" for i in range(900))
+    html = ('<!doctype html><html><head><script type="module" src="./assets/index-4f3a9c1b.js"></script>'
+            '<link rel="stylesheet" href="./assets/index-9be21d07.css"></head><body><div id="root"></div></body></html>')
+    for name, text in zip(FILES, (html, js, css)):
+        with open(os.path.join(root, name), "w") as f:
+            f.write(text)
+
+
+def before_app(root: str) -> Flask:
+    app = Flask("before", static_folder=root, static_url_path="")
+
+    @app.route("/", defaults={"path": ""})
+    @app.route("/<path:path>")
+    def serve(path):
+        if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
+            return send_from_directory(app.static_folder, path)
+        return send_from_directory(app.static_folder, "index.html")
+
+    @app.route("/chat", methods=["POST"])
+    def chat():
+        return jsonify(answer(request.get_json()))
+
+    return app
+
+
+def after_app(root: str, min_bytes: int) -> Flask:
+    app = Flask("after", static_folder=None)
+    assets = AssetManifest.build(root)
+
+    @app.route("/", defaults={"path": ""})
+    @app.route("/<path:path>")
+    def serve(path):
+        return asset_response(assets.get(path) or assets.index, request)
+
+    @app.route("/chat", methods=["POST"])
+    def chat():
+        return jsonify(answer(request.get_json()))
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, request, min_bytes) if request.path == "/chat" else response
+
+    return app
+
+
+def answer(body: dict) -> dict:
+    """The stub engine's answer with body["rows"] customer-level data rows."""
+    payload = StubEngine(latency=0)._answer(body)
+    rng = random.Random(body["rows"])
+    payload["data"] = [{"customer_id": f"CUST{i:06d}", "region": rng.choice(["North", "South", "East", "West"]),
+                        "total_sales": round(rng.uniform(5, 5000), 2)} for i in range(body["rows"])]
+    return payload
+
+
+def measure(client, requests_, iterations: int):
+    """(bytes on the wire, CPU ms per request) over requests_ = [(method, path, json body, headers)]."""
+    wire = 0
+    for method, path, body, headers in requests_:
+        wire += len(client.open(path, method=method, json=body, headers=headers).get_data())
+    started = time.process_time()
+    for _ in range(iterations):
+        for method, path, body, headers in requests_:
+            client.open(path, method=method, json=body, headers=headers).get_data()
+    return wire, 1000 * (time.process_time() - started) / (iterations * len(requests_))
+
+
+def visits(client):
+    """First-visit requests, and what a warm browser cache still asks for on the next visit."""
+    first = [("GET", "/" + ("" if name == "index.html" else name), None, ACCEPT) for name in FILES]
+    repeat = []
+    for method, path, _, headers in first:
+        response = client.get(path, headers=headers)
+        if "immutable" in response.headers.get("Cache-Control", ""):
+            continue  # served from the browser cache without a request
+        repeat.append(("GET", path, None, dict(headers, **{"If-None-Match": response.headers.get("ETag", "")})))
+    return first, repeat
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as root:
+        write_build(root)
+        apps = [("before", before_app(root).test_client()), ("after", after_app(root, args.min_bytes).test_client())]
+        print(f"encodings: {', '.join(available_encodings())}")
+        print(f"{'':<34} {'before':>22} {'after':>22}")
+        rows = []
+        for label, client in apps:
+            first, repeat = visits(client)
+            rows.append((measure(client, first, args.iterations), measure(client, repeat, args.iterations),
+                         len(first), len(repeat)))
+        (b_first, b_repeat, b_n1, b_n2), (a_first, a_repeat, a_n1, a_n2) = rows
+        print(f"{'first visit':<34} {b_first[0]:9d} B {b_first[1]:6.2f} ms {a_first[0]:9d} B {a_first[1]:6.2f} ms"
+              f"   ({b_n1} vs {a_n1} requests)")
+        print(f"{'repeat visit':<34} {b_repeat[0]:9d} B {b_repeat[1]:6.2f} ms {a_repeat[0]:9d} B {a_repeat[1]:6.2f} ms"
+              f"   ({b_n2} vs {a_n2} requests)")
+        for n in args.rows:
+            chat = [("POST", "/chat", {"message": "Sales by customer", "rows": n}, ACCEPT)]
+            (b_bytes, b_ms), (a_bytes, a_ms) = (measure(client, chat, args.iterations) for _, client in apps)
+            print(f"{f'/chat with {n} rows':<34} {b_bytes:9d} B {b_ms:6.2f} ms {a_bytes:9d} B {a_ms:6.2f} ms")
+    print("CPU is per request; the first and repeat visits average over the files they fetch.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Static asset and /chat response bytes and CPU, before and after.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 500, 5000])
+    parser.add_argument("--min-bytes", type=int, default=1024)
+    parser.add_argument("--iterations", type=int, default=50)
+    main(parser.parse_args())
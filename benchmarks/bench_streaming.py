@@ -0,0 +1,77 @@
+# bench_streaming.py
+#
+# Time-to-first-chart for the blocking pipeline (aquery: the chart can only be
+# drawn once the whole payload, summary included, has arrived) versus the
+# staged stream (astream: the chart can be drawn at the first data event).
+# Stub model and BigQuery backends; caching disabled so every turn runs the
+# full pipeline.
+#
+#   python -m benchmarks.bench_streaming --turns 20 --token-latency 0.03
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from agent.cache import ResultCache, memory_backends
+from agent.resources import AgentResources
+from agent.retail_agent import RetailAgent
+from benchmarks.load_test import percentile
+from benchmarks.stubs import StubBigQueryClient, StubModel
+
+DATASET = "stub_dataset.retail_data"
+MESSAGE = "Show sales by region as a bar chart"
+
+
+def build_agent(args) -> RetailAgent:
+    bq_client = StubBigQueryClient(init_latency=0, metadata_latency=0, query_latency=args.query_latency)
+    model = StubModel(init_latency=0, call_latency=args.model_latency, token_latency=args.token_latency,
+                      dataset=DATASET)
+    resources = AgentResources(DATASET, bq_client_factory=lambda: bq_client, model_factory=lambda name: model)
+    cache = ResultCache(memory_backends(max_bytes={"plan": 0, "rows": 0, "summary": 0}))
+    return RetailAgent(model="stub", name="bench_streaming_agent", dataset=DATASET, resources=resources, cache=cache)
+
+
+async def blocking_turns(agent, turns):
+    totals = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        await agent.aquery({"message": MESSAGE})
+        totals.append(time.perf_counter() - start)
+    return {"first chart": totals, "first summary token": totals, "complete": totals}
+
+
+async def streamed_turns(agent, turns):
+    marks = {"plan": [], "first chart": [], "first summary token": [], "complete": []}
+    for _ in range(turns):
+        start = time.perf_counter()
+        seen = set()
+        async for event in agent.astream({"message": MESSAGE}):
+            name = {"plan": "plan", "data": "first chart", "content": "first summary token",
+                    "done": "complete"}.get(event["event"])
+            if name and name not in seen:
+                seen.add(name)
+                marks[name].append(time.perf_counter() - start)
+    return marks
+
+
+def report(label, marks):
+    print(label)
+    for name, values in marks.items():
+        ms = [t * 1000 for t in values]
+        print(f"  {name:<20} p50={percentile(ms, 50):8.1f} ms  p99={percentile(ms, 99):8.1f} ms  "
+              f"mean={statistics.mean(ms):8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-chart: blocking vs streamed turns.")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--model-latency", type=float, default=0.4, help="Seconds to the first token of a model call.")
+    parser.add_argument("--token-latency", type=float, default=0.03, help="Seconds per generated token.")
+    parser.add_argument("--query-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    agent = build_agent(args)
+    report("aquery (blocking)", asyncio.run(blocking_turns(agent, args.turns)))
+    agent = build_agent(args)
+    report("astream (staged)", asyncio.run(streamed_turns(agent, args.turns)))
@@ -0,0 +1,95 @@
+# bench_summary_prompt.py
+#
+# Summary prompt size and latency against result size, for three ways of
+# putting the result into the prompt:
+#   rows        : json.dumps of every row, as the summary call first did
+#   digest json : json.dumps of the ResultBuffer digest
+#   budgeted    : prompt_budget.summary_data (CSV rows when they fit the
+#                 budget, else a compact digest with sampled rows)
+# Results are synthetic customer-level rows (customer, region, category,
+# sales, orders). Prompt tokens are estimated with prompt_budget's estimator.
+# The stub model charges a fixed call latency plus a prefill time per prompt
+# token, so larger prompts answer more slowly, as they do on Gemini.
+#
+#   python -m benchmarks.bench_summary_prompt --sizes 10 100 1000 10000 50000
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from agent.prompt_budget import estimate_tokens, summary_data
+from agent.prompts import build_summary_prompt
+from agent.results import ResultBuffer
+from benchmarks.stubs import StubModel
+
+QUESTION = "How are sales spread across our customers?"
+REGIONS = ["North", "South", "East", "West"]
+CATEGORIES = ["Electronics", "Clothing", "Home Goods", "Books", "Beauty", "Sports"]
+
+
+def make_result(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    buffer = ResultBuffer()
+    buffer.add_page([{"customer_id": f"CUST{i:06d}", "region": rng.choice(REGIONS),
+                      "product_category": rng.choice(CATEGORIES), "total_sales": rng.uniform(5, 5000),
+                      "orders": rng.randint(1, 40)} for i in range(n)])
+    return buffer
+
+
+def prompt_rows(rows, digest, budget):
+    return ("You are a Retail Analytics AI. Your second task is to generate a concise, natural language summary of the provided data.\n"
+            "The user's original question was: " + QUESTION + "\n"
+            "The data is: " + json.dumps(rows) + "\n"
+            "Based on the data, provide a short summary (1-2 sentences) in the 'content' field. Your response must be a valid JSON with only the 'content' field.")
+
+
+def prompt_digest(rows, digest, budget):
+    return ("You are a Retail Analytics AI. Your second task is to generate a concise, natural language summary of the provided data.\n"
+            "The user's original question was: " + QUESTION + "\n"
+            "The result data is described by this digest (row count, per-column statistics and the top rows): " + json.dumps(digest) + "\n"
+            "Based on the data, provide a short summary (1-2 sentences) in the 'content' field. Your response must be a valid JSON with only the 'content' field.")
+
+
+def prompt_budgeted(rows, digest, budget):
+    data, _ = summary_data(digest, rows, budget)
+    return build_summary_prompt(QUESTION, data)
+
+
+STRATEGIES = [("rows", prompt_rows), ("digest json", prompt_digest), ("budgeted", prompt_budgeted)]
+
+
+async def summarize(model, prompt):
+    started = time.perf_counter()
+    await model.generate_content_async(contents=[{"role": "user", "parts": [{"text": prompt}]}])
+    return 1000 * (time.perf_counter() - started)
+
+
+def main(args):
+    model = StubModel(init_latency=0, call_latency=args.model_latency, prompt_token_latency=args.prefill)
+    print(f"{'rows':>7}  " + "  ".join(f"{label:>26}" for label, _ in STRATEGIES))
+    print(f"{'':>7}  " + "  ".join(f"{'tokens':>8} {'build ms':>8} {'call ms':>8}" for _ in STRATEGIES))
+    for n in args.sizes:
+        buffer = make_result(n)
+        # The UI rows the agent holds (capped at 5000) and the digest of the whole result.
+        rows, digest = buffer.to_rows(), buffer.digest()
+        cells = []
+        for _, build in STRATEGIES:
+            started = time.perf_counter()
+            prompt = build(rows, digest, args.budget)
+            build_ms = 1000 * (time.perf_counter() - started)
+            call_ms = asyncio.run(summarize(model, prompt))
+            cells.append(f"{estimate_tokens(prompt):8d} {build_ms:8.2f} {call_ms:8.0f}")
+        print(f"{n:7d}  " + "  ".join(cells))
+    _, encoding = summary_data(digest, rows, args.budget)
+    print(f"budget {args.budget} tokens; the largest result was sent as '{encoding}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summary prompt tokens and latency against result size.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument("--budget", type=int, default=1000)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--prefill", type=float, default=0.00005, help="Seconds per prompt token before the answer.")
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+# chaos.py
+#
+# Fault-injection run of the full pipeline against FlakyModel and
+# FlakyBigQueryClient (benchmarks/stubs.py): a seeded share of calls fail
+# with 429/503 or stall on a long tail, optionally with a total outage
+# window. Compares a baseline policy (one attempt, no hedging, no circuit
+# breaker) with the default resilience policy and reports complete, degraded
+# and failed turns, latency percentiles, retries, hedges and breaker trips.
+#
+#   python -m benchmarks.chaos --turns 200 --error-rate 0.1 --slow-rate 0.05
+#   python -m benchmarks.chaos --outage 1 3 --rate 50 --cache --distinct 100   # breaker + cached answers
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from agent.cache import ResultCache, memory_backends
+from agent.resilience import Resilience, ResiliencePolicy
+from agent.resources import AgentResources
+from agent.retail_agent import RetailAgent
+from benchmarks.load_test import percentile
+from benchmarks.stubs import FaultPlan, FlakyBigQueryClient, FlakyModel
+
+DATASET = "stub_dataset.retail_data"
+MESSAGES = ["Show sales by region", "Total sales per region as a bar chart", "Which region sells the most?",
+            "Compare regional revenue", "Sales by region this year"]
+
+
+def message(k: int) -> str:
+    base = MESSAGES[k % len(MESSAGES)]
+    return base if k < len(MESSAGES) else f"{base} (variant {k})"
+
+
+def build_agent(args, policy: ResiliencePolicy, seed: int) -> RetailAgent:
+    faults = FaultPlan(error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                       outage=args.outage, seed=seed)
+    bq_client = FlakyBigQueryClient(faults, init_latency=0, metadata_latency=0, query_latency=args.query_latency)
+    model = FlakyModel(faults, init_latency=0, call_latency=args.model_latency, jitter=args.model_latency / 2,
+                       dataset=DATASET)
+    resources = AgentResources(DATASET, bq_client_factory=lambda: bq_client, model_factory=lambda name: model)
+    cache = ResultCache() if args.cache else ResultCache(memory_backends(max_bytes={"plan": 0, "rows": 0, "summary": 0}))
+    return RetailAgent(model="stub", name="chaos_agent", dataset=DATASET, resources=resources, cache=cache,
+                       resilience=Resilience(policy))
+
+
+async def run(agent: RetailAgent, args):
+    outcomes = Counter()
+    attributes = Counter()
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def turn(i):
+        if args.rate:
+            await asyncio.sleep(i / args.rate)  # open-loop arrivals, so an outage window covers the same turns
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                payload = await agent.aquery({"message": message(i % args.distinct), "timings": True})
+            except Exception as e:
+                outcomes[f"failed ({type(e).__name__})"] += 1
+                return
+            finally:
+                latencies.append(time.perf_counter() - start)
+            degraded = payload.get("_degraded")
+            outcomes[f"degraded ({degraded['dependency']}, {degraded['stage']})" if degraded else "complete"] += 1
+            for s in payload["_timings"]["spans"]:
+                for key in ("retries", "hedged", "hedge_won"):
+                    attributes[key] += int(s["attributes"].get(key, 0))
+                attributes["circuit open"] += s["attributes"].get("circuit") == "open"
+
+    started = time.perf_counter()
+    await asyncio.gather(*(turn(i) for i in range(args.turns)))
+    return outcomes, attributes, latencies, time.perf_counter() - started
+
+
+def report(label, agent, outcomes, attributes, latencies, elapsed):
+    ms = [t * 1000 for t in latencies]
+    faults = agent.resources.model.faults.calls
+    print(label)
+    print(f"  injected: {faults['error']} errors, {faults['slow']} slow calls, {faults['ok']} clean calls")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome:<40} {count:5d} ({100.0 * count / max(1, len(latencies)):5.1f}%)")
+    print(f"  latency p50={percentile(ms, 50):7.1f} ms  p95={percentile(ms, 95):7.1f} ms  "
+          f"p99={percentile(ms, 99):7.1f} ms  max={max(ms):7.1f} ms  ({elapsed:.1f}s total)")
+    print("  " + "  ".join(f"{key}={attributes[key]}" for key in ("retries", "hedged", "hedge_won", "circuit open")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fault-injection comparison of the agent's resilience policy.")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.1, help="Share of upstream calls failing with 429/503.")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Share of upstream calls stalling.")
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    parser.add_argument("--outage", type=float, nargs=2, metavar=("START", "END"),
+                        help="Seconds into the run during which every upstream call fails.")
+    parser.add_argument("--rate", type=float, default=0.0, help="Turns started per second (0: as fast as possible).")
+    parser.add_argument("--model-latency", type=float, default=0.1)
+    parser.add_argument("--query-latency", type=float, default=0.1)
+    parser.add_argument("--budget", type=float, default=4.0, help="Request budget in seconds.")
+    parser.add_argument("--cache", action="store_true", help="Enable the result cache (degrade to cached answers).")
+    parser.add_argument("--distinct", type=int, default=len(MESSAGES),
+                        help="Distinct questions asked; with --cache, repeats are answered from the cache.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    baseline = ResiliencePolicy(request_budget=args.budget, max_attempts=1, hedge=False,
+                                breaker_failure_threshold=10 ** 9)
+    resilient = ResiliencePolicy(request_budget=args.budget, hedge_min_samples=10, breaker_reset_timeout=1.0)
+    for label, policy in (("baseline (single attempt, no hedging, no breaker)", baseline),
+                          ("resilient (retries + jittered backoff, p95 hedging, circuit breaker)", resilient)):
+        agent = build_agent(args, policy, args.seed)
+        report(label, agent, *asyncio.run(run(agent, args)))
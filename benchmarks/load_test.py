@@ -0,0 +1,96 @@
+# load_test.py
+#
+# Drives RetailAgent with N concurrent sessions against fake model and
+# BigQuery backends and reports p50/p99 turn latency for the async pipeline
+# (aquery on one event loop) and for the sync query() wrapper on threads.
+#
+#   python -m benchmarks.load_test --sessions 50 --turns 5
+
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent.cache import ResultCache, memory_backends
+from agent.resources import AgentResources
+from agent.retail_agent import RetailAgent
+from benchmarks.stubs import StubBigQueryClient, StubModel
+
+DATASET = "stub_dataset.retail_data"
+MESSAGES = ["Show sales by region as a bar chart", "Hello", "Total quantity by category as a table", "Thanks!"]
+
+
+def build_agent(args) -> RetailAgent:
+    bq_client = StubBigQueryClient(init_latency=0, metadata_latency=0, query_latency=args.query_latency)
+    model = StubModel(init_latency=0, call_latency=args.model_latency, jitter=args.jitter, dataset=DATASET)
+    resources = AgentResources(
+        DATASET,
+        executor_workers=args.sessions,
+        bq_client_factory=lambda: bq_client,
+        model_factory=lambda name: model,
+    )
+    # Zero-sized cache levels: every turn pays the full pipeline.
+    cache = ResultCache(memory_backends(max_bytes={"plan": 0, "rows": 0, "summary": 0}))
+    return RetailAgent(model="stub", name="load_test_agent", dataset=DATASET, resources=resources, cache=cache)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label, latencies, wall):
+    ms = [t * 1000 for t in latencies]
+    print(
+        f"{label:<14} turns={len(ms):5d}  p50={percentile(ms, 50):8.1f} ms  p99={percentile(ms, 99):8.1f} ms  "
+        f"mean={statistics.mean(ms):8.1f} ms  throughput={len(ms) / wall:7.1f} turns/s"
+    )
+
+
+async def run_async(agent, sessions, turns):
+    latencies = []
+
+    async def session(i):
+        for t in range(turns):
+            start = time.perf_counter()
+            await agent.aquery({"message": MESSAGES[(i + t) % len(MESSAGES)]})
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    return latencies
+
+
+def run_threads(agent, sessions, turns):
+    latencies = []
+
+    def session(i):
+        for t in range(turns):
+            start = time.perf_counter()
+            agent.query({"message": MESSAGES[(i + t) % len(MESSAGES)]})
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(session, range(sessions)))
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test with stub backends.")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--query-latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    args = parser.parse_args()
+
+    agent = build_agent(args)
+    start = time.perf_counter()
+    latencies = asyncio.run(run_async(agent, args.sessions, args.turns))
+    report("aquery", latencies, time.perf_counter() - start)
+
+    agent = build_agent(args)
+    start = time.perf_counter()
+    latencies = run_threads(agent, args.sessions, args.turns)
+    report("query (sync)", latencies, time.perf_counter() - start)
@@ -0,0 +1,93 @@
+# load_test_proxy.py
+#
+# HTTP load test for the Flask /chat proxy. C concurrent clients (keep-alive
+# sessions) send messages drawn from a pool of D distinct questions; a small
+# pool means many identical in-flight messages, which exercises request
+# coalescing. Reports requests/sec, p50/p95/p99/max latency, errors and how
+# many responses were served by a coalesced upstream call.
+#
+#   cd ui && AGENT_ENGINE=stub STUB_ENGINE_LATENCY=0.5 gunicorn -c gunicorn.conf.py app:app
+#   python -m benchmarks.load_test_proxy --concurrency 64 --requests 2000 --distinct 8
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.load_test import percentile
+
+QUESTIONS = [
+    "Show sales by region as a bar chart",
+    "Total quantity by category as a table",
+    "Monthly sales trend for 2024",
+    "Top 10 products by revenue",
+    "Average order value by region",
+    "Sales by category and region",
+    "Which region sold the most electronics?",
+    "Daily sales in December",
+]
+
+
+def message_for(i: int) -> str:
+    base = QUESTIONS[i % len(QUESTIONS)]
+    return base if i < len(QUESTIONS) else f"{base} (variant {i // len(QUESTIONS)})"
+
+
+def run(url: str, concurrency: int, total: int, distinct: int, seed: int):
+    messages = [message_for(i) for i in range(distinct)]
+    rng = random.Random(seed)
+    plan = [rng.choice(messages) for _ in range(total)]
+    latencies, errors, coalesced = [], 0, 0
+    lock = threading.Lock()
+    local = threading.local()
+    cursor = iter(plan)
+
+    def client(_):
+        nonlocal errors, coalesced
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        while True:
+            with lock:
+                message = next(cursor, None)
+            if message is None:
+                return
+            start = time.perf_counter()
+            try:
+                response = session.post(url, json={"message": message}, timeout=120)
+                ok = response.status_code == 200
+                shared = response.headers.get("X-Coalesced") == "1"
+            except requests.RequestException:
+                ok, shared = False, False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+                coalesced += shared
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    ms = [t * 1000 for t in latencies]
+    print(f"{len(ms)} requests, concurrency {concurrency}, {distinct} distinct messages, {wall:.1f}s")
+    print(f"throughput   {len(ms) / wall:8.1f} req/s")
+    print(f"latency      p50={percentile(ms, 50):.1f} ms  p95={percentile(ms, 95):.1f} ms  "
+          f"p99={percentile(ms, 99):.1f} ms  max={max(ms):.1f} ms  mean={statistics.mean(ms):.1f} ms")
+    print(f"errors       {errors}")
+    print(f"coalesced    {coalesced} ({100.0 * coalesced / len(ms):.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the Flask /chat proxy.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/chat")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=8, help="Number of distinct messages in the mix.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.url, args.concurrency, args.requests, args.distinct, args.seed)
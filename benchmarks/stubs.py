@@ -0,0 +1,321 @@
+# stubs.py
+#
+# In-process stand-ins for GenerativeModel and bigquery.Client used by the
+# benchmark scripts. Latencies are simulated with time.sleep so the numbers
+# reflect the agent's own overhead plus a realistic network shape, without
+# touching Google Cloud.
+
+import asyncio
+import datetime
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+
+STUB_SCHEMA = [
+    ("transaction_date", "DATE"),
+    ("customer_id", "STRING"),
+    ("product_id", "STRING"),
+    ("product_category", "STRING"),
+    ("sales_amount", "FLOAT"),
+    ("quantity", "INTEGER"),
+    ("region", "STRING"),
+]
+
+SMALL_TALK = {"hello", "hi", "thanks", "thank you", "how are you", "what can you do"}
+
+STUB_SQL = "SELECT region, SUM(sales_amount) AS total_sales FROM {dataset} GROUP BY region"
+
+
+class StubResponse:
+    def __init__(self, text, prompt_tokens=None, output_tokens=None):
+        self.text = text
+        if prompt_tokens is not None:
+            self.usage_metadata = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StubModel:
+    """Answers the classification prompt with a fixed SQL payload and any other prompt with a summary."""
+
+    def __init__(self, model_name="stub", init_latency=0.05, call_latency=0.02, dataset="stub_dataset.retail_data",
+                 jitter=0.0, token_latency=0.0, prompt_token_latency=0.0, connect_latency=0.0):
+        time.sleep(init_latency)
+        self.model_name = model_name
+        self.call_latency = call_latency
+        self.token_latency = token_latency
+        # Time to read the prompt before the first output token (prefill), per prompt token.
+        self.prompt_token_latency = prompt_token_latency
+        # Paid by the first call only: credentials and the first TLS connection.
+        self.connect_latency = connect_latency
+        self._connected = False
+        self.jitter = jitter
+        self.dataset = dataset
+        self.calls = 0
+
+    def _connect(self):
+        connect, self._connected = (0.0 if self._connected else self.connect_latency), True
+        return connect
+
+    def _latency(self, contents=None):
+        prefill = self.prompt_token_latency * self._prompt_tokens(contents) if contents and self.prompt_token_latency else 0.0
+        return self._connect() + self.call_latency + prefill + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def count_tokens(self, contents):
+        time.sleep(self._connect() + self.call_latency / 4)
+        text = contents if isinstance(contents, str) else json.dumps(contents)
+        return SimpleNamespace(total_tokens=estimate_tokens(text))
+
+    def _prompt_tokens(self, contents):
+        return estimate_tokens(" ".join(part.get("text", "") for msg in contents for part in msg.get("parts", [])))
+
+    def _plan(self, question):
+        if question.strip(" !.?").lower() in SMALL_TALK:
+            return {"type": "text", "content": "Hello! Ask me anything about your retail data."}
+        return {
+            "type": "analytics",
+            "raw_sql": STUB_SQL.format(dataset=self.dataset),
+            "visualization": {"chart_type": "bar_chart", "x_axis": "region", "y_axis": "total_sales"},
+        }
+
+    def _answer(self, contents):
+        parts = [part.get("text", "") for msg in contents for part in msg.get("parts", [])]
+        prompt = " ".join(parts)
+        if "Your first task" in prompt:
+            if "numbered questions" in parts[-1]:
+                # Batched planning: one plan per "N. question" line, as a JSON array.
+                questions = re.findall(r"^\d+\. (.*)$", parts[-1], re.MULTILINE)
+                return json.dumps([self._plan(question) for question in questions])
+            return json.dumps(self._plan(parts[-1]))
+        if "general conversational question" in prompt:
+            return json.dumps({"content": "Hello! Ask me anything about your retail data."})
+        return json.dumps({"content": "Sales are highest in the West region."})
+
+    def _generation_time(self, answer):
+        # A non-streamed call returns once every token has been generated.
+        return self.token_latency * max(0, len(answer.split(" ")) - 1)
+
+    def generate_content(self, contents=None, **kwargs):
+        self.calls += 1
+        answer = self._answer(contents)
+        time.sleep(self._latency(contents) + self._generation_time(answer))
+        return StubResponse(answer, self._prompt_tokens(contents), estimate_tokens(answer))
+
+    async def generate_content_async(self, contents=None, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            await asyncio.sleep(self._latency(contents))
+            return self._stream(contents)
+        answer = self._answer(contents)
+        await asyncio.sleep(self._latency(contents) + self._generation_time(answer))
+        return StubResponse(answer, self._prompt_tokens(contents), estimate_tokens(answer))
+
+    async def _stream(self, contents):
+        # Streamed calls ask for plain text: yield the answer's content word by word.
+        text = json.loads(self._answer(contents)).get("content", "")
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            usage = (self._prompt_tokens(contents), estimate_tokens(text)) if i == len(words) - 1 else (None, None)
+            yield StubResponse(word if i == 0 else " " + word, *usage)
+
+
+class StubRowIterator:
+    """Yields rows page by page like google.cloud.bigquery.table.RowIterator.pages."""
+
+    def __init__(self, rows, page_size=None):
+        self._rows = rows
+        self._page_size = page_size or 10000
+
+    @property
+    def pages(self):
+        page = []
+        for row in self._rows:
+            page.append(row)
+            if len(page) >= self._page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def __iter__(self):
+        for page in self.pages:
+            yield from page
+
+    def to_arrow_iterable(self):
+        import pyarrow as pa
+
+        for page in self.pages:
+            yield pa.RecordBatch.from_pylist(page)
+
+
+class StubQueryJob:
+    def __init__(self, rows, latency):
+        # rows may be a list or a zero-argument callable returning a fresh iterable (for lazily generated results)
+        self._rows = rows
+        self._latency = latency
+        self.total_bytes_processed = 1024 * (len(rows) if isinstance(rows, list) else 0)
+
+    def result(self, page_size=None, timeout=None):
+        time.sleep(self._latency)
+        rows = self._rows() if callable(self._rows) else self._rows
+        return StubRowIterator(rows, page_size)
+
+
+class StubBigQueryClient:
+    """Mimics the slice of bigquery.Client the agent uses: dataset().table(), get_table() and query()."""
+
+    def __init__(self, init_latency=0.05, metadata_latency=0.03, query_latency=0.05, rows=None, connect_latency=0.0):
+        time.sleep(init_latency)
+        self.metadata_latency = metadata_latency
+        self.query_latency = query_latency
+        self.connect_latency = connect_latency  # paid by the first request only
+        self.rows = rows if rows is not None else make_rows(4)
+        self.modified = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        self.get_table_calls = 0
+        self.query_calls = 0
+
+    def dataset(self, dataset_id):
+        return SimpleNamespace(table=lambda table_id: f"{dataset_id}.{table_id}")
+
+    def get_table(self, table_ref):
+        self.get_table_calls += 1
+        time.sleep(self._connect() + self.metadata_latency)
+        schema = [SimpleNamespace(name=n, field_type=t) for n, t in STUB_SCHEMA]
+        return SimpleNamespace(schema=schema, modified=self.modified, table_id=str(table_ref))
+
+    def query(self, sql, job_config=None, **kwargs):
+        self.query_calls += 1
+        return StubQueryJob(self.rows, self._connect() + self.query_latency)
+
+    def _connect(self):
+        connect, self.connect_latency = self.connect_latency, 0.0
+        return connect
+
+
+def iter_detail_rows(n, seed=0):
+    """Lazily generates n rows with the retail table's column types (DATE, STRING, FLOAT, INTEGER)."""
+    rng = random.Random(seed)
+    categories = ["Electronics", "Apparel", "Home Goods", "Books", "Outdoor"]
+    regions = ["North", "South", "East", "West"]
+    start = datetime.date(2024, 1, 1)
+    for _ in range(n):
+        yield {
+            "transaction_date": start + datetime.timedelta(days=rng.randrange(365)),
+            "customer_id": f"CUST{rng.randint(1000, 9999)}",
+            "product_id": f"PROD{rng.randint(100, 999)}",
+            "product_category": rng.choice(categories),
+            "sales_amount": rng.uniform(5.0, 500.0),
+            "quantity": rng.randint(1, 5),
+            "region": rng.choice(regions),
+        }
+
+
+def make_rows(n, seed=0):
+    """Region-level aggregate rows shaped like the result of STUB_SQL."""
+    rng = random.Random(seed)
+    regions = ["North", "South", "East", "West"]
+    return [
+        {"region": regions[i % len(regions)] if i < len(regions) else f"Region{i}",
+         "total_sales": rng.uniform(1000, 50000)}
+        for i in range(n)
+    ]
+
+
+# -----------------------------
+# Fault injection
+# -----------------------------
+class FaultPlan:
+    """
+    Seeded fault schedule shared by the flaky stubs. Each call draws one of
+    "error" (a 429/503), "slow" (a long-tail latency) or None, and every call
+    made inside an outage window (seconds since the plan was created) fails.
+    """
+
+    def __init__(self, error_rate=0.0, slow_rate=0.0, slow_latency=2.0, outage=None, seed=0):
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.outage = outage
+        self.started = time.monotonic()
+        self.calls = {"error": 0, "slow": 0, "ok": 0}
+        self._rng = random.Random(seed)
+
+    def draw(self):
+        elapsed = time.monotonic() - self.started
+        if self.outage and self.outage[0] <= elapsed < self.outage[1]:
+            fault = "error"
+        else:
+            roll = self._rng.random()
+            fault = "error" if roll < self.error_rate else "slow" if roll < self.error_rate + self.slow_rate else None
+        self.calls[fault or "ok"] += 1
+        return fault
+
+    def error(self):
+        from google.api_core import exceptions
+
+        return self._rng.choice([exceptions.TooManyRequests, exceptions.ServiceUnavailable])("injected fault")
+
+
+class FlakyModel(StubModel):
+    """StubModel whose calls fail or stall according to a FaultPlan."""
+
+    def __init__(self, faults: FaultPlan, **kwargs):
+        super().__init__(**kwargs)
+        self.faults = faults
+
+    def generate_content(self, contents=None, **kwargs):
+        fault = self.faults.draw()
+        if fault == "error":
+            time.sleep(self.call_latency / 2)
+            raise self.faults.error()
+        if fault == "slow":
+            time.sleep(self.faults.slow_latency)
+        return super().generate_content(contents=contents, **kwargs)
+
+    async def generate_content_async(self, contents=None, stream=False, **kwargs):
+        fault = self.faults.draw()
+        if fault == "error":
+            await asyncio.sleep(self.call_latency / 2)
+            raise self.faults.error()
+        if fault == "slow":
+            await asyncio.sleep(self.faults.slow_latency)
+        return await super().generate_content_async(contents=contents, stream=stream, **kwargs)
+
+
+class FlakyQueryJob(StubQueryJob):
+    def __init__(self, rows, latency, faults: FaultPlan):
+        super().__init__(rows, latency)
+        self.faults = faults
+
+    def result(self, page_size=None, timeout=None):
+        fault = self.faults.draw()
+        if fault == "error":
+            time.sleep(self._latency / 2)
+            raise self.faults.error()
+        if fault == "slow":
+            # Like the real client, a job still running when the timeout expires raises TimeoutError.
+            if timeout is not None and self.faults.slow_latency >= timeout:
+                time.sleep(timeout)
+                raise TimeoutError(f"Query job did not finish within {timeout:.2f}s")
+            time.sleep(self.faults.slow_latency)
+        return super().result(page_size=page_size, timeout=timeout)
+
+
+class FlakyBigQueryClient(StubBigQueryClient):
+    """StubBigQueryClient whose query jobs fail or stall according to a FaultPlan."""
+
+    def __init__(self, faults: FaultPlan, **kwargs):
+        super().__init__(**kwargs)
+        self.faults = faults
+
+    def query(self, sql, job_config=None, **kwargs):
+        self.query_calls += 1
+        if getattr(job_config, "dry_run", False):
+            return StubQueryJob(self.rows, 0)
+        return FlakyQueryJob(self.rows, self.query_latency, self.faults)
@@ -0,0 +1,51 @@
+# trace_report.py
+#
+# Offline profile of traces written by the JSONL exporter
+# (AGENT_TRACE_EXPORTER=jsonl): per-stage count, p50/p95/max duration and
+# share of total turn time, plus cache hit rates and token/row/byte totals.
+#
+#   python -m benchmarks.trace_report agent_traces.jsonl
+
+import argparse
+import json
+from collections import defaultdict
+
+from benchmarks.load_test import percentile
+
+
+def load(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report(traces):
+    durations = defaultdict(list)
+    totals = defaultdict(float)
+    hits = defaultdict(lambda: [0, 0])
+    for trace in traces:
+        for span in trace["spans"]:
+            name, attributes = span["name"], span.get("attributes") or {}
+            durations[name].append(span["duration_ms"])
+            for key in ("tokens.prompt", "tokens.output", "rows", "bytes_processed", "retries"):
+                if attributes.get(key):
+                    totals[f"{name} {key}"] += attributes[key]
+            if name.startswith("cache.") and "hit" in attributes:
+                hits[name][0 if attributes["hit"] else 1] += 1
+
+    turn_ms = sum(durations.get("agent.turn", [])) or 1.0
+    print(f"{len(traces)} turns")
+    print(f"{'stage':<20} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'share':>7}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        print(f"{name:<20} {len(values):6d} {percentile(values, 50):9.1f} {percentile(values, 95):9.1f} "
+              f"{max(values):9.1f} {100.0 * sum(values) / turn_ms:6.1f}%")
+    for name, (hit, miss) in sorted(hits.items()):
+        print(f"{name:<20} hit rate {100.0 * hit / max(1, hit + miss):5.1f}% ({hit}/{hit + miss})")
+    for key, value in sorted(totals.items()):
+        print(f"{key:<36} {value:,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize JSONL agent traces.")
+    parser.add_argument("path", nargs="?", default="agent_traces.jsonl")
+    args = parser.parse_args()
+    report(load(args.path))
@@ -0,0 +1,114 @@
+# verify_rollups.py
+#
+# Correctness check for agent.rollups on a local DuckDB engine: builds the
+# rollups from a synthetic base table, then runs each query in QUERIES both
+# as written and as rewritten by RollupRewriter and compares the results.
+# Also reports the time of each path.
+#
+#   pip install duckdb
+#   python -m benchmarks.verify_rollups --rows 200000
+
+import argparse
+import datetime
+import math
+import sys
+import time
+
+import duckdb
+import sqlglot
+
+from agent.rollups import RollupManager, RollupRewriter
+
+DATASET = "ds.retail_data"
+
+QUERIES = [
+    "SELECT region, SUM(sales_amount) AS total_sales FROM ds.retail_data GROUP BY region",
+    "SELECT product_category, SUM(quantity) AS total_quantity FROM ds.retail_data GROUP BY product_category ORDER BY total_quantity DESC LIMIT 3",
+    "SELECT product_category, region, ROUND(AVG(sales_amount), 2) AS avg_sale, COUNT(*) AS orders FROM ds.retail_data GROUP BY product_category, region",
+    "SELECT EXTRACT(MONTH FROM transaction_date) AS month, SUM(sales_amount) AS total_sales FROM ds.retail_data GROUP BY month ORDER BY month",
+    "SELECT transaction_date, SUM(sales_amount) AS total_sales FROM ds.retail_data WHERE transaction_date <= '2024-03-31' GROUP BY transaction_date",
+    "SELECT region, SUM(sales_amount) AS total_sales FROM ds.retail_data WHERE product_category = 'Books' AND EXTRACT(MONTH FROM transaction_date) = 6 GROUP BY region",
+    "SELECT COUNT(*) AS n, SUM(sales_amount) AS total, AVG(quantity) AS avg_qty FROM ds.retail_data",
+    "SELECT region, COUNT(DISTINCT product_category) AS categories, MAX(transaction_date) AS last_sale FROM ds.retail_data GROUP BY region",
+    "SELECT product_category, SUM(sales_amount) AS s FROM ds.retail_data GROUP BY product_category HAVING SUM(sales_amount) > 1000",
+    # Must NOT be rewritten:
+    "SELECT customer_id, SUM(sales_amount) AS s FROM ds.retail_data GROUP BY customer_id ORDER BY s DESC LIMIT 5",
+    "SELECT MAX(sales_amount) AS biggest FROM ds.retail_data",
+    "SELECT region, SUM(sales_amount) AS s FROM ds.retail_data WHERE sales_amount > 100 GROUP BY region",
+]
+
+BASE_TABLE_SQL = """
+CREATE OR REPLACE TABLE ds.retail_data AS
+SELECT
+    DATE '2024-01-01' + CAST(FLOOR(random() * 366) AS INTEGER) AS transaction_date,
+    'CUST' || CAST(1000 + CAST(FLOOR(random() * 9000) AS INTEGER) AS VARCHAR) AS customer_id,
+    'PROD' || CAST(100 + CAST(FLOOR(random() * 900) AS INTEGER) AS VARCHAR) AS product_id,
+    ['Electronics', 'Apparel', 'Home Goods', 'Books', 'Outdoor'][1 + CAST(FLOOR(random() * 5) AS INTEGER)] AS product_category,
+    ROUND(5 + random() * 495, 2) AS sales_amount,
+    1 + CAST(FLOOR(random() * 5) AS INTEGER) AS quantity,
+    ['North', 'South', 'East', 'West'][1 + CAST(FLOOR(random() * 4) AS INTEGER)] AS region
+FROM range({rows})
+"""
+
+
+def normalize(rows):
+    def cell(value):
+        if isinstance(value, float):
+            return round(value, 6)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return value
+    return sorted((tuple(cell(v) for v in row) for row in rows), key=repr)
+
+
+def same(a, b):
+    if len(a) != len(b):
+        return False
+    for row_a, row_b in zip(a, b):
+        for x, y in zip(row_a, row_b):
+            if isinstance(x, float) or isinstance(y, float):
+                if x is None or y is None or not math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-6):
+                    return False
+            elif x != y:
+                return False
+    return True
+
+
+def run(con, sql):
+    start = time.perf_counter()
+    rows = con.execute(sqlglot.transpile(sql, read="bigquery", write="duckdb")[0]).fetchall()
+    return rows, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare rollup-rewritten queries with the originals on DuckDB.")
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    con = duckdb.connect()
+    con.execute("SELECT setseed(0.42)")
+    con.execute("CREATE SCHEMA ds")
+    con.execute(BASE_TABLE_SQL.format(rows=args.rows))
+
+    manager = RollupManager(DATASET, lambda sql: con.execute(sql).fetchall(), dialect="duckdb")
+    manager.build()
+    # Exercise the incremental path too: append rows, refresh, and verify against the new base.
+    con.execute("INSERT INTO ds.retail_data SELECT * FROM ds.retail_data WHERE transaction_date >= DATE '2024-12-20'")
+    manager.refresh(lookback_days=14)
+
+    rewriter = RollupRewriter(DATASET)
+    failures = 0
+    for sql in QUERIES:
+        rewritten = rewriter.rewrite(sql)
+        base_rows, base_time = run(con, sql)
+        if rewritten is None:
+            print(f"[base  ] {base_time * 1000:7.1f} ms  {sql}")
+            continue
+        rollup_sql, rollup = rewritten
+        rollup_rows, rollup_time = run(con, rollup_sql)
+        ok = same(normalize(base_rows), normalize(rollup_rows))
+        failures += not ok
+        print(f"[{'ok' if ok else 'FAIL':<6}] {base_time * 1000:7.1f} ms -> {rollup_time * 1000:7.1f} ms ({rollup})  {sql}")
+
+    print(f"\n{failures} mismatches")
+    sys.exit(1 if failures else 0)
@@ -1,6 +1,12 @@
+import argparse
+import glob
 import os
-import random
-from google.cloud import bigquery
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,25 +16,31 @@ load_dotenv()
 PROJECT_ID = os.getenv("PROJECT_ID")
 DATASET_ID = os.getenv("DATASET_ID")
 TABLE_ID = os.getenv("TABLE_ID")
+LOCAL_DATA_DIR = os.getenv("LOCAL_DATA_DIR", "local_data")
+
+# Initialized in __main__ for the BigQuery target only; --local needs no credentials.
+client = None
 
-if not PROJECT_ID or not DATASET_ID or not TABLE_ID:
-    print("Error: Ensure PROJECT_ID, DATASET_ID, and TABLE_ID are set in your .env file.")
-    exit()
 
-# --- 1. Initialize BigQuery Client ---
-try:
-    # Uses credentials set up in your environment (e.g., gcloud auth application-default login)
-    client = bigquery.Client(project=PROJECT_ID)
-except Exception as e:
-    print(f"Error initializing BigQuery client. Ensure GOOGLE_APPLICATION_CREDENTIALS is set.")
-    print(e)
-    exit()
+def init_bigquery_client():
+    global client
+    from google.cloud import bigquery
+
+    try:
+        # Uses credentials set up in your environment (e.g., gcloud auth application-default login)
+        client = bigquery.Client(project=PROJECT_ID)
+    except Exception as e:
+        print(f"Error initializing BigQuery client. Ensure GOOGLE_APPLICATION_CREDENTIALS is set.")
+        print(e)
+        exit()
 
 def create_dataset_and_get_table():
     """
     Creates the dataset and table if they do not exist.
     Returns the fully defined Table object, ensuring the schema is available for insertion.
     """
+    from google.cloud import bigquery
+
     dataset_ref = client.dataset(DATASET_ID)
     try:
         client.get_dataset(dataset_ref)
@@ -64,50 +76,267 @@ def create_dataset_and_get_table():
         # Explicitly get the table object with its full metadata/schema
         return client.get_table(table_ref)
 
-def populate_data(table_object):
-    """Inserts sample data rows using the provided BigQuery Table object."""
-    
-    rows_to_insert = []
-    categories = ["Electronics", "Apparel", "Home Goods", "Books", "Outdoor"]
-    regions = ["North", "South", "East", "West"]
-    
-    # Generate 500 rows of diverse sample data across 1 year
-    for i in range(500):
-        month = random.randint(1, 12)
-        day = random.randint(1, 28)
-        date_str = f"2024-{month:02d}-{day:02d}"
-        
-        category = random.choice(categories)
-        sales = round(random.uniform(5.00, 500.00), 2)
-        qty = random.randint(1, 5)
-        
-        row = (
-            date_str,
-            f"CUST{random.randint(1000, 9999)}",
-            f"PROD{random.randint(100, 999)}",
-            category,
-            sales,
-            qty,
-            random.choice(regions)
-        )
-        rows_to_insert.append(row)
-    
-    print(f"Inserting {len(rows_to_insert)} rows...")
-    
-    # Insert rows using the full table object
-    # The table_object ensures the schema is known, resolving the ValueError
-    errors = client.insert_rows(table_object, rows_to_insert)
+# --- Generator settings ---
+# Rows are generated column-wise with NumPy, one chunk at a time. Every chunk
+# draws from its own RNG seeded with (seed, chunk_index), so the output is the
+# same for a given seed regardless of chunk scheduling or worker count.
+DEFAULT_SEED = 42
+DEFAULT_ROWS = 500
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+START_DATE = np.datetime64("2024-01-01")
+NUM_DAYS = 366  # 2024 is a leap year
+CATEGORIES = ["Electronics", "Apparel", "Home Goods", "Books", "Outdoor"]
+CATEGORY_MIX = [0.15, 0.30, 0.20, 0.20, 0.15]
+# Log-normal unit price per category: (median, sigma).
+CATEGORY_PRICES = [(180.0, 0.6), (35.0, 0.5), (60.0, 0.6), (15.0, 0.4), (75.0, 0.7)]
+REGIONS = ["North", "South", "East", "West"]
+REGION_MIX = [0.22, 0.18, 0.34, 0.26]
+AWAY_SHARE = 0.1  # share of purchases made outside the customer's home region
+QUANTITY_MIX = [0.45, 0.25, 0.15, 0.10, 0.05]  # quantities 1..5
+
+NUM_PRODUCTS = 900      # PROD100 .. PROD999
+MIN_CUSTOMERS = 9000    # CUST1000 .. ; grows with the row count (about 100 rows per customer)
+PRODUCT_ZIPF = 1.0
+CUSTOMER_ZIPF = 0.8
+
+
+def _cdf(weights) -> np.ndarray:
+    cdf = np.cumsum(np.asarray(weights, dtype=np.float64))
+    cdf /= cdf[-1]
+    return cdf
+
+
+def _zipf_cdf(rng, n: int, exponent: float) -> np.ndarray:
+    """Zipf popularity over n ids, with ranks shuffled so the best sellers are not simply the lowest ids."""
+    weights = np.empty(n)
+    weights[rng.permutation(n)] = 1.0 / np.arange(1, n + 1) ** exponent
+    return _cdf(weights)
+
+
+def _day_weights() -> np.ndarray:
+    """Yearly seasonality: a summer/winter wave, busier weekends and a late-November to December peak."""
+    days = np.arange(NUM_DAYS)
+    weights = 1.0 + 0.2 * np.sin(2 * np.pi * (days - 80) / NUM_DAYS)
+    weekday = days % 7  # 2024-01-01 was a Monday
+    weights[weekday >= 5] *= 1.25
+    dates = START_DATE + days
+    holiday = (dates >= np.datetime64("2024-11-25")) & (dates <= np.datetime64("2024-12-24"))
+    weights[holiday] *= 1.8
+    return weights
+
+
+class Catalog:
+    """Per-seed fixed attributes (product categories and prices, customer home regions) plus sampling CDFs."""
+
+    def __init__(self, seed: int, num_rows: int):
+        rng = np.random.default_rng([seed, 2 ** 31])  # distinct stream from every chunk
+        self.num_customers = max(MIN_CUSTOMERS, num_rows // 100)
+
+        self.product_category = np.searchsorted(_cdf(CATEGORY_MIX), rng.random(NUM_PRODUCTS))
+        medians = np.array([median for median, _ in CATEGORY_PRICES])[self.product_category]
+        sigmas = np.array([sigma for _, sigma in CATEGORY_PRICES])[self.product_category]
+        self.product_price = np.clip(np.round(rng.lognormal(np.log(medians), sigmas), 2), 1.0, 2000.0)
+        self.customer_region = np.searchsorted(_cdf(REGION_MIX), rng.random(self.num_customers))
+
+        self.day_cdf = _cdf(_day_weights())
+        self.product_cdf = _zipf_cdf(rng, NUM_PRODUCTS, PRODUCT_ZIPF)
+        self.customer_cdf = _zipf_cdf(rng, self.num_customers, CUSTOMER_ZIPF)
+        self.region_cdf = _cdf(REGION_MIX)
+        self.quantity_cdf = _cdf(QUANTITY_MIX)
+
+    def labels(self):
+        """Dictionary values for the string columns; rows store int32 indices into these."""
+        import pyarrow as pa
+
+        return {
+            "customer_id": pa.array([f"CUST{1000 + i}" for i in range(self.num_customers)]),
+            "product_id": pa.array([f"PROD{100 + i}" for i in range(NUM_PRODUCTS)]),
+            "product_category": pa.array(CATEGORIES),
+            "region": pa.array(REGIONS),
+        }
+
+
+def generate_chunk(catalog: Catalog, seed: int, chunk_index: int, num_rows: int, labels=None):
+    """Generates one chunk of rows as a pyarrow Table in the table's schema."""
+    import pyarrow as pa
+
+    labels = labels or catalog.labels()
+    rng = np.random.default_rng([seed, chunk_index])
+
+    def sample(cdf, size=num_rows):
+        return np.searchsorted(cdf, rng.random(size)).astype(np.int32)
+
+    day = sample(catalog.day_cdf)
+    product = sample(catalog.product_cdf)
+    customer = sample(catalog.customer_cdf)
+    region = catalog.customer_region[customer].astype(np.int32)
+    away = rng.random(num_rows) < AWAY_SHARE
+    region[away] = sample(catalog.region_cdf, int(away.sum()))
+    quantity = sample(catalog.quantity_cdf).astype(np.int64) + 1
+    # Per-transaction discount/markup around the list price.
+    unit_price = catalog.product_price[product] * rng.uniform(0.85, 1.05, num_rows)
+    sales_amount = np.round(unit_price * quantity, 2)
+
+    def dictionary(name, indices):
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), labels[name])
+
+    return pa.table({
+        "transaction_date": pa.array(START_DATE + day.astype("timedelta64[D]"), pa.date32()),
+        "customer_id": dictionary("customer_id", customer),
+        "product_id": dictionary("product_id", product),
+        "product_category": dictionary("product_category", catalog.product_category[product].astype(np.int32)),
+        "sales_amount": pa.array(sales_amount, pa.float64()),
+        "quantity": pa.array(quantity, pa.int64()),
+        "region": dictionary("region", region),
+    })
+
+
+def chunk_sizes(num_rows: int, chunk_rows: int) -> list:
+    full, rest = divmod(num_rows, chunk_rows)
+    return [chunk_rows] * full + ([rest] if rest else [])
+
+
+# --- Parquet writing (parallel across processes) ---
+_worker_state = None  # (catalog, labels), built once per process
+
+
+def _init_worker(seed: int, num_rows: int):
+    global _worker_state
+    catalog = Catalog(seed, num_rows)
+    _worker_state = (catalog, catalog.labels())
+
+
+def _write_chunk(task):
+    """Worker entry point: builds one chunk and writes it, so each process holds at most one chunk."""
+    import pyarrow.parquet as pq
+
+    seed, chunk_index, num_rows, out_dir = task
+    catalog, labels = _worker_state
+    table = generate_chunk(catalog, seed, chunk_index, num_rows, labels)
+    path = os.path.join(out_dir, f"part-{chunk_index:05d}.parquet")
+    pq.write_table(table, path, compression="snappy")
+    return path, table.num_rows
+
+
+def iter_parquet_chunks(out_dir: str, num_rows: int, chunk_rows: int, seed: int, workers: int):
+    """
+    Writes the dataset as part-NNNNN.parquet files under out_dir and yields
+    (path, rows) as each file is finished, in chunk order. workers <= 1 runs in
+    this process, one chunk at a time (the memory-bounded mode).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(out_dir, "part-*.parquet")):
+        os.remove(stale)
+    tasks = [(seed, i, size, out_dir) for i, size in enumerate(chunk_sizes(num_rows, chunk_rows))]
+
+    if workers <= 1 or len(tasks) == 1:
+        _init_worker(seed, num_rows)
+        for task in tasks:
+            yield _write_chunk(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker,
+                             initargs=(seed, num_rows)) as executor:
+        yield from executor.map(_write_chunk, tasks)
+
+
+# --- BigQuery bulk load ---
+def load_parquet_file(table_object, path: str, replace: bool = False):
+    """Starts a load job for one Parquet file (load jobs are free, unlike streaming inserts)."""
+    from google.cloud import bigquery
+
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition=(bigquery.WriteDisposition.WRITE_TRUNCATE if replace
+                           else bigquery.WriteDisposition.WRITE_APPEND),
+    )
+    with open(path, "rb") as source:
+        return client.load_table_from_file(source, table_object, job_config=job_config)
+
+
+def populate_data(table_object, num_rows=DEFAULT_ROWS, chunk_rows=DEFAULT_CHUNK_ROWS, seed=DEFAULT_SEED,
+                  workers=1, memory_bounded=False, replace=False):
+    """
+    Generates the dataset as Parquet in a temporary directory and bulk-loads it
+    into table_object. In memory-bounded mode each chunk is loaded and deleted
+    before the next is generated, so at most one chunk is in RAM or on disk.
+    """
+    staging_dir = tempfile.mkdtemp(prefix="retail_parquet_")
+    pending = []
+    loaded = 0
+
+    def finish(job, path, rows):
+        nonlocal loaded
+        job.result()
+        os.remove(path)
+        loaded += rows
+        print(f"Loaded {os.path.basename(path)} ({rows} rows, {loaded}/{num_rows})")
+
+    try:
+        chunks = iter_parquet_chunks(staging_dir, num_rows, chunk_rows, seed, 1 if memory_bounded else workers)
+        for index, (path, rows) in enumerate(chunks):
+            truncate = replace and index == 0
+            job = load_parquet_file(table_object, path, replace=truncate)
+            # A truncating first load must finish before the appends start.
+            if memory_bounded or truncate:
+                finish(job, path, rows)
+            else:
+                pending.append((job, path, rows))
+        for job, path, rows in pending:
+            finish(job, path, rows)
+    except Exception as e:
+        print("Encountered errors while loading data:", e)
+        return
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    print("Data load successful.")
+
+
+def write_local_parquet(data_dir, num_rows=DEFAULT_ROWS, chunk_rows=DEFAULT_CHUNK_ROWS, seed=DEFAULT_SEED,
+                        workers=1):
+    """Writes the dataset under data_dir/<DATASET_ID>/<TABLE_ID>/, the layout DuckDBWarehouse reads."""
+    table_dir = os.path.join(data_dir, DATASET_ID, TABLE_ID)
+    written = 0
+    for path, rows in iter_parquet_chunks(table_dir, num_rows, chunk_rows, seed, workers):
+        written += rows
+        print(f"Wrote {path} ({rows} rows, {written}/{num_rows})")
 
-    if errors:
-        print("Encountered errors while inserting rows:", errors)
-    else:
-        print("Data insertion successful.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and populate the retail sample table.")
+    parser.add_argument("--local", nargs="?", const=LOCAL_DATA_DIR, metavar="DATA_DIR",
+                        help=f"Write the dataset as local Parquet for the DuckDB backend (default dir: {LOCAL_DATA_DIR}).")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help=f"Rows to generate (default {DEFAULT_ROWS}).")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"Rows per Parquet file / load job (default {DEFAULT_CHUNK_ROWS}).")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed; same seed, same data.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes generating chunks in parallel (default: CPU count).")
+    parser.add_argument("--memory-bounded", action="store_true",
+                        help="Generate, write and load one chunk at a time in this process.")
+    parser.add_argument("--replace", action="store_true",
+                        help="Replace the BigQuery table contents instead of appending.")
+    args = parser.parse_args()
+
+    if not DATASET_ID or not TABLE_ID or (not args.local and not PROJECT_ID):
+        print("Error: Ensure PROJECT_ID, DATASET_ID, and TABLE_ID are set in your .env file.")
+        exit()
+
+    started = time.perf_counter()
+    if args.local:
+        write_local_parquet(args.local, args.rows, args.chunk_rows, args.seed,
+                            1 if args.memory_bounded else args.workers)
+        print(f"\nLocal Parquet setup complete ({args.rows} rows in {time.perf_counter() - started:.1f}s).")
+        exit()
+
+    init_bigquery_client()
+
     # Get the table object (creating it if necessary)
     retail_table = create_dataset_and_get_table()
     
     # Pass the complete table object to the population function
-    populate_data(retail_table)
+    populate_data(retail_table, args.rows, args.chunk_rows, args.seed, args.workers,
+                  memory_bounded=args.memory_bounded, replace=args.replace)
     
-    print("\nBigQuery setup complete.")
\ No newline at end of file
+    print(f"\nBigQuery setup complete ({time.perf_counter() - started:.1f}s).")
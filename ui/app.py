@@ -1,10 +1,16 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, stream_with_context
 import vertexai
 from vertexai.agent_engines import AgentEngine
+import json
 import os
+import time
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+import metrics
+from engine_pool import EnginePool, RequestCoalescer, StubEngine, coalesce_key
+from static_assets import AssetManifest, asset_response, compress_response
+
 load_dotenv()
 
 # -----------------------------
@@ -13,20 +19,36 @@ load_dotenv()
 PROJECT_ID = os.getenv("PROJECT_ID")
 REGION = os.getenv("REGION")
 AGENT_RESOURCE_NAME = os.getenv("AGENT_RESOURCE_NAME")
+# AGENT_ENGINE=stub answers from a local fake engine (no Vertex AI needed), for development and load tests.
+USE_STUB_ENGINE = os.getenv("AGENT_ENGINE", "").lower() == "stub"
+STUB_ENGINE_LATENCY = float(os.getenv("STUB_ENGINE_LATENCY", "0.5"))
+# One client per request thread by default (see gunicorn.conf.py).
+ENGINE_POOL_SIZE = int(os.getenv("ENGINE_POOL_SIZE", os.getenv("GUNICORN_THREADS", "8")))
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() not in ("0", "false", "no")
+# Ask the agent for per-stage _timings and export them as Prometheus metrics at /metrics.
+AGENT_TIMINGS = os.getenv("AGENT_TIMINGS", "true").lower() not in ("0", "false", "no")
+# Largest batch /chat/batch accepts (the agent's own limit is 500).
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "500"))
+# /chat responses at least this large are gzip/brotli-compressed for clients that accept it (0 disables).
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
 
 # CRITICAL FIX: The build folder is now ADJACENT to app.py within the 'ui' directory.
 FRONTEND_DIST_DIR = os.path.join(os.path.dirname(__file__), 'dist_frontend') 
 # -----------------------------
 
-# Initialize Flask, configuring it to serve static files from the ADJACENT 'dist_frontend' folder
-app = Flask(__name__, static_folder=FRONTEND_DIST_DIR, static_url_path='') 
+# Initialize Flask. The built frontend in the ADJACENT 'dist_frontend' folder is served from an in-memory
+# manifest read at startup (restart the server after rebuilding the frontend).
+app = Flask(__name__, static_folder=None)
 CORS(app) 
+assets = AssetManifest.build(FRONTEND_DIST_DIR)
 
 # --- Pre-flight checks for required environment variables ---
-if not all([PROJECT_ID, REGION, AGENT_RESOURCE_NAME]):
+if not USE_STUB_ENGINE and not all([PROJECT_ID, REGION, AGENT_RESOURCE_NAME]):
     @app.route("/", defaults={'path': ''})
     @app.route("/<path:path>")
     @app.route("/chat", methods=["GET", "POST"])
+    @app.route("/chat/stream", methods=["POST"])
+    @app.route("/chat/batch", methods=["POST"])
     def missing_env_vars(path=''):
         error_message = "Server configuration error: Ensure PROJECT_ID, REGION, and AGENT_RESOURCE_NAME are set in the backend environment."
         print(f"ERROR: {error_message}")
@@ -35,24 +57,33 @@ if not all([PROJECT_ID, REGION, AGENT_RESOURCE_NAME]):
             "type": "text",
             "content": error_message,
         }), 500
-else:
+elif not USE_STUB_ENGINE:
     # Initialize Vertex AI SDK once
     vertexai.init(
         project=PROJECT_ID,
         location=REGION
     )
 
+# --- Upstream clients, created once per worker process at startup ---
+if USE_STUB_ENGINE:
+    engine_pool = EnginePool(lambda: StubEngine(latency=STUB_ENGINE_LATENCY), size=ENGINE_POOL_SIZE)
+else:
+    engine_pool = EnginePool(lambda: AgentEngine(AGENT_RESOURCE_NAME), size=ENGINE_POOL_SIZE)
+if USE_STUB_ENGINE or all([PROJECT_ID, REGION, AGENT_RESOURCE_NAME]):
+    engine_pool.warm()
+coalescer = RequestCoalescer()
+
 # --- 1. FRONTEND ROUTE: Serves the main React application ---
 # This serves index.html and all built assets (JS, CSS)
 @app.route("/", defaults={'path': ''})
 @app.route("/<path:path>")
 def serve_react_app(path):
-    # If the path is a file (JS, CSS, etc.) in the build directory, serve it.
-    if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    
-    # Otherwise, serve the main entry point (index.html) for React routing.
-    return send_from_directory(app.static_folder, 'index.html')
+    # If the path is a file (JS, CSS, etc.) in the build directory, serve it;
+    # otherwise serve the main entry point (index.html) for React routing.
+    asset = assets.get(path) or assets.index
+    if asset is None:
+        return jsonify({"error": "Frontend not built. Run npm run build in the ui directory."}), 404
+    return asset_response(asset, request)
 
 
 # --- 2. API ROUTE: Handles Agent interaction ---
@@ -60,31 +91,46 @@ def serve_react_app(path):
 def chat_endpoint():
     payload = request.get_json()
     message = payload.get("message")
+    # Optional: the browser's conversation id, so the agent can answer follow-ups in context.
+    session = {"session_id": payload["session_id"]} if payload.get("session_id") else {}
 
     if not message:
         return jsonify({"error": "No message provided"}), 400
 
+    started = time.perf_counter()
+
+    def ask_agent():
+        agent_response = engine_pool.query(message, timings=AGENT_TIMINGS, **session)
+        # Only the request that made the upstream call records the agent's timings. They are for
+        # /metrics, not the browser, so they are dropped from the payload.
+        if isinstance(agent_response, dict):
+            metrics.observe_timings(agent_response.pop("_timings", None))
+        return agent_response
+
     try:
-        engine = AgentEngine(AGENT_RESOURCE_NAME)
-        
         # VERSION FIX: The reported error ('AgentEngine' object has no attribute 'query') 
         # indicates the deployment environment is using an older SDK version where the 
         # method 'execute' is required instead of 'query'.
         # agent_response = engine.run(message)
         
-        agent_response = engine.query(
-            input={
-                "message": message
-            }
-        )
+        # Identical messages already in flight share one upstream call.
+        if COALESCE_REQUESTS:
+            agent_response, coalesced = coalescer.run(coalesce_key(message, session.get("session_id")), ask_agent)
+        else:
+            agent_response, coalesced = ask_agent(), False
 
         # The agent's response is a dict-like object that can be directly
         # converted to JSON.
-        return jsonify(agent_response)
+        response = jsonify(agent_response)
+        if coalesced:
+            response.headers["X-Coalesced"] = "1"
+        metrics.observe_request("chat", 200, time.perf_counter() - started, coalesced)
+        return response
 
     except Exception as e:
         # Log the full error on the server side
         app.logger.error(f"Agent interaction failed: {e}")
+        metrics.observe_request("chat", 500, time.perf_counter() - started)
         
         # Return a simple error message to the client
         return jsonify({
@@ -93,5 +139,92 @@ def chat_endpoint():
         }), 500
 
 
+# --- 3. STREAMING API ROUTE: Forwards the agent's staged events as server-sent events ---
+def sse_event(event: dict) -> str:
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event.get('data'))}\n\n"
+
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream_endpoint():
+    payload = request.get_json()
+    message = payload.get("message")
+    session = {"session_id": payload["session_id"]} if payload.get("session_id") else {}
+
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+
+    def generate():
+        started = time.perf_counter()
+        status = 200
+        try:
+            with engine_pool.client() as engine:
+                for event in engine.stream_query(input={"message": message, "timings": AGENT_TIMINGS, **session}):
+                    if event.get("event") == "done" and isinstance(event.get("data"), dict):
+                        metrics.observe_timings(event["data"].pop("_timings", None))
+                    yield sse_event(event)
+        except Exception as e:
+            status = 500
+            app.logger.error(f"Agent streaming failed: {e}")
+            yield sse_event({"event": "done", "data": {
+                "type": "text",
+                "content": f"Error communicating with Agent Engine. Server logs show: {e.__class__.__name__}: {str(e)}",
+            }})
+        finally:
+            metrics.observe_request("chat_stream", status, time.perf_counter() - started)
+
+    # X-Accel-Buffering stops reverse proxies from holding events back until the response ends.
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- 4. BATCH API ROUTE: Answers a list of questions in one agent call, for offline reports ---
+@app.route("/chat/batch", methods=["POST"])
+def chat_batch_endpoint():
+    payload = request.get_json() or {}
+    questions = payload.get("questions")
+    # "json" (default) returns one array; "jsonl" one answer per line, ready to append to a report.
+    output_format = payload.get("format", "json")
+
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q for q in questions):
+        return jsonify({"error": "questions must be a non-empty list of strings"}), 400
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_QUESTIONS} questions per batch"}), 400
+    if output_format not in ("json", "jsonl"):
+        return jsonify({"error": "format must be json or jsonl"}), 400
+
+    started = time.perf_counter()
+    options = {k: payload[k] for k in ("workers", "plan_batch_size") if k in payload}
+    try:
+        with engine_pool.client() as engine:
+            answers = engine.query_batch(input={"questions": questions, **options})
+    except Exception as e:
+        app.logger.error(f"Agent batch failed: {e}")
+        metrics.observe_request("chat_batch", 500, time.perf_counter() - started)
+        return jsonify({"error": f"Error communicating with Agent Engine. Server logs show: {e.__class__.__name__}: {str(e)}"}), 500
+
+    metrics.observe_request("chat_batch", 200, time.perf_counter() - started)
+    if output_format == "jsonl":
+        lines = (json.dumps(dict(answer, question=question), default=str) + "\n"
+                 for question, answer in zip(questions, answers))
+        return Response("".join(lines), mimetype="application/x-ndjson")
+    return jsonify([dict(answer, question=question) for question, answer in zip(questions, answers)])
+
+
+# Large /chat answers (many data rows) are compressed; streamed responses are left as they are.
+@app.after_request
+def compress_chat_response(response):
+    if COMPRESS_MIN_BYTES and request.path in ("/chat", "/chat/batch"):
+        return compress_response(response, request, COMPRESS_MIN_BYTES)
+    return response
+
+
+# --- 5. METRICS: Prometheus scrape endpoint ---
+@app.route("/metrics")
+def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(body, mimetype=content_type)
+
+
 if __name__ == "__main__":
-    app.run(port=8080, host="0.0.0.0", debug=True)
\ No newline at end of file
+    # Development server. In production run gunicorn instead: gunicorn -c gunicorn.conf.py app:app
+    app.run(port=8080, host="0.0.0.0", debug=True, threaded=True)
\ No newline at end of file
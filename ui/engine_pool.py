@@ -0,0 +1,182 @@
+# engine_pool.py
+#
+# Upstream plumbing for the /chat proxy:
+#   EnginePool       : long-lived Agent Engine clients, created at startup and
+#                      checked out by one request thread at a time
+#   RequestCoalescer : identical in-flight messages share one upstream call
+#   StubEngine       : local stand-in for AgentEngine (AGENT_ENGINE=stub) for
+#                      development and load tests without Vertex AI
+
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+class EnginePool:
+    def __init__(self, factory: Callable, size: int = 8, acquire_timeout: Optional[float] = 60.0):
+        self._factory = factory
+        self.size = max(1, size)
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()  # LIFO keeps recently used (warm) connections busy
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def warm(self) -> int:
+        """Creates clients up to the pool size; failures are logged and retried on demand."""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                self._idle.put(self._factory())
+            except Exception as e:
+                with self._lock:
+                    self._created -= 1
+                print(f"Warning: could not create Agent Engine client at startup: {e}")
+                break
+        return self._created
+
+    @contextmanager
+    def client(self):
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    engine = self._factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    engine = self._idle.get(timeout=self.acquire_timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No Agent Engine client free after {self.acquire_timeout}s")
+        try:
+            yield engine
+        finally:
+            self._idle.put(engine)
+
+    def query(self, message: str, **options):
+        with self.client() as engine:
+            return engine.query(input={"message": message, **options})
+
+
+def coalesce_key(message: str, session_id: Optional[str] = None) -> str:
+    # A follow-up means something different in every session, so only same-session duplicates share a call.
+    key = " ".join(message.split()).lower()
+    return f"{session_id}\n{key}" if session_id else key
+
+
+class RequestCoalescer:
+    """Single-flight: the first caller for a key runs fn, concurrent callers with the same key wait for its result."""
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: str, fn: Callable):
+        """Returns (result, coalesced). Exceptions from the leader are re-raised in every waiter."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result(), False
+
+
+class StubEngine:
+    """Answers every message with a fixed analytics payload after a simulated latency."""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+
+    def _latency(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def query(self, input: dict):
+        latency = self._latency()
+        time.sleep(latency)
+        answer = self._answer(input)
+        if input.get("timings"):
+            answer["_timings"] = self._timings(latency)
+        return answer
+
+    def query_batch(self, input: dict):
+        """One answer per question, as RetailAgent.query_batch returns them, after a single simulated latency."""
+        time.sleep(self._latency())
+        answers = []
+        for i, question in enumerate(input.get("questions") or []):
+            answer = self._answer({"message": question})
+            answer["_batch"] = {"index": i, "plan": "batch", "rows": "query" if i == 0 else "shared"}
+            answers.append(answer)
+        return answers
+
+    def stream_query(self, input: dict):
+        """Yields the same staged events as RetailAgent.stream_query, spread over the simulated latency."""
+        latency = self._latency()
+        answer = self._answer(input)
+        yield {"event": "routing", "data": {"route": "analytics", "source": "stub"}}
+        time.sleep(latency * 0.4)
+        yield {"event": "plan", "data": {k: answer[k] for k in ("type", "raw_sql", "visualization")}}
+        time.sleep(latency * 0.2)
+        yield {"event": "data", "data": answer["data"]}
+        words = answer["content"].split(" ")
+        for i, word in enumerate(words):
+            time.sleep(latency * 0.4 / len(words))
+            yield {"event": "content", "data": word if i == 0 else " " + word}
+        done = {k: v for k, v in answer.items() if k != "data"}
+        if input.get("timings"):
+            done["_timings"] = self._timings(latency)
+        yield {"event": "done", "data": done}
+
+    @staticmethod
+    def _timings(latency: float) -> dict:
+        """A _timings payload shaped like the agent's, splitting the simulated latency across stages."""
+        total_ms = latency * 1000
+        stages = [("model.plan", 0.35, {"tokens.prompt": 620, "tokens.output": 55}),
+                  ("warehouse.execute", 0.3, {"rows": 4, "bytes_processed": 4096}),
+                  ("model.summary", 0.35, {"tokens.prompt": 230, "tokens.output": 20})]
+        spans = [{"name": "agent.turn", "id": 1, "parent": None, "start_ms": 0.0, "duration_ms": total_ms, "attributes": {}}]
+        start = 0.0
+        for i, (name, share, attributes) in enumerate(stages, start=2):
+            spans.append({"name": name, "id": i, "parent": 1, "start_ms": start, "duration_ms": total_ms * share,
+                          "attributes": attributes})
+            start += total_ms * share
+        return {"trace_id": "stub", "total_ms": total_ms, "spans": spans}
+
+    def _answer(self, input: dict) -> dict:
+        return {
+            "type": "analytics",
+            "content": f"Stub answer for: {input.get('message', '')}",
+            "raw_sql": "SELECT region, SUM(sales_amount) AS total_sales FROM retail.sales GROUP BY region",
+            "visualization": {"chart_type": "bar_chart", "x_axis": "region", "y_axis": "total_sales"},
+            "data": [
+                {"region": "East", "total_sales": 1250.5},
+                {"region": "North", "total_sales": 980.0},
+                {"region": "South", "total_sales": 720.25},
+                {"region": "West", "total_sales": 1100.75},
+            ],
+        }
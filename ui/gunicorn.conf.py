@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+#
+# Production serving for the Flask proxy: gthread workers, so each process
+# handles GUNICORN_THREADS requests concurrently while they wait on the
+# Agent Engine. Every worker builds its own engine client pool at import.
+#
+#   cd ui && gunicorn -c gunicorn.conf.py app:app
+
+import multiprocessing
+import os
+import tempfile
+
+# Workers write Prometheus metrics to a shared directory so /metrics covers all of them.
+# Set before any worker imports prometheus_client.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="chat_metrics_"))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count())))))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Agent turns can take tens of seconds; keep workers from being killed mid-request.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None  # empty disables the access log
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
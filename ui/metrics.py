@@ -0,0 +1,64 @@
+# metrics.py
+#
+# Prometheus metrics for the Flask proxy, served at /metrics. Request counts and
+# latency are measured here. Per-stage agent timings, token counts, bytes, rows,
+# cache hits and retries come from the _timings field that the agent returns
+# when its input carries "timings": true.
+# Under gunicorn each worker is a separate process. gunicorn.conf.py sets
+# PROMETHEUS_MULTIPROC_DIR so /metrics aggregates across all of them.
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUESTS = Counter("chat_requests_total", "Chat requests handled by the proxy.", ["endpoint", "status"])
+REQUEST_SECONDS = Histogram("chat_request_seconds", "End-to-end chat request latency at the proxy.",
+                            ["endpoint"], buckets=LATENCY_BUCKETS)
+COALESCED = Counter("chat_coalesced_total", "Chat requests answered by another request's upstream call.")
+
+STAGE_SECONDS = Histogram("agent_stage_seconds", "Agent pipeline stage duration (from _timings).",
+                          ["stage"], buckets=LATENCY_BUCKETS)
+CACHE_LOOKUPS = Counter("agent_cache_lookups_total", "Agent cache lookups by level.", ["level", "result"])
+TOKENS = Counter("agent_tokens_total", "Model tokens by stage.", ["stage", "kind"])
+BYTES_PROCESSED = Counter("agent_bytes_processed_total", "Bytes processed by warehouse queries.")
+ROWS = Counter("agent_rows_total", "Rows read from the warehouse.")
+RETRIES = Counter("agent_retries_total", "Retried upstream calls by stage.", ["stage"])
+
+
+def observe_request(endpoint: str, status: int, seconds: float, coalesced: bool = False):
+    REQUESTS.labels(endpoint, str(status)).inc()
+    REQUEST_SECONDS.labels(endpoint).observe(seconds)
+    if coalesced:
+        COALESCED.inc()
+
+
+def observe_timings(timings):
+    """Feeds one turn's _timings (see agent/tracing.py) into the agent_* metrics."""
+    for span in (timings or {}).get("spans", []):
+        name = span.get("name", "unknown")
+        attributes = span.get("attributes") or {}
+        STAGE_SECONDS.labels(name).observe(span.get("duration_ms", 0) / 1000.0)
+        if name.startswith("cache.") and "hit" in attributes:
+            CACHE_LOOKUPS.labels(name.split(".", 1)[1], "hit" if attributes["hit"] else "miss").inc()
+        for kind in ("prompt", "output"):
+            if attributes.get(f"tokens.{kind}"):
+                TOKENS.labels(name, kind).inc(attributes[f"tokens.{kind}"])
+        if name == "warehouse.execute":
+            BYTES_PROCESSED.inc(attributes.get("bytes_processed") or 0)
+            ROWS.inc(attributes.get("rows") or 0)
+        if attributes.get("retries"):
+            RETRIES.labels(name).inc(attributes["retries"])
+
+
+def render():
+    """Returns (body, content_type) for the /metrics endpoint."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
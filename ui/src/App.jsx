@@ -4,8 +4,10 @@ import MessageBubble from "./components/MessageBubble";
 import LoadingDots from "./components/LoadingDots";
 import useSpeechRecognition from "./hooks/useSpeechRecognition";
 import useSpeechSynthesis from "./hooks/useSpeechSynthesis";
+import { readEventStream } from "./utils/eventStream";
 
 const API_ENDPOINT = import.meta.env.VITE_API_ENDPOINT || "http://localhost:8080/chat";
+const STREAM_ENDPOINT = import.meta.env.VITE_STREAM_ENDPOINT || `${API_ENDPOINT}/stream`;
 
 export default function App() {
   const [messages, setMessages] = useState([
@@ -13,6 +15,8 @@ export default function App() {
   ]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
+  // One conversation per page load; the agent uses it to answer follow-ups ("only North", "as a pie chart").
+  const sessionId = useRef(crypto.randomUUID());
 
   const { speak } = useSpeechSynthesis();
 
@@ -24,19 +28,12 @@ export default function App() {
   const bottomRef = useRef(null);
   useEffect(() => bottomRef.current?.scrollIntoView({ behavior: "smooth" }), [messages]);
 
-  async function sendMessage(text) {
-    const content = text || input;
-    if (!content.trim()) return;
-
-    setMessages((m) => [...m, { role: "user", content }]);
-    setInput("");
-    setLoading(true);
-
+  async function sendBlocking(content) {
     try {
       const res = await fetch(API_ENDPOINT, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: content })
+        body: JSON.stringify({ message: content, session_id: sessionId.current })
       });
 
       const data = await res.json();
@@ -57,6 +54,64 @@ export default function App() {
         }
       ]);
     }
+  }
+
+  async function sendMessage(text) {
+    const content = text || input;
+    if (!content.trim()) return;
+
+    setMessages((m) => [...m, { role: "user", content }]);
+    setInput("");
+    setLoading(true);
+
+    // Streamed turns render stage by stage: SQL and chart first, then the summary as it is generated.
+    const id = `${Date.now()}-${Math.random()}`;
+    const update = (fn) => setMessages((m) => m.map((msg) => (msg.id === id ? fn(msg) : msg)));
+    let started = false;
+
+    try {
+      const res = await fetch(STREAM_ENDPOINT, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ message: content, session_id: sessionId.current })
+      });
+      if (!res.ok || !res.body) throw new Error(`Streaming request failed with status ${res.status}`);
+
+      let final = null;
+      await readEventStream(res, (event, data) => {
+        if (!started) {
+          started = true;
+          setLoading(false);
+          setMessages((m) => [...m, { id, role: "ai", content: "", data: [], streaming: true }]);
+        }
+        if (event === "routing") {
+          update((msg) => ({ ...msg, _routing: data }));
+        } else if (event === "plan") {
+          update((msg) => ({ ...msg, ...data }));
+        } else if (event === "data") {
+          update((msg) => ({ ...msg, data: [...msg.data, ...data] }));
+        } else if (event === "content") {
+          update((msg) => ({ ...msg, content: msg.content + data }));
+        } else if (event === "done") {
+          final = data;
+          update((msg) => ({ ...msg, ...data, streaming: false }));
+        }
+      });
+      if (!final) update((msg) => ({ ...msg, streaming: false }));
+
+      // Auto speak AI summary
+      if (final && (final.type === "text" || final.type === "analytics") && final.content) {
+        speak(final.content);
+      }
+    } catch (err) {
+      if (started) {
+        console.error(err);
+        update((msg) => ({ ...msg, streaming: false, content: msg.content || "Error connecting to the backend." }));
+      } else {
+        // Streaming unavailable (e.g. an older backend): fall back to the single-response endpoint.
+        await sendBlocking(content);
+      }
+    }
 
     setLoading(false);
   }
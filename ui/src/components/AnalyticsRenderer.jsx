@@ -1,9 +1,11 @@
+import { useEffect, useMemo, useState } from "react";
 import {
   BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer,
   LineChart, Line,
   PieChart, Pie, Cell,
   Label
 } from "recharts";
+import { CHART_TYPES, buildView, viewOptions } from "../utils/pivot";
 
 const COLORS = ["#3b82f6", "#22c55e", "#facc15", "#ef4444", "#a855f7"];
 
@@ -12,7 +14,78 @@ const formatLabel = (str) => {
     return str.replace(/_/g, " ").replace(/\b\w/g, (l) => l.toUpperCase());
 };
 
-export default function AnalyticsRenderer({ visualization, data }) {
+const CHART_LABELS = { bar_chart: "Bar", line_chart: "Line", pie_chart: "Pie", table: "Table" };
+const LIMITS = [0, 5, 10, 20];
+
+const initialView = (visualization) => ({
+  chartType: visualization.chart_type,
+  xAxis: visualization.x_axis,
+  yAxis: visualization.y_axis,
+  sort: "none",
+  limit: 0,
+  regroup: false,
+});
+
+// Chart type, axes, sort and top-N are changed locally (utils/pivot.js), without a new chat turn.
+function ViewControls({ view, setView, options }) {
+  const select = "bg-gray-700 border border-gray-600 rounded px-2 py-1 text-xs text-gray-100";
+  const set = (key) => (e) => setView((v) => ({
+    ...v,
+    [key]: key === "limit" ? Number(e.target.value) : e.target.value,
+    regroup: v.regroup || key === "xAxis",
+  }));
+  return (
+    <div className="flex flex-wrap gap-2 items-center mb-2 text-xs text-gray-300">
+      {CHART_TYPES.map((type) => (
+        <button
+          key={type}
+          onClick={() => setView((v) => ({ ...v, chartType: type }))}
+          className={`px-2 py-1 rounded ${view.chartType === type ? "bg-blue-600 text-white" : "bg-gray-700 hover:bg-gray-600"}`}
+        >
+          {CHART_LABELS[type]}
+        </button>
+      ))}
+      {options.dimensions.length > 1 && (
+        <select className={select} value={view.xAxis} onChange={set("xAxis")} title="Group by">
+          {options.dimensions.map((d) => <option key={d} value={d}>by {formatLabel(d)}</option>)}
+        </select>
+      )}
+      {options.measures.length > 1 && (
+        <select className={select} value={view.yAxis} onChange={set("yAxis")} title="Measure">
+          {options.measures.map((m) => <option key={m} value={m}>{formatLabel(m)}</option>)}
+        </select>
+      )}
+      <select className={select} value={view.sort} onChange={set("sort")} title="Sort">
+        <option value="none">Unsorted</option>
+        <option value="desc">Largest first</option>
+        <option value="asc">Smallest first</option>
+      </select>
+      <select className={select} value={view.limit} onChange={set("limit")} title="Show">
+        {LIMITS.map((n) => <option key={n} value={n}>{n ? `${view.sort === "asc" ? "Bottom" : "Top"} ${n}` : "All"}</option>)}
+      </select>
+    </div>
+  );
+}
+
+export default function AnalyticsRenderer({ visualization, data, columns, detail }) {
+  const [view, setView] = useState(() => initialView(visualization));
+  // A new plan (e.g. the final payload of a streamed turn) resets the local view.
+  useEffect(() => setView(initialView(visualization)), [visualization.chart_type, visualization.x_axis, visualization.y_axis]);
+
+  const result = { data: data ?? [], columns, detail };
+  const options = useMemo(() => viewOptions(result), [data, columns, detail]);
+  const shown = useMemo(() => buildView(result, view), [data, columns, detail, view]);
+
+  if (!data?.length) return null;
+  return (
+    <div>
+      <ViewControls view={view} setView={setView} options={options} />
+      <Chart visualization={shown.visualization} data={shown.rows} />
+    </div>
+  );
+}
+
+function Chart({ visualization, data }) {
   if (!data?.length) return null;
 
   switch (visualization.chart_type) {
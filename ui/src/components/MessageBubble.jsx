@@ -1,4 +1,17 @@
 import AnalyticsRenderer from "./AnalyticsRenderer";
+import LoadingDots from "./LoadingDots";
+
+const formatBytes = (bytes) => {
+  if (bytes == null) return null;
+  const units = ["B", "KB", "MB", "GB", "TB"];
+  let value = bytes;
+  let unit = 0;
+  while (value >= 1024 && unit < units.length - 1) {
+    value /= 1024;
+    unit += 1;
+  }
+  return `${unit === 0 ? value : value.toFixed(1)} ${units[unit]}`;
+};
 
 export default function MessageBubble({ msg, isUser }) {
   return (
@@ -10,12 +23,15 @@ export default function MessageBubble({ msg, isUser }) {
         `}
       >
         <p className="mb-2 whitespace-pre-line">{msg.content}</p>
+        {msg.streaming && !msg.content && <LoadingDots />}
 
         {msg.type === "analytics" && msg.visualization?.chart_type !== "none" && (
           <div className="mt-4">
             <AnalyticsRenderer
               visualization={msg.visualization}
               data={msg.data}
+              columns={msg._columns}
+              detail={msg._detail}
             />
           </div>
         )}
@@ -26,6 +42,14 @@ export default function MessageBubble({ msg, isUser }) {
             <pre className="bg-gray-900 text-gray-300 p-3 rounded-lg text-xs whitespace-pre-wrap">
               <code>{msg.raw_sql}</code>
             </pre>
+            {msg._cost && (
+              <p className="text-xs mt-1 text-gray-400">
+                {msg._cost.cached
+                  ? "Served from cache"
+                  : `Estimated scan: ${formatBytes(msg._cost.estimated_bytes) ?? "n/a"}`}
+                {msg._cost.limit_injected && " · LIMIT added"}
+              </p>
+            )}
           </div>
         )}
       </div>
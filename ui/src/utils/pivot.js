@@ -0,0 +1,114 @@
+// Local re-shaping of an analytics result: chart type, axes, sorting, top-N
+// and re-grouping happen in the browser from the rows the agent already sent,
+// without another chat turn. The agent describes every column in _columns
+// ({ name, type, role, aggregate }) and, for small results, sends _detail:
+// the same query grouped by one more dimension, so that dimension can be
+// charted too. A measure is only re-grouped when its aggregate combines
+// exactly (SUM, COUNT, MIN, MAX); AVG and COUNT(DISTINCT) measures keep the
+// grain the agent returned.
+
+export const CHART_TYPES = ["bar_chart", "line_chart", "pie_chart", "table"];
+
+// How partial results of each aggregate combine (COUNT partials are summed).
+const COMBINE = { sum: "sum", count: "sum", min: "min", max: "max" };
+
+// NUMERIC/BIGNUMERIC values arrive as strings.
+export function toNumber(value) {
+  if (typeof value === "number") return value;
+  if (value == null || value === "") return null;
+  const number = Number(value);
+  return Number.isFinite(number) ? number : null;
+}
+
+// Column metadata for rows from an older backend without _columns: numbers are measures of unknown aggregate.
+export function inferColumns(rows) {
+  if (!rows?.length) return [];
+  return Object.keys(rows[0]).map((name) => {
+    const numeric = typeof rows[0][name] === "number";
+    return { name, type: numeric ? "number" : "string", role: numeric ? "measure" : "dimension", aggregate: null };
+  });
+}
+
+export function canRegroup(columns, measure) {
+  const column = columns.find((c) => c.name === measure);
+  return Boolean(column && COMBINE[column.aggregate]);
+}
+
+export function groupBy(rows, dimension, measures, columns) {
+  const groups = new Map();
+  for (const row of rows) {
+    const key = row[dimension];
+    let group = groups.get(key);
+    if (!group) {
+      group = { [dimension]: key };
+      groups.set(key, group);
+    }
+    for (const measure of measures) {
+      const value = toNumber(row[measure]);
+      if (value == null) continue;
+      const how = COMBINE[columns.find((c) => c.name === measure)?.aggregate];
+      const current = group[measure];
+      if (current == null) group[measure] = value;
+      else if (how === "min") group[measure] = Math.min(current, value);
+      else if (how === "max") group[measure] = Math.max(current, value);
+      else group[measure] = current + value;
+    }
+  }
+  // Sums of 2-dp values pick up float noise; the agent rounds to 2 dp as well.
+  return [...groups.values()].map((group) => {
+    for (const measure of measures) {
+      if (typeof group[measure] === "number") group[measure] = Math.round(group[measure] * 100) / 100;
+    }
+    return group;
+  });
+}
+
+export function sortRows(rows, key, descending) {
+  const rank = (value) => {
+    const number = toNumber(value);
+    if (value == null) return [2, 0, ""];
+    if (number != null) return [0, number, ""];
+    return [1, 0, String(value).toLowerCase()];
+  };
+  const sorted = [...rows].sort((a, b) => {
+    const [ga, na, ta] = rank(a[key]);
+    const [gb, nb, tb] = rank(b[key]);
+    if (ga !== gb) return ga - gb;
+    if (na !== nb) return na - nb;
+    return ta < tb ? -1 : ta > tb ? 1 : 0;
+  });
+  return descending ? sorted.reverse() : sorted;
+}
+
+// Dimensions the result can be charted by and the measures it can show.
+export function viewOptions({ data, columns, detail }) {
+  const cols = columns?.length ? columns : inferColumns(data);
+  const measures = cols.filter((c) => c.role === "measure").map((c) => c.name);
+  const regroupable = measures.length > 0 && measures.every((m) => canRegroup(cols, m));
+  const dimensions = cols.filter((c) => c.role === "dimension").map((c) => c.name);
+  if (regroupable && detail?.dimension && !dimensions.includes(detail.dimension)) dimensions.push(detail.dimension);
+  return { columns: cols, measures, dimensions, regroupable };
+}
+
+// view: { chartType, xAxis, yAxis, sort: "none" | "asc" | "desc", limit: 0 (all) or N, regroup }
+// Charts always show one point per x value; a table keeps every row until it is explicitly re-grouped.
+export function buildView(result, view) {
+  const { columns, measures, regroupable } = viewOptions(result);
+  const { data = [], detail } = result;
+  let rows = data;
+  if (regroupable && view.xAxis && (view.regroup || view.chartType !== "table")) {
+    const inData = data.length > 0 && view.xAxis in data[0];
+    const source = inData ? data : detail?.data ?? [];
+    const sourceColumns = inData ? columns : detail?.columns ?? columns;
+    rows = groupBy(source, view.xAxis, measures, sourceColumns);
+  }
+  if (view.sort !== "none" || view.limit) {
+    // Sorting and top-N rank by the measure (bottom-N when ascending).
+    rows = sortRows(rows, view.yAxis, view.sort !== "asc");
+  }
+  if (view.limit) rows = rows.slice(0, view.limit);
+  return {
+    rows,
+    visualization: { chart_type: view.chartType, x_axis: view.xAxis, y_axis: view.yAxis },
+  };
+}
@@ -0,0 +1,180 @@
+# static_assets.py
+#
+# Serving for the built frontend (dist_frontend) and compression for the API:
+#   AssetManifest     : every built file, listed and read into memory once at
+#                       startup with a strong ETag, so a request costs a dict
+#                       lookup instead of filesystem calls. Vite's content-
+#                       hashed files (assets/index-3f2a9c1b.js) are cached by
+#                       browsers for a year as immutable; index.html and other
+#                       unhashed files are revalidated with their ETag.
+#                       Compressible files are also held gzip- and brotli-
+#                       compressed (from .gz/.br files written next to them by
+#                       `python static_assets.py`, else compressed at startup)
+#                       and sent in the best encoding the client accepts.
+#   compress_response : on-the-fly gzip/brotli for API responses above a size
+#                       threshold (large /chat payloads with many data rows)
+# Brotli needs the optional `brotli` package; without it gzip is used.
+#
+#   cd ui && npm run build && python static_assets.py   # optional: max-level .gz/.br files
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Vite names bundled files <name>-<8+ character content hash>.<ext> under assets/.
+HASHED_ASSET = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/x-ndjson",
+                      "application/manifest+json", "image/svg+xml", "application/xml", "application/wasm")
+# Smaller bodies gain less from compression than the header and CPU cost.
+DEFAULT_COMPRESS_MIN_BYTES = 1024
+# Fast levels for per-request compression; precompressed assets use the maximum levels.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY if level is None else level)
+    return gzip.compress(body, GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def available_encodings() -> tuple:
+    """Encodings this process can produce, in order of preference."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encodings, offered) -> Optional[str]:
+    """The preferred encoding in offered that the client accepts (werkzeug's request.accept_encodings)."""
+    for encoding in ("br", "gzip"):
+        if encoding in offered and accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+@dataclass
+class Asset:
+    body: bytes
+    content_type: str
+    etag: str
+    immutable: bool
+    encoded: Dict[str, bytes] = field(default_factory=dict)  # "br" / "gzip" -> compressed body
+
+
+class AssetManifest:
+    def __init__(self, root: str, assets: Dict[str, Asset]):
+        self.root = root
+        self.assets = assets
+
+    @classmethod
+    def build(cls, root: str, compress_min_bytes: int = DEFAULT_COMPRESS_MIN_BYTES) -> "AssetManifest":
+        """Reads every file under root; an empty manifest if the frontend has not been built."""
+        assets = {}
+        for directory, _, files in os.walk(root):
+            for name in files:
+                path = os.path.join(directory, name)
+                if name.endswith(tuple(SUFFIXES.values())) and os.path.exists(path[:path.rfind(".")]):
+                    continue  # a precompressed variant, attached to its original below
+                rel = os.path.relpath(path, root).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    body = f.read()
+                content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                if content_type.startswith("text/") or content_type == "application/javascript":
+                    content_type += "; charset=utf-8"
+                asset = Asset(body, content_type, hashlib.sha256(body).hexdigest()[:16],
+                              bool(HASHED_ASSET.match(rel)))
+                if is_compressible(content_type) and len(body) >= compress_min_bytes:
+                    for encoding, suffix in SUFFIXES.items():
+                        if os.path.exists(path + suffix):
+                            with open(path + suffix, "rb") as f:
+                                asset.encoded[encoding] = f.read()
+                        elif encoding in available_encodings():
+                            asset.encoded[encoding] = compress(body, encoding)
+                    # A variant that is not smaller is not worth sending.
+                    asset.encoded = {k: v for k, v in asset.encoded.items() if len(v) < len(body)}
+                assets[rel] = asset
+        return cls(root, assets)
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self.assets.get(path)
+
+    @property
+    def index(self) -> Optional[Asset]:
+        return self.assets.get("index.html")
+
+    def __len__(self):
+        return len(self.assets)
+
+
+def asset_response(asset: Asset, request) -> Response:
+    """The asset in the client's best accepted encoding, or 304 if its cached copy is current."""
+    encoding = choose_encoding(request.accept_encodings, asset.encoded)
+    # Each encoding is a different representation, so it gets its own ETag.
+    etag = f"{asset.etag}-{encoding}" if encoding else asset.etag
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE if asset.immutable else REVALIDATE_CACHE,
+        "ETag": f'"{etag}"',
+    }
+    if asset.encoded:
+        headers["Vary"] = "Accept-Encoding"
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    body = asset.encoded[encoding] if encoding else asset.body
+    return Response(body, content_type=asset.content_type, headers=headers)
+
+
+def compress_response(response: Response, request, min_bytes: int = DEFAULT_COMPRESS_MIN_BYTES) -> Response:
+    """Compresses a buffered, uncompressed response body of at least min_bytes if the client accepts it."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or "Content-Encoding" in response.headers or not is_compressible(response.mimetype or "")):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings, available_encodings())
+    body = response.get_data()
+    if encoding is None or len(body) < min_bytes:
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def precompress(root: str) -> int:
+    """Writes maximum-level .gz (and .br, with brotli installed) files next to each compressible built file."""
+    written = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            content_type = mimetypes.guess_type(name)[0] or ""
+            if name.endswith(tuple(SUFFIXES.values())) or not is_compressible(content_type):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                body = f.read()
+            for encoding in available_encodings():
+                with open(path + SUFFIXES[encoding], "wb") as f:
+                    f.write(compress(body, encoding, 11 if encoding == "br" else 9))
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    dist = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dist_frontend")
+    print(f"Wrote {precompress(dist)} precompressed files under {dist}.")